@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Offline address index built from a city's open address-point CSV.
+Addresses found in the index resolve locally (as ROOFTOP) without a Google
+call; everything else falls through to geocode_address().
+
+The index is one binary file, memory-mapped when opened:
+    header | metadata JSON | street_start[S+1] | name_offsets[S+1] | street names
+           | house numbers[N] (uint32) | lat/lng pairs[N] (float64)
+Records are sorted by (street, house number), so a lookup is a dict hit on the
+normalized street name plus a binary search over that street's house numbers.
+
+Usage:
+    python address_index.py build addresses.csv sample_data/address_index.bin --city Edmonton
+    python address_index.py lookup sample_data/address_index.bin "10503 101 Street NW, Edmonton, AB, Canada"
+    python address_index.py stats sample_data/address_index.bin
+"""
+
+import argparse
+import bisect
+import csv
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+from array import array
+
+DEFAULT_INDEX_PATH = os.environ.get('ADDRESS_INDEX_PATH', '')
+
+MAGIC = b'ADDRIDX1'
+VERSION = 1
+# magic, byte order ('<' or '>'), version, records, streets, metadata bytes, name bytes
+HEADER = struct.Struct('<8s1s3xIIIII')
+
+# Street type and direction spellings folded to one form, so "101 Street NW"
+# (candidate addresses) and "101 ST NW" (address CSVs) share a key
+STREET_WORDS = {
+    'STREET': 'ST', 'ST': 'ST',
+    'AVENUE': 'AVE', 'AVE': 'AVE', 'AV': 'AVE',
+    'ROAD': 'RD', 'RD': 'RD',
+    'DRIVE': 'DR', 'DR': 'DR',
+    'BOULEVARD': 'BLVD', 'BLVD': 'BLVD',
+    'CRESCENT': 'CRES', 'CRES': 'CRES', 'CR': 'CRES',
+    'PLACE': 'PL', 'PL': 'PL',
+    'COURT': 'CT', 'CT': 'CT',
+    'POINT': 'PT', 'PT': 'PT',
+    'TRAIL': 'TRAIL', 'TR': 'TRAIL',
+    'LANE': 'LANE', 'LN': 'LANE',
+    'CLOSE': 'CL', 'CL': 'CL',
+    'TERRACE': 'TER', 'TER': 'TER',
+    'HEIGHTS': 'HTS', 'HTS': 'HTS',
+    'GREEN': 'GR', 'GR': 'GR',
+    'LANDING': 'LDG', 'LDG': 'LDG',
+    'NORTHWEST': 'NW', 'NW': 'NW',
+    'NORTHEAST': 'NE', 'NE': 'NE',
+    'SOUTHWEST': 'SW', 'SW': 'SW',
+    'SOUTHEAST': 'SE', 'SE': 'SE'
+}
+NON_WORD = re.compile(r'[^A-Z0-9]+')
+
+
+def normalize_street(street_name):
+    """Index key for a street name: upper case, no punctuation, abbreviations folded"""
+    words = NON_WORD.sub(' ', street_name.upper()).split()
+    return ' '.join(STREET_WORDS.get(word, word) for word in words)
+
+
+def split_full_address(address_str):
+    """
+    "10503 101 Street NW, Edmonton, AB, Canada" -> (10503, "101 ST NW", "EDMONTON, AB, CANADA")
+
+    Returns:
+    - (house_number, street_key, locality) or None if there is no leading house number
+    """
+    street_part, _, locality = address_str.partition(',')
+    match = re.match(r'\s*(\d+)\s+(.+)', street_part)
+    if not match:
+        return None
+    return int(match.group(1)), normalize_street(match.group(2)), locality.strip().upper()
+
+
+def _pad(length):
+    return b'\0' * (-length % 8)
+
+
+def build_index(rows, output_path, metadata=None):
+    """
+    Write an index file from (street_name, house_number, lat, lng) tuples.
+    Duplicate street + house rows keep the first coordinates seen.
+
+    Returns:
+    - number of records written
+    """
+    records = {}
+    for street_name, house_number, lat, lng in rows:
+        key = (normalize_street(street_name), int(house_number))
+        if key[0] and key not in records:
+            records[key] = (float(lat), float(lng))
+
+    keys = sorted(records)
+    streets = []
+    street_start = array('I')
+    houses = array('I')
+    coords = array('d')
+    for index, (street, house) in enumerate(keys):
+        if not streets or streets[-1] != street:
+            streets.append(street)
+            street_start.append(index)
+        houses.append(house)
+        coords.extend(records[(street, house)])
+    street_start.append(len(keys))
+
+    names = b''
+    name_offsets = array('I', [0])
+    for street in streets:
+        names += street.encode('utf-8')
+        name_offsets.append(len(names))
+
+    meta = json.dumps({**(metadata or {}), 'builtAt': time.time()}).encode('utf-8')
+    byte_order = b'<' if sys.byteorder == 'little' else b'>'
+    header = HEADER.pack(MAGIC, byte_order, VERSION, len(keys), len(streets), len(meta), len(names))
+
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        for block in (header, meta, street_start.tobytes(), name_offsets.tobytes(),
+                      names, houses.tobytes(), coords.tobytes()):
+            f.write(block)
+            f.write(_pad(len(block)))
+    os.replace(tmp_path, output_path)
+    return len(keys)
+
+
+def read_csv_rows(csv_path, street_column, house_column, lat_column, lng_column, suffix_column=None):
+    """Yield (street, house, lat, lng) from an address CSV, skipping unusable rows and unit suffixes"""
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            if suffix_column and (row.get(suffix_column) or '').strip():
+                continue
+            house = re.sub(r'\D', '', row.get(house_column) or '')
+            try:
+                lat = float(row[lat_column])
+                lng = float(row[lng_column])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if house and (row.get(street_column) or '').strip() and lat and lng:
+                yield row[street_column], int(house), lat, lng
+
+
+class AddressIndex:
+    """
+    Read-only view of an index file. Lookups are thread-safe; the file stays
+    memory-mapped until close().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.counters = {'hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+
+        magic, byte_order, version, records, streets, meta_len, names_len = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not an address index (version {VERSION})")
+        if byte_order != (b'<' if sys.byteorder == 'little' else b'>'):
+            raise ValueError(f"{path} was built on a machine with a different byte order")
+
+        view = memoryview(self._map)
+        offset = HEADER.size + len(_pad(HEADER.size))
+
+        def take(length):
+            nonlocal offset
+            section = view[offset:offset + length]
+            offset += length + len(_pad(length))
+            return section
+
+        self.metadata = json.loads(bytes(take(meta_len)).decode('utf-8'))
+        self._street_start = take(4 * (streets + 1)).cast('I')
+        name_offsets = take(4 * (streets + 1)).cast('I')
+        names = bytes(take(names_len))
+        self._houses = take(4 * records).cast('I')
+        self._coords = take(8 * 2 * records).cast('d')
+        self.records = records
+
+        # Street names are small; keep them in a dict for O(1) street lookup
+        self._streets = {
+            names[name_offsets[i]:name_offsets[i + 1]].decode('utf-8'): i
+            for i in range(streets)
+        }
+        city = self.metadata.get('city')
+        self.city = city.upper() if city else None
+
+    def close(self):
+        for name in ('_street_start', '_houses', '_coords'):
+            getattr(self, name).release()
+        self._map.close()
+        self._file.close()
+
+    def lookup(self, street_name, house_number):
+        """(lat, lng) of street + house number, or None"""
+        street = self._streets.get(normalize_street(street_name))
+        if street is None:
+            return None
+        return self._find(street, house_number)
+
+    def _find(self, street, house_number):
+        lo, hi = self._street_start[street], self._street_start[street + 1]
+        i = bisect.bisect_left(self._houses, house_number, lo, hi)
+        if i < hi and self._houses[i] == house_number:
+            return self._coords[2 * i], self._coords[2 * i + 1]
+        return None
+
+    def get(self, address_str):
+        """
+        geocode_address()-shaped ROOFTOP result for a full address, or None on a miss.
+        Addresses outside the index's city are always misses.
+        """
+        parts = split_full_address(address_str)
+        point = None
+        if parts is not None:
+            house_number, street_key, locality = parts
+            if not (self.city and locality and not locality.startswith(self.city)):
+                street = self._streets.get(street_key)
+                if street is not None:
+                    point = self._find(street, house_number)
+
+        with self._lock:
+            self.counters['hits' if point else 'misses'] += 1
+        if point is None:
+            return None
+        return {
+            'coordinates': {
+                'lat': point[0],
+                'lng': point[1]
+            },
+            'location_type': 'ROOFTOP',
+            'status': 'success',
+            'exists': True
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.counters,
+                'records': self.records,
+                'streets': len(self._streets),
+                'city': self.metadata.get('city'),
+                'path': self.path
+            }
+
+
+def open_default_index():
+    """AddressIndex at ADDRESS_INDEX_PATH, or None if unset or missing"""
+    if DEFAULT_INDEX_PATH and os.path.exists(DEFAULT_INDEX_PATH):
+        return AddressIndex(DEFAULT_INDEX_PATH)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build and query the offline address index')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='Build an index from an address-point CSV')
+    build.add_argument('csv', help='Address CSV (e.g. the city open data address points export)')
+    build.add_argument('output', help='Index file to write')
+    build.add_argument('--city', default='Edmonton', help='City the addresses belong to')
+    build.add_argument('--street-column', default='Street Name')
+    build.add_argument('--house-column', default='House Number')
+    build.add_argument('--lat-column', default='Latitude')
+    build.add_argument('--lng-column', default='Longitude')
+    build.add_argument('--suffix-column', default='House Suffix',
+                       help='Rows with a value here (e.g. 10503A) are skipped')
+
+    lookup = sub.add_parser('lookup', help='Resolve full addresses against an index')
+    lookup.add_argument('index')
+    lookup.add_argument('addresses', nargs='+')
+
+    stats = sub.add_parser('stats', help='Show index size and metadata')
+    stats.add_argument('index')
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        rows = read_csv_rows(args.csv, args.street_column, args.house_column,
+                             args.lat_column, args.lng_column, args.suffix_column)
+        count = build_index(rows, args.output, {'city': args.city, 'source': os.path.basename(args.csv)})
+        print(f"✓ Indexed {count} addresses into {args.output} "
+              f"({os.path.getsize(args.output) / 1024 / 1024:.1f} MB, {time.perf_counter() - start:.1f}s)")
+
+    elif args.command == 'lookup':
+        index = AddressIndex(args.index)
+        for address in args.addresses:
+            start = time.perf_counter()
+            result = index.get(address)
+            elapsed_us = (time.perf_counter() - start) * 1e6
+            print(f"{address}: {json.dumps(result)} ({elapsed_us:.1f} µs)")
+        index.close()
+
+    elif args.command == 'stats':
+        index = AddressIndex(args.index)
+        print(json.dumps({**index.stats(), 'metadata': index.metadata}, indent=2))
+        index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmarks against local Claude / Google stand-ins (fake_apis.py).
+No API keys or money needed; the real server and geocoder code paths run
+unchanged, only their upstream URLs point at the fake server.
+
+Usage:
+    # N images through /ocr/table (in-process Flask app, fresh extraction each time)
+    python bench_e2e.py ocr --images 50 --concurrency 8 --claude-latency 2
+
+    # Same against a running server (start it with ANTHROPIC_BASE_URL pointing at fake_apis.py)
+    python bench_e2e.py ocr --target http://localhost:8869 --fake-url http://localhost:8870
+
+    # M addresses through GeocodingEngine + aggregate_results
+    python bench_e2e.py geocode --addresses 5000 --workers 16 --qps 200
+
+Add --json to print the report as one JSON object (for regression tracking).
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fake_apis
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, min(len(sorted_values), round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[rank - 1]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / 1024 / (1024 if sys.platform == 'darwin' else 1), 1)
+
+
+def latency_report(name, latencies, wall_seconds, statuses, extra=None):
+    latencies = sorted(latencies)
+    return {
+        'benchmark': name,
+        'requests': len(latencies),
+        'wallSeconds': round(wall_seconds, 3),
+        'requestsPerSecond': round(len(latencies) / wall_seconds, 2) if wall_seconds else None,
+        'latencyMs': {
+            'p50': round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+            'p95': round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+            'p99': round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+            'max': round(latencies[-1] * 1000, 1) if latencies else None
+        },
+        'statuses': statuses,
+        'peakRssMb': peak_rss_mb(),
+        **(extra or {})
+    }
+
+
+def print_report(report, as_json):
+    if as_json:
+        print(json.dumps(report))
+        return
+    latency = report['latencyMs']
+    print("=" * 60)
+    print(f"{report['benchmark']}: {report['requests']} requests in {report['wallSeconds']}s "
+          f"({report['requestsPerSecond']} req/s)")
+    print(f"Latency ms  p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+    print(f"Statuses    {report['statuses']}")
+    print(f"Peak RSS    {report['peakRssMb']} MB")
+    for key, value in report.items():
+        if key not in ('benchmark', 'requests', 'wallSeconds', 'requestsPerSecond', 'latencyMs',
+                       'statuses', 'peakRssMb'):
+            print(f"{key:<12}{value}")
+
+
+def start_fakes(args):
+    """Start fake APIs in this process unless --fake-url points at running ones"""
+    if args.fake_url:
+        return None, args.fake_url.rstrip('/')
+    server, url = fake_apis.start_in_thread(fake_apis.config_from_args(args))
+    return server, url
+
+
+def fake_stats(base_url):
+    import requests
+    try:
+        return requests.get(f"{base_url}/stats", timeout=5).json()
+    except Exception:
+        return None
+
+
+# ---------------------------------------------------------------------------
+# OCR
+# ---------------------------------------------------------------------------
+
+def synthetic_images(count, width, height, seed):
+    """Route-sheet-like PNGs (ruled rows of dark blocks); each one different so the cache never hits"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        image = Image.new('L', (width, height), 255)
+        draw = ImageDraw.Draw(image)
+        row_height = max(12, height // 40)
+        for top in range(row_height * 2, height - row_height, row_height):
+            draw.line([(20, top), (width - 20, top)], fill=180)
+            for left in range(30, width - 80, width // 8):
+                draw.rectangle([left, top + 3, left + rng.randint(20, width // 10), top + row_height - 3], fill=30)
+        buffer = io.BytesIO()
+        image.save(buffer, 'PNG')
+        images.append(buffer.getvalue())
+    return images
+
+
+def load_images(directory):
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(('.png', '.jpg', '.jpeg', '.webp', '.gif')):
+            with open(os.path.join(directory, name), 'rb') as f:
+                images.append(f.read())
+    return images
+
+
+def run_ocr(args):
+    fakes, fake_url = start_fakes(args)
+    images = load_images(args.image_dir) if args.image_dir else synthetic_images(
+        args.images, args.width, args.height, args.seed or 0)
+    if args.image_dir and args.images:
+        images = (images * (args.images // max(1, len(images)) + 1))[:args.images]
+
+    query = f"?nocache=1&tiles={args.tiles}" if not args.cache else f"?tiles={args.tiles}"
+    path = {'table': '/ocr/table', 'raw': '/ocr/raw', 'stream': '/ocr/stream'}[args.endpoint]
+
+    if args.target:
+        import requests
+        session = requests.Session()
+
+        def send(image):
+            if args.endpoint == 'raw':
+                response = session.post(args.target + path + query, data=image,
+                                        headers={'Content-Type': 'application/octet-stream'}, timeout=600)
+            else:
+                response = session.post(args.target + path + query, files={'image': ('sheet.png', image)},
+                                        timeout=600)
+            response.content
+            return response.status_code
+    else:
+        # In-process: the real Flask app, talking to the fake Anthropic API
+        os.environ['ANTHROPIC_BASE_URL'] = fake_url
+        os.environ.setdefault('CLAUDE_API_KEY', 'fake-key')
+        os.environ.setdefault('CLAUDE_MAX_INFLIGHT', str(args.concurrency))
+        os.environ.setdefault('CLAUDE_QUEUE_TIMEOUT', '600')
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        import claude_ocr_server
+        local = threading.local()
+
+        def send(image):
+            client = getattr(local, 'client', None)
+            if client is None:
+                client = local.client = claude_ocr_server.app.test_client()
+            if args.endpoint == 'raw':
+                response = client.post(path + query, data=image, content_type='application/octet-stream')
+            else:
+                response = client.post(path + query, data={'image': (io.BytesIO(image), 'sheet.png')},
+                                       content_type='multipart/form-data')
+            response.get_data()
+            response.close()
+            return response.status_code
+
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def timed(image):
+        start = time.perf_counter()
+        try:
+            status = send(image)
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(timed, images))
+    wall = time.perf_counter() - start
+
+    report = latency_report(f"ocr {path}", latencies, wall, statuses, {
+        'concurrency': args.concurrency,
+        'imageBytes': sum(len(i) for i in images) // max(1, len(images)),
+        'fakeApi': fake_stats(fake_url)
+    })
+    print_report(report, args.json)
+    if fakes:
+        fakes.shutdown()
+
+
+# ---------------------------------------------------------------------------
+# Geocoding
+# ---------------------------------------------------------------------------
+
+def synthetic_candidates(count, seed):
+    from candidates import candidate_rows, expand_groups
+
+    rng = random.Random(seed)
+    groups = []
+    total = 0
+    number = 0
+    while total < count:
+        number += 1
+        streets = []
+        for _ in range(rng.randint(2, 6)):
+            start = rng.randrange(100, 9000, 2)
+            length = rng.choice([10, 20, 40, 80])
+            streets.append({'streetName': f"{rng.randint(1, 200)} St NW",
+                            'fromHouse': str(start), 'toHouse': str(start + length)})
+            total += length // 2 + 1
+        groups.append({'groupNumber': number, 'streets': streets})
+    return candidate_rows(expand_groups(groups))[:count]
+
+
+def run_geocode(args):
+    fakes, fake_url = start_fakes(args)
+    os.environ['GEOCODE_URL'] = f"{fake_url}/maps/api/geocode/json"
+    # Imported after GEOCODE_URL is set; the module reads it at import time
+    from geocode_checkpoint import make_record
+    from geocode_store import GeocodeStore
+    from geocoder import GeocodingEngine
+    from test_geocoding import aggregate_results, load_candidates
+
+    if args.candidates:
+        with contextlib.redirect_stdout(io.StringIO()):
+            candidates = load_candidates(args.candidates)[:args.addresses or None]
+    else:
+        candidates = synthetic_candidates(args.addresses, args.seed or 0)
+
+    engine = GeocodingEngine(
+        'fake-key', qps=args.qps, daily_quota=None, workers=args.workers,
+        backoff_base=args.backoff_base, store=GeocodeStore(args.store) if args.store else None
+    )
+
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def timed(candidate):
+        start = time.perf_counter()
+        result = engine.geocode(candidate['fullAddress'])
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[result['status']] = statuses.get(result['status'], 0) + 1
+        return result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(timed, candidates))
+    wall = time.perf_counter() - start
+
+    geocoded = [make_record(candidate, result) for candidate, result in zip(candidates, results)]
+    aggregate_start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # aggregate_results prints per-address lines
+        summary = aggregate_results(geocoded)['summary']
+    aggregate_ms = (time.perf_counter() - aggregate_start) * 1000
+
+    report = latency_report("geocode", latencies, wall, statuses, {
+        'workers': args.workers,
+        'qps': args.qps,
+        'engine': dict(engine.stats),
+        'aggregateMs': round(aggregate_ms, 1),
+        'summary': summary,
+        'fakeApi': fake_stats(fake_url)
+    })
+    print_report(report, args.json)
+    if fakes:
+        fakes.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    ocr = sub.add_parser('ocr', help='Push images through the OCR endpoints')
+    ocr.add_argument('--images', type=int, default=20, help='Number of images to send')
+    ocr.add_argument('--image-dir', help='Use (and repeat) the images in this directory instead of synthetic ones')
+    ocr.add_argument('--width', type=int, default=1600)
+    ocr.add_argument('--height', type=int, default=2200)
+    ocr.add_argument('--concurrency', type=int, default=4)
+    ocr.add_argument('--endpoint', choices=('table', 'raw', 'stream'), default='table')
+    ocr.add_argument('--tiles', type=int, default=1)
+    ocr.add_argument('--cache', action='store_true', help='Allow OCR cache hits (default sends ?nocache=1)')
+    ocr.add_argument('--target', help='Base URL of a running OCR server (default: in-process app)')
+
+    geocode = sub.add_parser('geocode', help='Push addresses through the geocoding engine')
+    geocode.add_argument('--addresses', type=int, default=1000)
+    geocode.add_argument('--candidates', help='Candidates JSON to use instead of synthetic addresses')
+    geocode.add_argument('--workers', type=int, default=8)
+    geocode.add_argument('--qps', type=float, default=100)
+    geocode.add_argument('--backoff-base', type=float, default=0.1)
+    geocode.add_argument('--store', help='GeocodeStore path to read/write (default: none)')
+
+    for command in (ocr, geocode):
+        command.add_argument('--fake-url', help='Use fake APIs already running at this URL')
+        command.add_argument('--json', action='store_true', help='Print the report as JSON')
+        fake_apis.add_arguments(command)
+
+    args = parser.parse_args()
+    if args.command == 'ocr':
+        run_ocr(args)
+    else:
+        run_geocode(args)
+
+
+if __name__ == '__main__':
+    main()
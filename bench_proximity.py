@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark the walking-distance filter: grid index (proximity.py) against the
+pairwise check used by nodes/aggregate-results.js, on synthetic Edmonton
+routes of growing size. Also checks that both keep the same addresses.
+
+Usage: python bench_proximity.py [--sizes 1000,5000,10000,50000] [--groups 20]
+"""
+
+import argparse
+import random
+import time
+
+from proximity import WALKING_DISTANCE_M, address_coordinates, haversine_m, proximity_mask
+
+EDMONTON = (53.5461, -113.4938)
+
+
+def synthetic_group(count, rng):
+    """One route group: streets of houses around a centre, a few far-off geocodes and misses"""
+    centre_lat = EDMONTON[0] + rng.uniform(-0.15, 0.15)
+    centre_lng = EDMONTON[1] + rng.uniform(-0.25, 0.25)
+    addresses = []
+    while len(addresses) < count:
+        # A street: a short straight run of houses ~15 m apart
+        lat = centre_lat + rng.gauss(0, 0.01)
+        lng = centre_lng + rng.gauss(0, 0.016)
+        heading = rng.choice([(0.000135, 0), (0, 0.000225)])
+        for house in range(min(rng.randint(10, 60), count - len(addresses))):
+            roll = rng.random()
+            if roll < 0.02:
+                coordinates = None
+            elif roll < 0.05:
+                # Geocoded to the wrong neighbourhood
+                coordinates = {'lat': lat + rng.uniform(-0.2, 0.2), 'lng': lng + rng.uniform(-0.3, 0.3)}
+            else:
+                coordinates = {'lat': lat + heading[0] * house, 'lng': lng + heading[1] * house}
+            addresses.append({'coordinates': coordinates})
+    return addresses
+
+
+def pairwise_mask(addresses, max_distance):
+    """Direct port of the node's loop: compare with every address kept so far"""
+    kept = []
+    mask = []
+    for address in addresses:
+        point = address_coordinates(address)
+        ok = point is not None and (
+            not kept or any(haversine_m(point[0], point[1], lat, lng) <= max_distance for lat, lng in kept)
+        )
+        if ok:
+            kept.append(point)
+        mask.append(ok)
+    return mask
+
+
+def run(size, groups, max_distance, pairwise_limit, rng):
+    per_group = max(1, size // groups)
+    data = [synthetic_group(per_group, rng) for _ in range(groups)]
+
+    start = time.perf_counter()
+    grid = [proximity_mask(group, max_distance) for group in data]
+    grid_seconds = time.perf_counter() - start
+
+    kept = sum(sum(mask) for mask in grid)
+    line = f"{per_group * groups:>7} addresses  grid {grid_seconds * 1000:9.1f} ms  kept {kept}"
+
+    if per_group * groups <= pairwise_limit:
+        start = time.perf_counter()
+        pairwise = [pairwise_mask(group, max_distance) for group in data]
+        pairwise_seconds = time.perf_counter() - start
+        same = 'same' if pairwise == grid else 'DIFFERENT'
+        line += (f"  pairwise {pairwise_seconds * 1000:9.1f} ms  "
+                 f"speedup {pairwise_seconds / grid_seconds:6.1f}x  ({same})")
+    else:
+        line += "  pairwise skipped"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,5000,10000,50000', help='Comma-separated total address counts')
+    parser.add_argument('--groups', type=int, default=20, help='Route groups the addresses are split into')
+    parser.add_argument('--radius', type=float, default=WALKING_DISTANCE_M, help='Walking distance in metres')
+    parser.add_argument('--pairwise-limit', type=int, default=50000,
+                        help='Skip the pairwise check above this many addresses')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"Walking distance {args.radius:.0f} m, {args.groups} groups")
+    for size in (int(s) for s in args.sizes.split(',')):
+        run(size, args.groups, args.radius, args.pairwise_limit, rng)
+
+
+if __name__ == '__main__':
+    main()
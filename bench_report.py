@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Benchmark the HTML report renderers (route_report.py) against the original
+string-concatenating generate_html(), on synthetic routes of growing size.
+Reports render time, peak memory, page size and sidecar size, and checks that the lazy
+layout's data holds every address.
+
+Usage: python bench_report.py [--sizes 1000,10000,50000] [--groups 20]
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from route_report import write_cards_report, write_lazy_report
+
+EDMONTON = (53.5461, -113.4938)
+
+
+def synthetic_report(size, groups, rng):
+    """aggregate_results()-shaped data: groups of streets of houses"""
+    data = {'groups': [], 'summary': {}}
+    per_group = max(1, size // groups)
+    for number in range(1, groups + 1):
+        streets = []
+        remaining = per_group
+        while remaining:
+            count = min(rng.randint(10, 60), remaining)
+            remaining -= count
+            lat = EDMONTON[0] + rng.uniform(-0.15, 0.15)
+            lng = EDMONTON[1] + rng.uniform(-0.25, 0.25)
+            name = f"{rng.randint(1, 250)} {rng.choice(['Street', 'Avenue'])} NW"
+            start = rng.randrange(100, 9000, 2)
+            streets.append({'streetName': name, 'addresses': [
+                {'houseNumber': start + 2 * i, 'streetName': name,
+                 'fullAddress': f"{start + 2 * i} {name}, Edmonton, AB, Canada",
+                 'coordinates': {'lat': lat + 0.000135 * i, 'lng': lng}, 'location_type': 'ROOFTOP'}
+                for i in range(count)
+            ]})
+        data['groups'].append({'groupNumber': number, 'streets': streets, 'totalHouses': per_group})
+    houses = per_group * groups
+    data['summary'] = {'totalGroups': groups, 'totalCandidates': houses * 2, 'totalHouses': houses,
+                       'notFound': houses, 'discardedDueToProximity': 0}
+    return data
+
+
+def legacy_generate_html(data, filepath):
+    """The original generate_html() from test_geocoding.py, kept for comparison"""
+    html = f"""<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="UTF-8">
+  <title>Delivery Route - Geocoded</title>
+  <style>
+    body {{ font-family: Arial; margin: 20px; background: #f5f5f5; }}
+    .container {{ max-width: 1200px; margin: 0 auto; background: white; padding: 20px; border-radius: 10px; }}
+    h1 {{ color: #2c3e50; text-align: center; }}
+    .summary {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 30px; display: grid; grid-template-columns: repeat(4, 1fr); gap: 15px; }}
+    .summary-item {{ text-align: center; }}
+    .summary-number {{ font-size: 32px; font-weight: bold; display: block; }}
+    .summary-label {{ font-size: 14px; opacity: 0.9; }}
+    .group {{ margin-bottom: 25px; border: 2px solid #3498db; border-radius: 8px; overflow: hidden; }}
+    .group-header {{ background: #3498db; color: white; padding: 15px; font-size: 20px; font-weight: bold; }}
+    .street-section {{ padding: 15px; border-bottom: 1px solid #eee; }}
+    .street-name {{ font-weight: bold; color: #2c3e50; margin-bottom: 10px; }}
+    .address-list {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(300px, 1fr)); gap: 8px; }}
+    .address-item {{ padding: 8px; background: #f8f9fa; border-radius: 5px; font-size: 13px; border-left: 3px solid #27ae60; }}
+    .address-number {{ font-weight: bold; }}
+    .coordinates {{ color: #666; font-size: 11px; margin-top: 3px; }}
+  </style>
+</head>
+<body>
+  <div class="container">
+    <h1>📍 Delivery Route with Geocoded Addresses</h1>
+    <div class="summary">
+      <div class="summary-item"><span class="summary-number">{data['summary']['totalGroups']}</span><span class="summary-label">Groups</span></div>
+      <div class="summary-item"><span class="summary-number">{data['summary']['totalHouses']}</span><span class="summary-label">Actual Houses</span></div>
+      <div class="summary-item"><span class="summary-number">{data['summary']['totalCandidates']}</span><span class="summary-label">Tested</span></div>
+      <div class="summary-item"><span class="summary-number">{data['summary']['notFound']}</span><span class="summary-label">Not Found</span></div>
+    </div>
+"""
+
+    for group in data['groups']:
+        html += f'<div class="group"><div class="group-header">Group {group["groupNumber"]} - {group["totalHouses"]} Houses</div>'
+        for street in group['streets']:
+            html += f'<div class="street-section"><div class="street-name">📍 {street["streetName"]} ({len(street["addresses"])} houses)</div><div class="address-list">'
+            for addr in street['addresses']:
+                coord_text = f"{addr['coordinates']['lat']:.6f}, {addr['coordinates']['lng']:.6f}" if addr.get('coordinates') else 'No coords'
+                html += f'<div class="address-item"><div class="address-number">{addr["houseNumber"]} {addr["streetName"]}</div><div class="coordinates">{coord_text}</div></div>'
+            html += '</div></div>'
+        html += '</div>'
+
+    html += '</div></body></html>'
+
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write(html)
+
+
+def timed(render, *args):
+    """(seconds, peak MB allocated while rendering); the peak comes from a second, traced run"""
+    start = time.perf_counter()
+    render(*args)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    render(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak / 1024 / 1024
+
+
+def kb(path):
+    return os.path.getsize(path) / 1024
+
+
+def run(size, groups, rng, directory):
+    data = synthetic_report(size, groups, rng)
+    legacy = os.path.join(directory, 'legacy.html')
+    cards = os.path.join(directory, 'cards.html')
+    lazy = os.path.join(directory, 'lazy.html')
+    sidecar = os.path.join(directory, 'lazy.data.json')
+
+    rows = [
+        ('original', timed(legacy_generate_html, data, legacy), legacy, ''),
+        ('cards', timed(write_cards_report, data, cards), cards, ''),
+        ('lazy', timed(write_lazy_report, data, lazy, sidecar, False), lazy, f'  sidecar {kb(sidecar):7.0f} KB'),
+    ]
+    embedded = os.path.join(directory, 'lazy-embedded.html')
+    rows.append(('lazy+data', timed(write_lazy_report, data, embedded, os.path.join(directory, 'embedded.data.json')),
+                 embedded, '  (data embedded)'))
+
+    with open(sidecar, 'r', encoding='utf-8') as f:
+        compact = json.load(f)
+    stored = sum(len(street['houses']) for group in compact['groups'] for street in group['streets'])
+    check = 'ok' if stored == data['summary']['totalHouses'] else f'MISSING {data["summary"]["totalHouses"] - stored}'
+
+    print(f"{data['summary']['totalHouses']:>7} addresses (data {check})")
+    for name, (seconds, peak_mb), path, note in rows:
+        print(f"  {name:<10} {seconds * 1000:8.1f} ms  peak {peak_mb:7.1f} MB  page {kb(path):9.0f} KB{note}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,50000', help='Comma-separated total address counts')
+    parser.add_argument('--groups', type=int, default=20, help='Route groups the addresses are split into')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        for size in (int(s) for s in args.sizes.split(',')):
+            run(size, args.groups, rng, directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark the columnar results format (results_columns.py) against the
+geocoded_results.json written by test_geocoding.write_results(), on synthetic
+runs of growing size. Reports file size, write time and load time (summary
+only, aggregated groups, every record), and checks that the columnar file gives
+back the same groups and records.
+
+Usage: python bench_results_format.py [--sizes 10000,100000,300000] [--group-size 500]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+from candidates import candidate_rows, expand_groups
+from results_columns import load_results, write_results_columns
+from test_geocoding import aggregate_results, write_results
+
+EDMONTON = (53.5461, -113.4938)
+
+
+def synthetic_records(size, groups, rng):
+    """Candidates for `groups` route groups, each run through a fake geocoder"""
+    route = []
+    per_group = max(1, size // groups)
+    for number in range(1, groups + 1):
+        streets = []
+        houses = 0
+        first_street = rng.randint(20, 170)
+        while houses < per_group:
+            span = 2 * rng.randint(5, 30)
+            start = rng.randrange(10000, 11000, 2)
+            streets.append({'streetName': f"{first_street + len(streets)} ST NW",
+                            'fromHouse': str(start), 'toHouse': str(start + span)})
+            houses += span // 2 + 1
+        route.append({'groupNumber': number, 'streets': streets})
+
+    records = []
+    centres = {}
+    for candidate in candidate_rows(expand_groups(route)):
+        centre = centres.setdefault(candidate['groupNumber'], (
+            EDMONTON[0] + rng.uniform(-0.1, 0.1), EDMONTON[1] + rng.uniform(-0.15, 0.15)))
+        if rng.random() < 0.6:
+            record = {'coordinates': {'lat': centre[0] + rng.gauss(0, 0.002), 'lng': centre[1] + rng.gauss(0, 0.003)},
+                      'location_type': 'ROOFTOP', 'geocodeStatus': 'success', 'exists': True}
+        else:
+            record = {'coordinates': None, 'location_type': rng.choice(['APPROXIMATE', None]),
+                      'geocodeStatus': rng.choice(['not_found', 'approximate']), 'exists': False}
+        records.append({**candidate, **record})
+    return records[:size]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def run(size, groups, rng, directory):
+    records = synthetic_records(size, groups, rng)
+    # Copies, as main() aggregates one pass over the checkpoint and writes another
+    with contextlib.redirect_stdout(io.StringIO()):
+        aggregated = aggregate_results(dict(record) for record in records)
+    json_path = os.path.join(directory, 'results.json')
+    cols_path = os.path.join(directory, 'results.cols')
+
+    json_write, _ = timed(write_results, json_path, aggregated, records)
+    cols_write, _ = timed(write_results_columns, cols_path, aggregated, records)
+
+    def json_load():
+        with open(json_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    json_load_seconds, loaded = timed(json_load)
+    summary_seconds, _ = timed(lambda: load_results(cols_path).summary)
+    groups_seconds, rebuilt = timed(lambda: load_results(cols_path).groups)
+    records_seconds, rebuilt_records = timed(lambda: list(load_results(cols_path).all_addresses()))
+
+    same = rebuilt == loaded['groups'] and rebuilt_records == loaded['all_addresses']
+    json_kb = os.path.getsize(json_path) / 1024
+    cols_kb = os.path.getsize(cols_path) / 1024
+
+    print(f"{len(records):>7} records, {aggregated['summary']['totalHouses']} kept "
+          f"({'same data' if same else 'DIFFERENT DATA'})")
+    print(f"  json     {json_kb:9.0f} KB  write {json_write * 1000:8.1f} ms  "
+          f"load {json_load_seconds * 1000:8.1f} ms (everything)")
+    print(f"  columns  {cols_kb:9.0f} KB  write {cols_write * 1000:8.1f} ms  "
+          f"load {summary_seconds * 1000:8.1f} ms (summary)  {groups_seconds * 1000:8.1f} ms (groups)  "
+          f"{records_seconds * 1000:8.1f} ms (all records)  size {100 * cols_kb / json_kb:4.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000,300000', help='Comma-separated candidate counts')
+    parser.add_argument('--group-size', type=int, default=500, help='Candidates per route group')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        for size in (int(s) for s in args.sizes.split(',')):
+            run(size, max(1, size // args.group_size), rng, directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark walking-order sequencing (walking_order.py) on synthetic Edmonton
+groups: path length of the current street/house-number order against
+nearest-neighbour alone and nearest-neighbour + 2-opt, time per group, and
+serial against parallel sequencing of a whole route.
+
+Usage: python bench_walking_order.py [--sizes 50,200,500] [--groups 20] [--pure-python]
+"""
+
+import argparse
+import random
+import time
+
+import walking_order
+from proximity import address_coordinates
+
+EDMONTON = (53.5461, -113.4938)
+
+
+def house_number_order(addresses):
+    """The order aggregate_results() used to give: by street, then house number"""
+    return sorted(range(len(addresses)), key=lambda i: (addresses[i]['streetName'], addresses[i]['houseNumber']))
+
+
+def synthetic_route_group(count, rng):
+    """
+    One group as aggregate_results() keeps it: parallel streets ~200 m apart,
+    houses ~15 m apart, even numbers on one side and odd on the other
+    """
+    lat = EDMONTON[0] + rng.uniform(-0.15, 0.15)
+    lng = EDMONTON[1] + rng.uniform(-0.25, 0.25)
+    first_street = rng.randint(60, 170)
+    addresses = []
+    street = 0
+    while len(addresses) < count:
+        name = f"{first_street + street} Street NW"
+        start = rng.randrange(10000, 11000, 100)
+        for house in range(min(rng.randint(10, 40), (count - len(addresses) + 1) // 2)):
+            for side in (0, 1):
+                addresses.append({
+                    'streetName': name,
+                    'houseNumber': start + 2 * house + side,
+                    'coordinates': {'lat': lat + 0.000135 * house, 'lng': lng + 0.0029 * street + 0.0003 * side}
+                })
+        street += 1
+    rng.shuffle(addresses)
+    return addresses[:count]
+
+
+def run(size, groups, rng):
+    data = [synthetic_route_group(size, rng) for _ in range(groups)]
+    points = [[address_coordinates(a) for a in group] for group in data]
+
+    lengths = {'house numbers': 0.0, 'nearest-neighbour': 0.0, '+ 2-opt': 0.0}
+    seconds = {'nearest-neighbour': 0.0, '+ 2-opt': 0.0}
+    for group, group_points in zip(data, points):
+        dist = walking_order.distance_matrix(group_points)
+        lengths['house numbers'] += walking_order.path_length(dist, house_number_order(group))
+
+        start_time = time.perf_counter()
+        greedy = walking_order.nearest_neighbour(dist, walking_order.start_index(dist))
+        seconds['nearest-neighbour'] += time.perf_counter() - start_time
+        lengths['nearest-neighbour'] += walking_order.path_length(dist, greedy)
+
+        start_time = time.perf_counter()
+        _, length = walking_order.walking_order(group_points)
+        seconds['+ 2-opt'] += time.perf_counter() - start_time
+        lengths['+ 2-opt'] += length
+
+    start_time = time.perf_counter()
+    walking_order.sequence_groups(data, workers=1)
+    serial = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    walking_order.sequence_groups(data)
+    parallel = time.perf_counter() - start_time
+
+    houses = sum(len(group) for group in data)
+    print(f"{size:>5} houses/group ({houses} in {groups} groups)")
+    baseline = lengths['house numbers']
+    for name, length in lengths.items():
+        per_group = f"  {seconds[name] / groups * 1000:7.1f} ms/group" if name in seconds else ''
+        print(f"  {name:<18} {length / 1000:8.1f} km  ({100 * length / baseline:5.1f}%){per_group}")
+    print(f"  whole route: serial {serial * 1000:.0f} ms, "
+          f"{walking_order.SEQUENCE_WORKERS} threads {parallel * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='50,200,500', help='Comma-separated houses per group')
+    parser.add_argument('--groups', type=int, default=20, help='Groups per route')
+    parser.add_argument('--pure-python', action='store_true', help='Run without numpy')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.pure_python:
+        walking_order.np = None
+    rng = random.Random(args.seed)
+    print(f"numpy: {'off' if walking_order.np is None else 'on'}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        run(size, args.groups, rng)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Candidate address expansion for route groups
+Python port of nodes/generate-candidates.js: every street's house number range
+is expanded (same parity, either direction) into candidate addresses for
+geocoding. Output matches the JS node item for item; street names are
+expanded once per street instead of once per house number.
+"""
+
+import json
+import math
+import re
+import sys
+from decimal import Decimal
+
+ADDRESS_SUFFIX = ', Edmonton, AB, Canada'
+
+# Same abbreviations as expandStreetName() in the JS node. Every replacement is
+# a whole word that no other pattern matches, so one alternation pass gives the
+# same result as the node's chain of 13 replace() calls.
+STREET_ABBREVIATIONS = {
+    'PT': 'Point',
+    'ST': 'Street',
+    'AV': 'Avenue',
+    'AVE': 'Avenue',
+    'RD': 'Road',
+    'DR': 'Drive',
+    'BLVD': 'Boulevard',
+    'CR': 'Crescent',
+    'PL': 'Place',
+    'CT': 'Court',
+    'NW': 'NW',
+    'NE': 'NE',
+    'SW': 'SW',
+    'SE': 'SE'
+}
+# re.ASCII keeps \b and case folding to ASCII, as in a JS /gi regex
+ABBREVIATION_PATTERN = re.compile(
+    r'\b(' + '|'.join(sorted(STREET_ABBREVIATIONS, key=len, reverse=True)) + r')\b',
+    re.IGNORECASE | re.ASCII
+)
+NON_DIGITS = re.compile(r'[^0-9]')
+JS_INT_PREFIX = re.compile(r'[+-]?(0[xX][0-9a-fA-F]+|[0-9]+)')
+
+
+def expand_street_name(street_name):
+    """Expand street abbreviations for better geocoding accuracy (expandStreetName in the node)"""
+    if not isinstance(street_name, str):
+        # street.streetName.replace(...) throws in the node as well
+        raise ValueError(f"streetName must be a string, got {street_name!r}")
+    return ABBREVIATION_PATTERN.sub(lambda m: STREET_ABBREVIATIONS[m.group(1).upper()], street_name)
+
+
+def _js_truthy(value):
+    if isinstance(value, float) and math.isnan(value):
+        return False
+    if isinstance(value, (list, dict)):
+        return True
+    return bool(value)
+
+
+def _js_string(value):
+    """String(value) for JSON-decoded values"""
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float):
+        if math.isnan(value):
+            return 'NaN'
+        if math.isinf(value):
+            return 'Infinity' if value > 0 else '-Infinity'
+        if value.is_integer() and abs(value) < 1e21:
+            return str(int(value))
+        # repr() has the same shortest round-trip digits as JS, but switches
+        # to exponent notation at different magnitudes
+        text = repr(value)
+        if 1e-6 <= abs(value) < 1e21:
+            return format(Decimal(text), 'f')
+        mantissa, _, exponent = text.partition('e')
+        return f"{mantissa}e{int(exponent):+d}"
+    if isinstance(value, list):
+        return ','.join('' if v is None else _js_string(v) for v in value)
+    if isinstance(value, dict):
+        return '[object Object]'
+    return str(value)
+
+
+def _js_parse_int(value):
+    """parseInt(value) without a radix; None stands in for NaN"""
+    match = JS_INT_PREFIX.match(_js_string(value).lstrip())
+    if not match:
+        return None
+    text = match.group(0)
+    sign = -1 if text.startswith('-') else 1
+    digits = text.lstrip('+-')
+    if digits[:2].lower() == '0x':
+        return sign * int(digits, 16)
+    return sign * int(digits)
+
+
+def _house_number(value):
+    """fromHouse/toHouse: digits only, parsed; None when missing or zero"""
+    if not _js_truthy(value):
+        return None
+    digits = NON_DIGITS.sub('', _js_string(value))
+    return int(digits) if digits and int(digits) else None
+
+
+def street_house_numbers(street):
+    """
+    House numbers the node generates for one street, in order
+
+    Returns:
+    - list of ints (empty if the street has no usable fromHouse)
+    """
+    from_house = _house_number(street.get('fromHouse'))
+    to_house = _house_number(street.get('toHouse'))
+    number_of_houses = (_js_parse_int(street.get('numberOfHouses'))
+                        if _js_truthy(street.get('numberOfHouses')) else None)
+
+    if from_house and to_house:
+        if from_house < to_house:
+            numbers = range(from_house, to_house + 1, 2)
+        else:
+            numbers = range(from_house, to_house - 1, -2)
+        # `if (numberOfHouses && count >= numberOfHouses) break` - zero/NaN mean no limit
+        if number_of_houses:
+            numbers = numbers[:max(number_of_houses, 0)]
+        return numbers
+    if from_house:
+        return [from_house]
+    return []
+
+
+def expand_groups(groups, max_street_houses=None, max_rows=None):
+    """
+    Expand route groups into candidates, in columnar form
+
+    Each distinct (groupNumber, streetName) pair is listed once in "streets"
+    with its expanded name; the candidate columns index into it.
+    max_street_houses / max_rows (None = no limit) bound the houses one street
+    and the whole request may expand to; going over raises ValueError before
+    anything that large is built.
+
+    Returns:
+    - dict with totalCandidates, addressSuffix, streets and columns
+      ("street": index into streets, "houseNumber": int)
+    """
+    if not isinstance(groups, list):
+        raise ValueError("'groups' must be a list")
+
+    streets = []
+    street_index = {}
+    expanded_names = {}
+    street_column = []
+    house_column = []
+
+    for group in groups:
+        group_streets = group.get('streets') if isinstance(group, dict) else None
+        if not isinstance(group_streets, list):
+            raise ValueError(f"Group {group!r} has no 'streets' list")
+
+        for street in group_streets:
+            numbers = street_house_numbers(street)
+            if not numbers:
+                continue
+            if max_street_houses is not None and len(numbers) > max_street_houses:
+                raise ValueError(f"Street {street.get('streetName')!r} expands to {len(numbers)} houses "
+                                 f"(limit {max_street_houses})")
+            if max_rows is not None and len(house_column) + len(numbers) > max_rows:
+                raise ValueError(f"Request expands to more than {max_rows} candidates")
+
+            street_name = street.get('streetName')
+            key = (json.dumps(group.get('groupNumber')), json.dumps(street_name))
+            index = street_index.get(key)
+            if index is None:
+                if key[1] not in expanded_names:
+                    expanded_names[key[1]] = expand_street_name(street_name)
+                index = street_index[key] = len(streets)
+                streets.append({
+                    'groupNumber': group.get('groupNumber'),
+                    'streetName': street_name,
+                    'expandedStreetName': expanded_names[key[1]]
+                })
+
+            street_column.extend([index] * len(numbers))
+            house_column.extend(numbers)
+
+    return {
+        'totalCandidates': len(house_column),
+        'addressSuffix': ADDRESS_SUFFIX,
+        'streets': streets,
+        'columns': {
+            'street': street_column,
+            'houseNumber': house_column
+        }
+    }
+
+
+def candidate_rows(expanded):
+    """
+    Rebuild the node's per-candidate objects from expand_groups() output
+
+    Returns:
+    - list of {groupNumber, streetName, houseNumber, fullAddress}
+    """
+    streets = expanded['streets']
+    suffix = expanded['addressSuffix']
+    return [
+        {
+            'groupNumber': streets[index]['groupNumber'],
+            'streetName': streets[index]['streetName'],
+            'houseNumber': house,
+            'fullAddress': f"{house} {streets[index]['expandedStreetName']}{suffix}"
+        }
+        for index, house in zip(expanded['columns']['street'], expanded['columns']['houseNumber'])
+    ]
+
+
+def groups_from_payload(data):
+    """Accept {"groups": [...]}, {"routeData": {"groups": [...]}} or a bare list of groups"""
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        if isinstance(data.get('routeData'), dict):
+            return data['routeData'].get('groups')
+        return data.get('groups')
+    return None
+
+
+def main():
+    """Expand a routeData / OCR result JSON file (or stdin) and print candidate rows as JSON"""
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    else:
+        data = json.load(sys.stdin)
+
+    rows = candidate_rows(expand_groups(groups_from_payload(data)))
+    json.dump(rows, sys.stdout, indent=2)
+    print()
+    print(f"Generated {len(rows)} candidate addresses", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,24 +4,195 @@ Claude Vision API OCR Server
 Uses Claude's vision capabilities to extract table data from delivery route images
 """
 
-from flask import Flask, request, jsonify
-from PIL import Image
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 import base64
-import io
+import contextvars
+import logging
 import os
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import anthropic
 
+from address_index import open_default_index
+from candidates import candidate_rows, expand_groups, groups_from_payload
+from concurrency import InflightLimiter, ServerBusyError
+from geocode_store import GeocodeStore
+from geocoder import GeocodingEngine
+from image_prep import (
+    MAX_LONG_EDGE, ImagePrepError, decode_base64_image, preprocess_image,
+    preprocess_signature, split_into_bands
+)
+from ocr_batch import BatchRegistry, LocalMessageBatches
+from ocr_cache import OCRCache, make_cache_key
+from ocr_jobs import JobQueue, JobWorkers, callback_allowed
+from ocr_stream import GroupStreamParser
+from ocr_tiling import TILE_AXES, band_note, merge_tile_groups
+from ocr_validate import group_key, patch_rows, repair_instructions, validate_groups
+from proximity import WALKING_DISTANCE_M, grouped_proximity_mask
+from singleflight import FlightAbandoned, SingleFlight
+from telemetry import Registry, SpanRecorder, request_spans, server_timing_header, setup_logging, start_request
+from walking_order import sequence_groups
+
+setup_logging()
+logger = logging.getLogger('claude_ocr')
+
 app = Flask(__name__)
 
+# Upload limits: whole request body (JSON/multipart) and decoded image size
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('OCR_MAX_REQUEST_MB', 32)) * 1024 * 1024
+MAX_IMAGE_BYTES = int(os.environ.get('OCR_MAX_IMAGE_MB', 20)) * 1024 * 1024
+
+# Model cascade: every image is read by CLAUDE_FAST_MODEL first; groups that break
+# the house-number rules (see ocr_validate.py) are re-read by CLAUDE_MODEL, or the
+# whole sheet when more than OCR_CASCADE_SHEET_SHARE of its groups do.
+# An empty CLAUDE_FAST_MODEL sends everything straight to CLAUDE_MODEL.
+CLAUDE_MODEL = os.environ.get('CLAUDE_MODEL', "claude-sonnet-4-5-20250929")
+CLAUDE_FAST_MODEL = os.environ.get('CLAUDE_FAST_MODEL', "claude-haiku-4-5-20251001")
+CLAUDE_CASCADE = [CLAUDE_FAST_MODEL, CLAUDE_MODEL] if CLAUDE_FAST_MODEL not in ('', CLAUDE_MODEL) else [CLAUDE_MODEL]
+OCR_CASCADE_SHEET_SHARE = float(os.environ.get('OCR_CASCADE_SHEET_SHARE', 0.5))
+# Rows still breaking the rules after the cascade get one focused re-read by
+# CLAUDE_MODEL, if there are at most this many of them (0 disables it)
+OCR_REPAIR_MAX_ROWS = int(os.environ.get('OCR_REPAIR_MAX_ROWS', 12))
+
 # Initialize Claude client
 CLAUDE_API_KEY = os.environ.get('CLAUDE_API_KEY', '')
 if not CLAUDE_API_KEY:
-    print("WARNING: CLAUDE_API_KEY environment variable not set!")
+    logger.warning("CLAUDE_API_KEY environment variable not set!")
     client = None
 else:
     client = anthropic.Anthropic(api_key=CLAUDE_API_KEY)
-    print("Claude API client initialized successfully!")
+    logger.info("Claude API client initialized successfully!")
+
+# Cap on concurrent Claude calls per server process. Requests that cannot get a
+# slot within CLAUDE_QUEUE_TIMEOUT seconds get 503 + Retry-After instead of queueing.
+CLAUDE_QUEUE_TIMEOUT = float(os.environ.get('CLAUDE_QUEUE_TIMEOUT', 0))
+claude_slots = InflightLimiter(
+    int(os.environ.get('CLAUDE_MAX_INFLIGHT', 4)),
+    retry_after=int(os.environ.get('OCR_RETRY_AFTER', 15))
+)
+
+# Set when the process is shutting down: in-flight calls finish, new work is refused
+draining = threading.Event()
+
+def begin_draining():
+    """Stop accepting new OCR work (called from the gunicorn SIGTERM hook)"""
+    if not draining.is_set():
+        logger.info("Draining: refusing new OCR requests, finishing in-flight ones")
+        draining.set()
+
+def busy_response(retry_after, message):
+    """503 response telling the caller when to retry"""
+    response = jsonify({"error": message, "groups": []})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 503
+
+# Cache of parsed OCR results, keyed by image bytes + prompt + model
+ocr_cache = OCRCache(
+    max_entries=int(os.environ.get('OCR_CACHE_MAX_ENTRIES', 256)),
+    max_bytes=int(os.environ.get('OCR_CACHE_MAX_MB', 64)) * 1024 * 1024,
+    disk_dir=os.environ.get('OCR_CACHE_DIR') or None
+)
+# Identical images already being read by Claude (double uploads, webhook
+# retries) wait for that call instead of making their own; keyed like the cache
+ocr_flights = SingleFlight()
+
+# /ocr/batch settings. Sync batches share the Claude in-flight cap with single
+# requests, but wait up to OCR_BATCH_SLOT_TIMEOUT for a slot instead of failing.
+OCR_BATCH_MAX_IMAGES = int(os.environ.get('OCR_BATCH_MAX_IMAGES', 100))
+OCR_BATCH_SLOT_TIMEOUT = float(os.environ.get('OCR_BATCH_SLOT_TIMEOUT', 300))
+batch_registry = BatchRegistry(os.environ.get('OCR_BATCH_DIR', '/tmp/ocr_batches'))
+# "anthropic" submits to the Message Batches API; "local" runs an in-process stand-in
+if client and os.environ.get('OCR_BATCH_BACKEND', 'anthropic') == 'local':
+    message_batches = LocalMessageBatches(client, workers=claude_slots.limit)
+    # The stand-in makes ordinary Messages calls, billed at the full price
+    BATCH_PRICE_FACTOR = 1.0
+else:
+    message_batches = client.messages.batches if client else None
+    # Message Batches usage is billed at half the standard token prices
+    BATCH_PRICE_FACTOR = float(os.environ.get('CLAUDE_BATCH_PRICE_FACTOR', 0.5))
+
+# Asynchronous /ocr/jobs: a durable SQLite queue shared by every worker process;
+# each process runs OCR_JOB_WORKERS job threads under the same Claude in-flight cap
+job_queue = JobQueue(os.environ.get('OCR_JOB_DB', '/tmp/ocr_jobs/jobs.sqlite'))
+OCR_JOB_WORKERS = int(os.environ.get('OCR_JOB_WORKERS', 2))
+# Hosts finished jobs may be POSTed to (comma-separated; ".example.com" includes subdomains)
+OCR_CALLBACK_HOSTS = [h.strip().lower() for h in os.environ.get('OCR_CALLBACK_HOSTS', '').split(',') if h.strip()]
+
+# Tiled extraction: split big tables into overlapping bands read concurrently
+OCR_MAX_TILES = int(os.environ.get('OCR_MAX_TILES', 8))
+OCR_TILE_OVERLAP = float(os.environ.get('OCR_TILE_OVERLAP', 0.1))
+
+# Bounds on /candidates range expansion, so one request can't build millions of rows
+CANDIDATES_MAX_STREET_HOUSES = int(os.environ.get('CANDIDATES_MAX_STREET_HOUSES', 5000))
+CANDIDATES_MAX_ROWS = int(os.environ.get('CANDIDATES_MAX_ROWS', 200000))
+
+# Offline address index and persistent geocode store, both consulted by /geocode
+# before calling Google
+GOOGLE_MAPS_API_KEY = os.environ.get('GOOGLE_MAPS_API_KEY', '')
+address_index = open_default_index()
+geocode_store = GeocodeStore(os.environ.get('GEOCODE_STORE_PATH', 'geocode_store.sqlite'))
+geocoding_engine = GeocodingEngine(
+    GOOGLE_MAPS_API_KEY,
+    qps=float(os.environ.get('GEOCODE_QPS', 20)),
+    daily_quota=int(os.environ.get('GEOCODE_DAILY_QUOTA', 40000)),
+    workers=int(os.environ.get('GEOCODE_WORKERS', 8)),
+    store=geocode_store,
+    local_index=address_index
+)
+
+# Metrics exposed on /metrics (per server process; each gunicorn worker has its own)
+CLAUDE_INPUT_PRICE_PER_MTOK = float(os.environ.get('CLAUDE_INPUT_PRICE_PER_MTOK', 3.0))
+CLAUDE_OUTPUT_PRICE_PER_MTOK = float(os.environ.get('CLAUDE_OUTPUT_PRICE_PER_MTOK', 15.0))
+CLAUDE_FAST_INPUT_PRICE_PER_MTOK = float(os.environ.get('CLAUDE_FAST_INPUT_PRICE_PER_MTOK', 1.0))
+CLAUDE_FAST_OUTPUT_PRICE_PER_MTOK = float(os.environ.get('CLAUDE_FAST_OUTPUT_PRICE_PER_MTOK', 5.0))
+
+metrics = Registry()
+spans = SpanRecorder(metrics.histogram(
+    'ocr_stage_seconds', 'Time spent in each request processing stage', ['stage']))
+http_requests = metrics.counter(
+    'ocr_http_requests_total', 'HTTP requests by endpoint and status', ['endpoint', 'status'])
+http_seconds = metrics.histogram(
+    'ocr_http_request_seconds', 'HTTP request latency by endpoint', ['endpoint'])
+claude_seconds = metrics.histogram(
+    'claude_request_seconds', 'Latency of Claude API calls', ['model', 'outcome'])
+claude_tokens = metrics.counter(
+    'claude_tokens_total', 'Claude tokens used, by type', ['model', 'type'])
+claude_cost = metrics.counter(
+    'claude_cost_usd_total', 'Estimated Claude spend in USD', ['model'])
+sheet_tokens = metrics.histogram(
+    'ocr_sheet_tokens', 'Claude tokens (input + output) per extracted sheet', [],
+    buckets=(500, 1000, 2000, 3000, 4000, 6000, 8000, 12000, 16000, 32000))
+sheet_cost = metrics.histogram(
+    'ocr_sheet_cost_usd', 'Estimated Claude cost per extracted sheet in USD', [],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.02, 0.03, 0.05, 0.1, 0.25))
+ocr_cascade = metrics.counter(
+    'ocr_cascade_total', 'Images read through the model cascade, by how far they escalated', ['escalated'])
+ocr_row_repairs = metrics.counter(
+    'ocr_row_repairs_total', 'Invalid rows sent for a focused re-read, by outcome', ['outcome'])
+metrics.gauge('claude_inflight', 'Claude calls currently in flight',
+              lambda: claude_slots.stats()['active'])
+metrics.gauge('claude_inflight_rejected_total', 'Requests refused because no Claude slot was free',
+              lambda: claude_slots.stats()['rejected'])
+metrics.gauge('ocr_cache_events', 'OCR result cache counters', lambda: {
+    (name,): ocr_cache.stats()[name]
+    for name in ('memory_hits', 'disk_hits', 'misses', 'stores', 'evictions', 'bypassed')
+}, ['event'])
+metrics.gauge('ocr_cache_entries', 'Entries in the in-memory OCR cache', lambda: ocr_cache.stats()['entries'])
+metrics.gauge('ocr_singleflight_events', 'OCR extractions started (leaders) and joined by identical requests', lambda: {
+    (name,): ocr_flights.stats()[name] for name in ('leaders', 'coalesced', 'abandoned')
+}, ['event'])
+metrics.gauge('ocr_jobs', 'Jobs in the /ocr/jobs queue by status (all processes)', lambda: {
+    (name,): count for name, count in job_queue.stats().items() if name != 'oldest_queued_seconds'
+}, ['status'])
+metrics.gauge('ocr_job_oldest_queued_seconds', 'Age of the oldest queued /ocr/jobs job',
+              lambda: job_queue.stats()['oldest_queued_seconds'])
+metrics.gauge('ocr_job_events', 'Jobs finished, retried and callbacks sent by this process', lambda: {
+    (name,): count for name, count in job_workers.counters.items()
+}, ['event'])
+metrics.gauge('geocode_coalesced_total', 'Geocode lookups answered by an identical lookup in flight',
+              lambda: geocoding_engine.stats['coalesced'])
 
 # Prompt for Claude to extract table data
 EXTRACTION_PROMPT = """You are analyzing a delivery route table image. Extract all the route information in a structured format.
@@ -62,16 +233,737 @@ Important:
 
 Return ONLY the JSON object, no additional text or explanation."""
 
+@app.before_request
+def begin_request_timing():
+    """Start the per-request span list and clock"""
+    start_request()
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def finish_request_timing(response):
+    """Record request metrics, add a Server-Timing header and log one line per request"""
+    elapsed = time.perf_counter() - g.get('request_start', time.perf_counter())
+    endpoint = request.endpoint or 'unknown'
+    http_requests.inc(endpoint=endpoint, status=response.status_code)
+    http_seconds.observe(elapsed, endpoint=endpoint)
+    
+    stages = request_spans()
+    totals = {}
+    for name, seconds in stages:
+        totals[name] = totals.get(name, 0.0) + seconds
+    response.headers['Server-Timing'] = server_timing_header(stages, total=elapsed)
+    
+    # Health checks and scrapes would drown out the OCR traffic at INFO
+    level = logging.DEBUG if endpoint in ('health', 'metrics') else logging.INFO
+    logger.log(level, "%s %s %s", request.method, request.path, response.status_code, extra={'fields': {
+        'endpoint': endpoint,
+        'status': response.status_code,
+        'duration_ms': round(elapsed * 1000, 1),
+        'spans': {name: round(seconds * 1000, 1) for name, seconds in totals.items()}
+    }})
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text exposition of this process's metrics"""
+    return Response(metrics.expose(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
     status = "healthy" if client else "unhealthy - no API key"
+    if draining.is_set():
+        status = "draining"
     return jsonify({
         "status": status,
         "service": "claude-ocr",
-        "api_key_set": bool(CLAUDE_API_KEY)
+        "api_key_set": bool(CLAUDE_API_KEY),
+        "claude_inflight": claude_slots.stats(),
+        "cache": ocr_cache.stats(),
+        "coalescing": {"ocr": ocr_flights.stats(), "geocode": geocoding_engine.stats['coalesced']},
+        "jobs": {"queue": job_queue.stats(), "workers": OCR_JOB_WORKERS if client else 0,
+                 "events": job_workers.counters},
+        "geocode_store": geocode_store.stats(),
+        "address_index": address_index.stats() if address_index else None
+    }), 503 if draining.is_set() else 200
+
+@app.route('/geocode', methods=['GET', 'POST'])
+def geocode():
+    """
+    Look up addresses in the geocode store, falling back to Google on a miss
+    
+    Accepts:
+    - GET ?address=<fullAddress>
+    - POST JSON {"addresses": ["<fullAddress>", ...]}
+    
+    Returns:
+    - geocode_address() result dict(s), each with its fullAddress
+    """
+    if request.method == 'GET':
+        address = request.args.get('address', '').strip()
+        if not address:
+            return jsonify({"error": "Missing 'address' query parameter"}), 400
+        addresses = [address]
+    else:
+        data = request.get_json(silent=True) or {}
+        addresses = [a for a in data.get('addresses', []) if isinstance(a, str) and a.strip()]
+        if not addresses:
+            return jsonify({"error": "Provide a non-empty 'addresses' list"}), 400
+    
+    if not GOOGLE_MAPS_API_KEY:
+        # Still answer from the index and store, but misses cannot be resolved
+        results = [(address_index and address_index.get(a)) or geocode_store.get(a) or {
+            'coordinates': None,
+            'location_type': None,
+            'status': 'error',
+            'exists': False,
+            'error': 'GOOGLE_MAPS_API_KEY not set'
+        } for a in addresses]
+    else:
+        results = geocoding_engine.geocode_many(addresses)
+    
+    results = [{'fullAddress': a, **r} for a, r in zip(addresses, results)]
+    
+    if request.method == 'GET':
+        return jsonify(results[0]), 200
+    return jsonify({"results": results}), 200
+
+@app.route('/candidates', methods=['POST'])
+def candidates():
+    """
+    Expand route groups into candidate addresses (same output as nodes/generate-candidates.js)
+    
+    Accepts:
+    - JSON {"groups": [...]}, {"routeData": {"groups": [...]}} or an /ocr/table result
+    - ?format=columns (default) or ?format=rows
+    
+    Returns:
+    - columns: {"totalCandidates", "addressSuffix", "streets": [{groupNumber, streetName,
+      expandedStreetName}], "columns": {"street": [...], "houseNumber": [...]}} where
+      fullAddress = f"{houseNumber} {expandedStreetName}{addressSuffix}"
+    - rows: {"totalCandidates", "candidates": [{groupNumber, streetName, houseNumber, fullAddress}]}
+    - 400 when a street expands past CANDIDATES_MAX_STREET_HOUSES houses or the
+      request past CANDIDATES_MAX_ROWS candidates
+    """
+    groups = groups_from_payload(request.get_json(silent=True))
+    if groups is None:
+        return jsonify({"error": "Provide 'groups' or 'routeData.groups'"}), 400
+    
+    fmt = request.args.get('format', 'columns')
+    if fmt not in ('columns', 'rows'):
+        return jsonify({"error": f"Unknown format '{fmt}'"}), 400
+    
+    try:
+        with spans.span('candidate_expand'):
+            expanded = expand_groups(groups, CANDIDATES_MAX_STREET_HOUSES, CANDIDATES_MAX_ROWS)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid request: {str(e)}"}), 400
+    
+    if fmt == 'rows':
+        return jsonify({
+            "totalCandidates": expanded['totalCandidates'],
+            "candidates": candidate_rows(expanded)
+        }), 200
+    return jsonify(expanded), 200
+
+@app.route('/proximity', methods=['POST'])
+def proximity():
+    """
+    Walking-distance filter for geocoded addresses (rule of nodes/aggregate-results.js)
+    
+    Accepts:
+    - JSON {"addresses": [{groupNumber, coordinates: {lat, lng}, ...}, ...],
+      "maxDistance": metres (default WALKING_DISTANCE_M)}
+    
+    Returns:
+    - {"keep": [bool per address], "kept": n, "discarded": n, "maxDistance": m}
+      Addresses are judged within their groupNumber, in the order given.
+    """
+    data = request.get_json(silent=True) or {}
+    addresses = data.get('addresses')
+    if not isinstance(addresses, list) or not all(isinstance(a, dict) for a in addresses):
+        return jsonify({"error": "Provide an 'addresses' list of objects"}), 400
+    try:
+        max_distance = float(data.get('maxDistance', WALKING_DISTANCE_M))
+        if max_distance <= 0:
+            raise ValueError("maxDistance must be positive")
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid request: {str(e)}"}), 400
+    
+    with spans.span('proximity_filter'):
+        keep = grouped_proximity_mask(addresses, max_distance)
+    
+    return jsonify({
+        "maxDistance": max_distance,
+        "kept": sum(keep),
+        "discarded": len(keep) - sum(keep),
+        "keep": keep
     }), 200
 
+@app.route('/sequence', methods=['POST'])
+def sequence():
+    """
+    Walking order of validated addresses, per group (see walking_order.py)
+    
+    Accepts:
+    - JSON {"addresses": [{groupNumber, coordinates: {lat, lng}, ...}, ...]},
+      e.g. the addresses /proximity kept
+    
+    Returns:
+    - {"groups": [{"groupNumber", "order": [indexes into addresses], "distanceM"}],
+       "totalDistanceM"}; addresses without coordinates end their group's order.
+      Groups are matched by string value as in /proximity, so 1 and "1" are one group.
+    """
+    data = request.get_json(silent=True) or {}
+    addresses = data.get('addresses')
+    if not isinstance(addresses, list) or not all(isinstance(a, dict) for a in addresses):
+        return jsonify({"error": "Provide an 'addresses' list of objects"}), 400
+    
+    if any(isinstance(address.get('groupNumber'), (list, dict)) for address in addresses):
+        return jsonify({"error": "groupNumber must be a string or a number"}), 400
+    
+    groups = {}
+    group_numbers = {}
+    for index, address in enumerate(addresses):
+        key = str(address.get('groupNumber'))
+        group_numbers.setdefault(key, address.get('groupNumber'))
+        groups.setdefault(key, []).append(index)
+    
+    with spans.span('sequence'):
+        walks = sequence_groups([addresses[i] for i in indexes] for indexes in groups.values())
+    
+    positions = {id(address): index for index, address in enumerate(addresses)}
+    result = [
+        {"groupNumber": group_numbers[key],
+         "order": [positions[id(address)] for address in walk],
+         "distanceM": round(length, 1)}
+        for key, (walk, length) in zip(groups, walks)
+    ]
+    return jsonify({
+        "groups": result,
+        "totalDistanceM": round(sum(group["distanceM"] for group in result), 1)
+    }), 200
+
+def ocr_unavailable():
+    """Response to send when OCR work cannot be accepted right now, else None"""
+    if not client:
+        return jsonify({
+            "error": "Claude API client not initialized. Set CLAUDE_API_KEY environment variable."
+        }), 500
+    if draining.is_set():
+        return busy_response(claude_slots.retry_after, "Server is shutting down")
+    return None
+
+def cache_bypassed(data=None):
+    """True if the caller asked to skip the result cache (?nocache=1 or "noCache": true)"""
+    if request.args.get('nocache', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return bool(data and data.get('noCache'))
+
+def ocr_error(e):
+    """
+    Map an exception raised while processing an image to an error payload
+    
+    Returns:
+    - (payload, status) tuple; busy errors carry "retryAfter"
+    """
+    if isinstance(e, ImagePrepError):
+        logger.info("Rejecting image: %s", e)
+        return {"error": f"Invalid image: {str(e)}", "groups": []}, 400
+    if isinstance(e, ValueError):
+        logger.info("Rejecting request: %s", e)
+        return {"error": f"Invalid request: {str(e)}", "groups": []}, 400
+    if isinstance(e, ServerBusyError):
+        logger.warning("Rejecting request: %s", e)
+        return {"error": str(e), "groups": [], "retryAfter": e.retry_after}, 503
+    if isinstance(e, anthropic.APIError):
+        logger.error("Claude API error: %s", e)
+        return {
+            "error": f"Claude API error: {str(e)}",
+            "groups": []
+        }, 500
+    logger.exception("Unexpected error: %s", e)
+    return {
+        "error": f"Server error: {str(e)}",
+        "groups": []
+    }, 500
+
+def ocr_error_response(e):
+    """Map an exception raised while processing an image to a JSON error response"""
+    payload, status = ocr_error(e)
+    if status == 503:
+        return busy_response(payload['retryAfter'], payload['error'])
+    return jsonify(payload), status
+
+def claude_request_params(image_data, media_type, instructions=None, model=None, max_tokens=4096):
+    """
+    Keyword arguments for client.messages.create for one route sheet image
+    
+    The static EXTRACTION_PROMPT goes first, as a cached system block; per-call
+    instructions (tile bands, group re-reads) follow the image.
+    """
+    return {
+        "model": model or CLAUDE_MODEL,
+        "max_tokens": max_tokens,
+        "system": [
+            {
+                "type": "text",
+                "text": EXTRACTION_PROMPT,
+                "cache_control": {"type": "ephemeral"}
+            }
+        ],
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image",
+                        "source": {
+                            "type": "base64",
+                            "media_type": media_type,
+                            "data": base64.b64encode(image_data).decode('ascii'),
+                        },
+                    },
+                    {
+                        "type": "text",
+                        "text": instructions or "Extract the route table in this image."
+                    }
+                ],
+            }
+        ],
+    }
+
+def model_prices(model):
+    """(input, output) USD per million tokens for a model"""
+    if model == CLAUDE_FAST_MODEL and model != CLAUDE_MODEL:
+        return CLAUDE_FAST_INPUT_PRICE_PER_MTOK, CLAUDE_FAST_OUTPUT_PRICE_PER_MTOK
+    return CLAUDE_INPUT_PRICE_PER_MTOK, CLAUDE_OUTPUT_PRICE_PER_MTOK
+
+def record_claude_usage(model, usage, price_factor=1.0):
+    """
+    Count the tokens of one Claude reply and its estimated cost
+    
+    price_factor scales the per-token prices (BATCH_PRICE_FACTOR for Message Batches)
+    
+    Returns:
+    - (tokens, cost_usd) for this call; (0, 0.0) if usage is missing
+    """
+    if usage is None:
+        return 0, 0.0
+    counts = {
+        'input': getattr(usage, 'input_tokens', 0) or 0,
+        'output': getattr(usage, 'output_tokens', 0) or 0,
+        'cache_read': getattr(usage, 'cache_read_input_tokens', 0) or 0,
+        'cache_creation': getattr(usage, 'cache_creation_input_tokens', 0) or 0
+    }
+    for token_type, count in counts.items():
+        if count:
+            claude_tokens.inc(count, model=model, type=token_type)
+    
+    # Cache reads bill at 0.1x and cache writes at 1.25x the input price
+    input_price, output_price = model_prices(model)
+    cost = (
+        counts['input'] * input_price
+        + counts['cache_read'] * input_price * 0.1
+        + counts['cache_creation'] * input_price * 1.25
+        + counts['output'] * output_price
+    ) * price_factor / 1_000_000
+    claude_cost.inc(cost, model=model)
+    logger.debug("Claude usage", extra={'fields': {'model': model, **counts, 'cost_usd': round(cost, 6)}})
+    return sum(counts.values()), cost
+
+def record_sheet_usage(tokens, cost):
+    """Observe the total tokens/cost spent extracting one sheet"""
+    sheet_tokens.observe(tokens)
+    sheet_cost.observe(cost)
+
+def call_claude(params):
+    """
+    client.messages.create with latency, span and token accounting
+    
+    Returns:
+    - (message, tokens, cost_usd)
+    """
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        with spans.span('claude_call'):
+            message = client.messages.create(**params)
+        outcome = 'ok'
+    finally:
+        claude_seconds.observe(time.perf_counter() - start, model=params['model'], outcome=outcome)
+    tokens, cost = record_claude_usage(params['model'], getattr(message, 'usage', None))
+    return message, tokens, cost
+
+def parse_claude_json(response_text):
+    """
+    Pull the JSON object out of Claude's reply (which may be wrapped in a code block)
+    
+    Returns:
+    - (extracted_data, response_text): extracted_data is None if it didn't parse
+    """
+    logger.debug("Claude response length: %d chars, preview: %s...", len(response_text), response_text[:200])
+    
+    with spans.span('json_extract'):
+        return _parse_claude_json(response_text)
+
+def _parse_claude_json(response_text):
+    try:
+        # Claude might wrap the JSON in markdown code blocks
+        if '```json' in response_text:
+            json_start = response_text.find('```json') + 7
+            json_end = response_text.find('```', json_start)
+            response_text = response_text[json_start:json_end].strip()
+        elif '```' in response_text:
+            json_start = response_text.find('```') + 3
+            json_end = response_text.find('```', json_start)
+            response_text = response_text[json_start:json_end].strip()
+        
+        return json.loads(response_text), response_text
+    except json.JSONDecodeError as e:
+        logger.warning("JSON parse error: %s", e)
+        logger.debug("Response text: %s", response_text)
+        return None, response_text
+
+def format_ocr_result(groups, raw_response, prep_info=None, model=None):
+    """Build the /ocr/table response structure from extracted groups"""
+    with spans.span('response_build'):
+        return _format_ocr_result(groups, raw_response, prep_info, model or CLAUDE_MODEL)
+
+def _format_ocr_result(groups, raw_response, prep_info, model):
+    # Build full text representation
+    full_text_lines = []
+    for group in groups:
+        full_text_lines.append(f"\nGroup {group['groupNumber']}:")
+        for street in group.get('streets', []):
+            street_line = f"  {street['streetName']}"
+            if street.get('fromHouse') or street.get('toHouse'):
+                street_line += f" ({street.get('fromHouse', '')} - {street.get('toHouse', '')})"
+            full_text_lines.append(street_line)
+    
+    full_text = '\n'.join(full_text_lines)
+    
+    # Format response in a structure compatible with existing workflow
+    result = {
+        "success": True,
+        "source": "claude-vision",
+        "model": model,
+        "groups": groups,
+        "fullText": full_text,
+        "totalGroups": len(groups),
+        "totalStreets": sum(len(g.get('streets', [])) for g in groups),
+        "rawResponse": raw_response,
+        "preprocessing": prep_info
+    }
+    
+    logger.info("Extracted %d groups, %d streets", result['totalGroups'], result['totalStreets'])
+    
+    return result
+
+def build_ocr_result(response_text, prep_info=None, model=None):
+    """
+    Parse Claude's reply into the /ocr/table response structure
+    
+    Returns:
+    - (payload, status) tuple; payload has "success": True only if the JSON parsed
+    """
+    extracted_data, response_text = parse_claude_json(response_text)
+    if extracted_data is None:
+        # Return the raw response if we can't parse it
+        return {
+            "error": "Failed to parse Claude response as JSON",
+            "raw_response": response_text,
+            "groups": []
+        }, 200
+    
+    # Transform to match n8n workflow expected format
+    return format_ocr_result(extracted_data.get('groups', []), response_text, prep_info, model), 200
+
+def follow_up_timeout(slot_timeout):
+    """
+    Slot wait for a sheet's calls after the first one
+    
+    Only the first call may fail fast on a full server; once it has been paid
+    for, escalations wait (up to OCR_BATCH_SLOT_TIMEOUT) rather than turning
+    the whole sheet into a 503.
+    """
+    return max(slot_timeout, OCR_BATCH_SLOT_TIMEOUT)
+
+def read_image(image_data, media_type, slot_timeout, instructions=None):
+    """
+    Read one image (or tile band) through the model cascade
+    
+    The fast model reads everything. Groups whose rows break the house-number
+    rules are re-read by CLAUDE_MODEL and patched in by groupNumber; if the
+    reply doesn't parse, is empty, or more than OCR_CASCADE_SHEET_SHARE of the
+    groups are bad, CLAUDE_MODEL reads the whole image instead.
+    
+    Returns:
+    - (extracted_data, response_text, cascade): extracted_data is None if no reply
+      parsed; cascade = {"models", "escalated", "groupsEscalated", "problems", "tokens", "costUsd"}
+    """
+    cascade = {"models": [], "escalated": "none", "groupsEscalated": [], "problems": 0, "tokens": 0, "costUsd": 0.0}
+    
+    def ask(model, note=None):
+        text = '\n\n'.join(part for part in (instructions, note) if part) or None
+        timeout = follow_up_timeout(slot_timeout) if cascade["models"] else slot_timeout
+        with claude_slots.slot(timeout=timeout):
+            message, tokens, cost = call_claude(claude_request_params(image_data, media_type, text, model))
+        cascade["models"].append(model)
+        cascade["tokens"] += tokens
+        cascade["costUsd"] += cost
+        return parse_claude_json(message.content[0].text)
+    
+    data, response_text = ask(CLAUDE_CASCADE[0])
+    groups = (data or {}).get('groups') or []
+    if len(CLAUDE_CASCADE) > 1:
+        bad = list(dict.fromkeys(group_key(row['groupNumber']) for row in validate_groups(groups)))
+        if not groups or len(bad) > OCR_CASCADE_SHEET_SHARE * len(groups):
+            cascade["escalated"] = "sheet"
+            strong_data, strong_text = ask(CLAUDE_MODEL)
+            if strong_data is not None or data is None:
+                data, response_text = strong_data, strong_text
+                groups = (data or {}).get('groups') or []
+        elif bad:
+            cascade["escalated"] = "groups"
+            cascade["groupsEscalated"] = bad
+            strong_data, strong_text = ask(
+                CLAUDE_MODEL, f"Only extract group(s) {', '.join(bad)}; leave every other group out.")
+            reread = {group_key(g.get('groupNumber')): g for g in (strong_data or {}).get('groups') or []}
+            groups = [reread.get(group_key(g.get('groupNumber')), g) for g in groups]
+            data = {**data, 'groups': groups}
+            response_text = f"{response_text}\n{strong_text}"
+    
+    cascade["problems"] = len(validate_groups(groups))
+    ocr_cascade.inc(escalated=cascade["escalated"])
+    return data, response_text, cascade
+
+def merge_cascades(cascades):
+    """Combine the cascade reports of several reads (e.g. tile bands) into one"""
+    escalations = [c["escalated"] for c in cascades]
+    return {
+        "models": list(dict.fromkeys(m for c in cascades for m in c["models"])),
+        "escalated": next((e for e in ("sheet", "groups") if e in escalations), "none"),
+        "groupsEscalated": list(dict.fromkeys(g for c in cascades for g in c["groupsEscalated"])),
+        "problems": sum(c["problems"] for c in cascades),
+        "tokens": sum(c["tokens"] for c in cascades),
+        "costUsd": sum(c["costUsd"] for c in cascades)
+    }
+
+def cascade_result(result, cascade):
+    """Add the cascade report and the strongest model used to a /ocr/table payload"""
+    cascade = {**cascade, "costUsd": round(cascade["costUsd"], 6)}
+    result["model"] = CLAUDE_MODEL if CLAUDE_MODEL in cascade["models"] else CLAUDE_CASCADE[0]
+    result["models"] = cascade["models"]
+    result["cascade"] = cascade
+    return result
+
+def repair_rows(image_data, media_type, groups, slot_timeout):
+    """
+    Re-read only the rows that break the house-number rules and patch them in
+    
+    One short CLAUDE_MODEL call lists the bad rows and asks for just their
+    numbers, instead of re-running the whole extraction.
+    
+    Returns:
+    - (groups, repair): repair is None when every row is valid or repairs are off,
+      else {"rows", "patched", "fixed", "remaining", "tokens", "costUsd"}
+      ("skipped": true, no call made, when there are more than OCR_REPAIR_MAX_ROWS)
+    """
+    invalid = validate_groups(groups) if OCR_REPAIR_MAX_ROWS else []
+    if not invalid:
+        return groups, None
+    if len(invalid) > OCR_REPAIR_MAX_ROWS:
+        ocr_row_repairs.inc(len(invalid), outcome='skipped')
+        return groups, {"rows": len(invalid), "skipped": True, "patched": 0, "fixed": 0,
+                        "remaining": invalid, "tokens": 0, "costUsd": 0.0}
+    
+    # Always a follow-up to a reading already paid for, so wait for a slot rather than fail
+    with claude_slots.slot(timeout=follow_up_timeout(slot_timeout)):
+        message, tokens, cost = call_claude(claude_request_params(
+            image_data, media_type, repair_instructions(groups, invalid), CLAUDE_MODEL, max_tokens=1024))
+    data, _ = parse_claude_json(message.content[0].text)
+    groups, patched = patch_rows(groups, invalid, (data or {}).get('rows') or [])
+    remaining = validate_groups(groups)
+    fixed = len(invalid) - len(remaining)
+    ocr_row_repairs.inc(fixed, outcome='fixed')
+    ocr_row_repairs.inc(len(remaining), outcome='unfixed')
+    logger.info("Re-read %d invalid rows: %d patched, %d fixed", len(invalid), patched, fixed)
+    return groups, {"rows": len(invalid), "patched": patched, "fixed": fixed, "remaining": remaining,
+                    "tokens": tokens, "costUsd": round(cost, 6)}
+
+def extract_tiled(image_data, media_type, tiles, axis, prep_info, slot_timeout):
+    """
+    Extract a table as `tiles` overlapping bands read concurrently, then merge
+    
+    Wall-clock time is bounded by the slowest band rather than the whole sheet,
+    and each band's reply stays well under max_tokens.
+    
+    Returns:
+    - (payload, status) tuple in the /ocr/table structure
+    """
+    bands = split_into_bands(image_data, tiles, axis, overlap=OCR_TILE_OVERLAP)
+    
+    def read_band(index):
+        band_data, band_type = bands[index]
+        return read_image(band_data, band_type, slot_timeout, band_note(index, tiles, axis))
+    
+    with ThreadPoolExecutor(max_workers=tiles) as pool:
+        # Run each band in a copy of the request context so its spans land in this request
+        futures = [pool.submit(contextvars.copy_context().run, read_band, i) for i in range(tiles)]
+        bands_read = [future.result() for future in futures]
+    cascade = merge_cascades([c for _, _, c in bands_read])
+    raw_response = '\n'.join(text for _, text, _ in bands_read)
+    
+    failed = [i for i, (data, _, _) in enumerate(bands_read) if data is None]
+    if len(failed) == tiles:
+        record_sheet_usage(cascade["tokens"], cascade["costUsd"])
+        return {
+            "error": "Failed to parse Claude response as JSON",
+            "raw_response": raw_response,
+            "groups": []
+        }, 200
+    
+    groups = merge_tile_groups(data.get('groups', []) for data, _, _ in bands_read if data is not None)
+    cascade["problems"] = len(validate_groups(groups))
+    # Rows are re-read against the whole sheet: a merged group may span bands
+    groups, repair = repair_rows(image_data, media_type, groups, slot_timeout)
+    result = finish_result(groups, raw_response, prep_info, cascade, repair)
+    result["tiles"] = {"count": tiles, "axis": axis, "failed": failed}
+    return result, 200
+
+def finish_result(groups, raw_response, prep_info, cascade, repair):
+    """/ocr/table payload for a parsed reading, recording the sheet's total usage"""
+    spent = [cascade] + ([repair] if repair else [])
+    record_sheet_usage(sum(s["tokens"] for s in spent), sum(s["costUsd"] for s in spent))
+    result = cascade_result(format_ocr_result(groups, raw_response, prep_info), cascade)
+    if repair:
+        result["repair"] = repair
+    return result
+
+def ocr_cache_key(image_bytes, tiles=1, tile_axis='rows', single=False):
+    """
+    Cache key for an uploaded image under the current prompt/model/preprocessing
+    
+    single: the reading is one unvalidated CLAUDE_MODEL call (/ocr/stream and
+    Message Batches), kept apart from cascade + repair results
+    """
+    variant = preprocess_signature()
+    if single:
+        return make_cache_key(image_bytes, EXTRACTION_PROMPT, CLAUDE_MODEL, variant + "|single")
+    if tiles > 1:
+        variant += f"|tiles:{tiles}:{tile_axis}:{OCR_TILE_OVERLAP}"
+    if OCR_REPAIR_MAX_ROWS:
+        variant += "|repair"
+    return make_cache_key(image_bytes, EXTRACTION_PROMPT, '>'.join(CLAUDE_CASCADE), variant)
+
+def tiling_options(data=None):
+    """
+    Read tiles / tileAxis from the query string or JSON body
+    
+    Returns:
+    - (tiles, tile_axis); raises ValueError for out-of-range values
+    """
+    data = data or {}
+    tiles = int(request.args.get('tiles') or data.get('tiles') or 1)
+    tile_axis = request.args.get('tileAxis') or data.get('tileAxis') or 'rows'
+    if not 1 <= tiles <= OCR_MAX_TILES:
+        raise ValueError(f"tiles must be between 1 and {OCR_MAX_TILES}")
+    if tile_axis not in TILE_AXES:
+        raise ValueError(f"tileAxis must be one of {', '.join(TILE_AXES)}")
+    return tiles, tile_axis
+
+def extract_table(image_bytes, bypass_cache=False, slot_timeout=None, tiles=1, tile_axis='rows'):
+    """
+    Run one decoded image through the cache, preprocessing and Claude
+    
+    slot_timeout overrides how long to wait for a free Claude slot
+    (defaults to CLAUDE_QUEUE_TIMEOUT). With tiles > 1 the table is read as
+    overlapping bands in parallel (see extract_tiled). Concurrent calls for
+    the same image share one Claude call; the followers' payloads carry
+    "coalesced": true.
+    
+    Returns:
+    - (payload, status) tuple ready for jsonify
+    """
+    cache_key = ocr_cache_key(image_bytes, tiles, tile_axis)
+    if bypass_cache:
+        ocr_cache.record_bypass()
+    else:
+        cached = ocr_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Cache hit for image %s", cache_key[:12])
+            return {**cached, "cached": True}, 200
+    
+    (payload, status), shared = ocr_flights.do(
+        cache_key, lambda: run_extraction(image_bytes, cache_key, slot_timeout, tiles, tile_axis))
+    if shared:
+        logger.info("Coalesced with in-flight extraction of image %s", cache_key[:12])
+        return {**payload, "cached": False, "coalesced": True}, status
+    return {**payload, "cached": False}, status
+
+def run_extraction(image_bytes, cache_key, slot_timeout, tiles, tile_axis):
+    """
+    Preprocess and read one image with Claude, caching a successful result
+    
+    Returns:
+    - (payload, status) tuple, without the "cached" flag
+    """
+    # Single decode + (at most) single encode of the upload. Tiled mode keeps
+    # enough resolution that each band still gets the full long-edge budget.
+    with spans.span('image_prep'):
+        image_data, media_type, prep_info = preprocess_image(image_bytes, max_long_edge=MAX_LONG_EDGE * tiles)
+    
+    logger.info("Processing image with Claude: %s -> %s, %d -> %d bytes, steps: %s",
+                prep_info['originalSize'], prep_info['size'],
+                prep_info['originalBytes'], prep_info['bytes'], prep_info['steps'])
+    
+    if tiles > 1:
+        # Bands of one sheet wait for slots rather than failing half-way through
+        timeout = OCR_BATCH_SLOT_TIMEOUT if slot_timeout is None else slot_timeout
+        payload, status = extract_tiled(image_data, media_type, tiles, tile_axis, prep_info, timeout)
+    else:
+        # Call Claude API with vision (bounded by the in-flight cap)
+        timeout = CLAUDE_QUEUE_TIMEOUT if slot_timeout is None else slot_timeout
+        data, response_text, cascade = read_image(image_data, media_type, timeout)
+        
+        if data is None:
+            record_sheet_usage(cascade["tokens"], cascade["costUsd"])
+            payload, status = {
+                "error": "Failed to parse Claude response as JSON",
+                "raw_response": response_text,
+                "groups": []
+            }, 200
+        else:
+            groups, repair = repair_rows(image_data, media_type, data.get('groups', []), timeout)
+            payload, status = finish_result(groups, response_text, prep_info, cascade, repair), 200
+    
+    if payload.get('success'):
+        ocr_cache.put(cache_key, payload)
+    
+    return payload, status
+
+def image_from_request():
+    """
+    Read the single image of an /ocr/table-style request
+    
+    Returns:
+    - (image_bytes, data): data is the JSON body (options), or None for multipart
+    """
+    # Handle base64 encoded image
+    if request.is_json:
+        with spans.span('body_read'):
+            data = request.get_json()
+        with spans.span('base64_decode'):
+            return decode_base64_image(data.get('base64Image', '')), data
+    
+    # Handle file upload
+    if 'image' in request.files:
+        with spans.span('body_read'):
+            return request.files['image'].stream.read(), None
+    
+    return None, None
+
 @app.route('/ocr/table', methods=['POST'])
 def ocr_table():
     """
@@ -81,175 +973,552 @@ def ocr_table():
     - JSON with base64Image field
     - multipart/form-data with 'image' file
     
+    Set ?nocache=1 (or "noCache": true in the JSON body) to skip the result cache.
+    Set ?tiles=N (or "tiles": N) to read the table as N overlapping bands in
+    parallel; ?tileAxis=rows|columns picks the cut direction.
+    
     Returns:
     - Structured table data extracted by Claude
     """
     try:
-        print(f"DEBUG: Request received - Content-Type: {request.content_type}")
-        print(f"DEBUG: request.is_json: {request.is_json}")
-        print(f"DEBUG: Has 'image' in files: {'image' in request.files}")
+        unavailable = ocr_unavailable()
+        if unavailable:
+            return unavailable
         
-        if not client:
-            return jsonify({
-                "error": "Claude API client not initialized. Set CLAUDE_API_KEY environment variable."
-            }), 500
+        image_bytes, data = image_from_request()
+        if not image_bytes:
+            return jsonify({"error": "No image provided"}), 400
         
-        image = None
-        base64_data = None
-        media_type = "image/jpeg"
+        tiles, tile_axis = tiling_options(data)
+        payload, status = extract_table(image_bytes, cache_bypassed(data), tiles=tiles, tile_axis=tile_axis)
+        return jsonify(payload), status
         
-        # Handle base64 encoded image
-        if request.is_json:
-            data = request.get_json()
-            base64_image = data.get('base64Image', '')
-            
-            print(f"DEBUG: Received base64_image length: {len(base64_image)}")
-            print(f"DEBUG: First 100 chars: {base64_image[:100]}")
-            
-            # Extract media type if present in data URL
-            if base64_image.startswith('data:'):
-                header, base64_data = base64_image.split(',', 1)
-                # Extract media type from header like "data:image/png;base64"
-                if 'image/' in header:
-                    media_type = header.split(';')[0].replace('data:', '')
-                print(f"DEBUG: Extracted media_type: {media_type}")
-                print(f"DEBUG: Base64 data length after split: {len(base64_data)}")
-            else:
-                base64_data = base64_image
-                print(f"DEBUG: No data URL prefix, using raw base64")
-            
-            # Clean the base64 data (remove whitespace)
-            base64_data = base64_data.strip().replace('\n', '').replace('\r', '').replace(' ', '')
-            print(f"DEBUG: Base64 data length after cleaning: {len(base64_data)}")
-            
-            # Decode to verify it's valid
+    except Exception as e:
+        return ocr_error_response(e)
+
+@app.route('/ocr/raw', methods=['POST'])
+def ocr_raw():
+    """
+    Extract table structure from a raw image request body
+    
+    Accepts:
+    - application/octet-stream (or image/*) body with the image bytes, no base64
+    - at most OCR_MAX_IMAGE_MB megabytes
+    
+    Set ?nocache=1 to skip the result cache; ?tiles=N&tileAxis=rows|columns
+    enables tiled extraction as for /ocr/table.
+    
+    Returns:
+    - Same structure as /ocr/table
+    """
+    try:
+        unavailable = ocr_unavailable()
+        if unavailable:
+            return unavailable
+        
+        tiles, tile_axis = tiling_options()
+        
+        too_large = jsonify({
+            "error": f"Image exceeds {MAX_IMAGE_BYTES // (1024 * 1024)} MB limit",
+            "groups": []
+        }), 413
+        if request.content_length is not None and request.content_length > MAX_IMAGE_BYTES:
+            return too_large
+        
+        # Read at most one byte past the cap, so chunked uploads can't exceed it
+        with spans.span('body_read'):
+            image_bytes = request.stream.read(MAX_IMAGE_BYTES + 1)
+        if len(image_bytes) > MAX_IMAGE_BYTES:
+            return too_large
+        if not image_bytes:
+            return jsonify({"error": "No image provided"}), 400
+        
+        payload, status = extract_table(image_bytes, cache_bypassed(), tiles=tiles, tile_axis=tile_axis)
+        return jsonify(payload), status
+        
+    except Exception as e:
+        return ocr_error_response(e)
+
+def encode_stream_events(events, fmt):
+    """Serialize stream events as NDJSON lines or Server-Sent Events"""
+    for event in events:
+        if fmt == 'sse':
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        else:
+            yield json.dumps(event) + '\n'
+
+def replay_cached_groups(cached):
+    """Stream events for a cached result: every group, then the full result"""
+    for index, group in enumerate(cached.get('groups', [])):
+        yield {"type": "group", "index": index, "group": group}
+    yield {"type": "done", **cached, "cached": True}
+
+def replay_coalesced(payload, status):
+    """Stream events for the result of an identical request that was in flight"""
+    if not payload.get('success'):
+        yield {"type": "error", "status": status, **payload}
+        return
+    for index, group in enumerate(payload.get('groups', [])):
+        yield {"type": "group", "index": index, "group": group}
+    yield {"type": "done", **payload, "cached": False, "coalesced": True}
+
+def publish_stream_result(events, cache_key, flight):
+    """Pass stream events through, handing the final result to requests waiting on the flight"""
+    for event in events:
+        if event['type'] in ('done', 'error'):
+            payload = {k: v for k, v in event.items() if k not in ('type', 'status', 'cached', 'groupsStreamed')}
+            ocr_flights.finish(cache_key, flight, value=(payload, event.get('status', 200)))
+        yield event
+
+def stream_claude_groups(image_data, media_type, prep_info, cache_key):
+    """
+    Stream Claude's reply and yield each group as soon as its JSON object closes
+    
+    Yields:
+    - {"type": "group", "index": i, "group": {...}} per completed group
+    - {"type": "done", ...} with the full /ocr/table result at the end
+      ("partial": true if the reply was cut off but some groups were read)
+    - {"type": "error", ...} if the call or parsing failed
+    """
+    parser = GroupStreamParser()
+    streamed = []
+    chunks = []
+    start = time.perf_counter()
+    try:
+        with client.messages.stream(**claude_request_params(image_data, media_type)) as stream:
+            for text in stream.text_stream:
+                chunks.append(text)
+                for group in parser.feed(text):
+                    streamed.append(group)
+                    yield {"type": "group", "index": len(streamed) - 1, "group": group}
+            final_message = stream.get_final_message()
+        claude_seconds.observe(time.perf_counter() - start, model=CLAUDE_MODEL, outcome='ok')
+        spans.record('claude_call', time.perf_counter() - start)
+        record_sheet_usage(*record_claude_usage(CLAUDE_MODEL, getattr(final_message, 'usage', None)))
+    except Exception as e:
+        claude_seconds.observe(time.perf_counter() - start, model=CLAUDE_MODEL, outcome='error')
+        payload, status = ocr_error(e)
+        yield {"type": "error", "status": status, **payload, "groupsStreamed": len(streamed)}
+        return
+    
+    extracted_data, response_text = parse_claude_json(''.join(chunks))
+    if extracted_data is not None:
+        result = format_ocr_result(extracted_data.get('groups', []), response_text, prep_info)
+        ocr_cache.put(cache_key, result)
+        yield {"type": "done", **result, "cached": False}
+    elif streamed:
+        # Reply was truncated (e.g. max_tokens) - keep the groups that did complete
+        result = format_ocr_result(streamed, response_text, prep_info)
+        yield {"type": "done", **result, "partial": True, "cached": False}
+    else:
+        yield {
+            "type": "error",
+            "status": 200,
+            "error": "Failed to parse Claude response as JSON",
+            "raw_response": response_text,
+            "groups": []
+        }
+
+@app.route('/ocr/stream', methods=['POST'])
+def ocr_stream():
+    """
+    Extract table structure and stream each group as soon as Claude finishes it
+    
+    Accepts:
+    - Same bodies as /ocr/table (JSON base64Image or multipart 'image')
+    - ?format=sse (or Accept: text/event-stream) for Server-Sent Events,
+      otherwise newline-delimited JSON (application/x-ndjson)
+    - ?nocache=1 / "noCache": true to skip the result cache
+    
+    Returns:
+    - A stream of "group" events followed by one "done" event carrying the
+      full /ocr/table result, or an "error" event
+    """
+    try:
+        unavailable = ocr_unavailable()
+        if unavailable:
+            return unavailable
+        
+        image_bytes, data = image_from_request()
+        if not image_bytes:
+            return jsonify({"error": "No image provided"}), 400
+        
+        fmt = 'sse' if (request.args.get('format') == 'sse'
+                        or 'text/event-stream' in request.headers.get('Accept', '')) else 'ndjson'
+        mimetype = 'text/event-stream' if fmt == 'sse' else 'application/x-ndjson'
+        headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        
+        cache_key = ocr_cache_key(image_bytes, single=True)
+        cached = None
+        if cache_bypassed(data):
+            ocr_cache.record_bypass()
+        else:
+            cached = ocr_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Cache hit for image %s", cache_key[:12])
+            return Response(encode_stream_events(replay_cached_groups(cached), fmt),
+                            mimetype=mimetype, headers=headers)
+        
+        # The same image already being read by another stream:
+        # wait for it and replay its result instead of paying for a second call
+        while True:
+            flight, leader = ocr_flights.begin(cache_key)
+            if leader:
+                break
             try:
-                image_bytes = base64.b64decode(base64_data)
-                print(f"DEBUG: Decoded image_bytes length: {len(image_bytes)}")
-                print(f"DEBUG: First 20 bytes (hex): {image_bytes[:20].hex()}")
-                image = Image.open(io.BytesIO(image_bytes))
-                print(f"DEBUG: Successfully opened image: {image.format}, {image.size}")
-            except Exception as e:
-                print(f"ERROR: Failed to decode/open image: {str(e)}")
-                raise
-        
-        # Handle file upload
-        elif 'image' in request.files:
-            file = request.files['image']
-            image = Image.open(file.stream)
+                payload, status = flight.wait()
+            except FlightAbandoned:
+                continue
+            logger.info("Coalesced stream with in-flight extraction of image %s", cache_key[:12])
+            return Response(encode_stream_events(replay_coalesced(payload, status), fmt),
+                            mimetype=mimetype, headers=headers)
+        
+        try:
+            with spans.span('image_prep'):
+                image_data, media_type, prep_info = preprocess_image(image_bytes)
             
-            # Convert to base64
-            buffered = io.BytesIO()
-            image.save(buffered, format="JPEG")
-            base64_data = base64.b64encode(buffered.getvalue()).decode('utf-8')
-            media_type = "image/jpeg"
+            # Take the Claude slot before answering so a full server still gets a plain 503;
+            # it is released when the streamed response is closed.
+            claude_slots.acquire(CLAUDE_QUEUE_TIMEOUT)
+        except Exception as e:
+            ocr_flights.finish(cache_key, flight, error=e)
+            raise
+        released = threading.Event()
+        
+        def release_slot():
+            # close() may run more than once; only give the slot back the first time
+            if not released.is_set():
+                released.set()
+                claude_slots.release()
+            # A client that disconnected before the end leaves no result to share
+            ocr_flights.finish(cache_key, flight, error=FlightAbandoned())
+        
+        events = publish_stream_result(
+            stream_claude_groups(image_data, media_type, prep_info, cache_key), cache_key, flight)
+        response = Response(stream_with_context(encode_stream_events(events, fmt)),
+                            mimetype=mimetype, headers=headers)
+        response.call_on_close(release_slot)
+        return response
+        
+    except Exception as e:
+        return ocr_error_response(e)
+
+def run_job(job):
+    """
+    Process one queued /ocr/jobs job (called from a JobWorkers thread)
+    
+    Returns:
+    - (payload, status, retry): retry is True for transient failures
+      (no free Claude slot, rate limits, Claude 5xx or connection errors)
+    """
+    options = job['options']
+    try:
+        payload, status = extract_table(
+            job['image'], bool(options.get('noCache')), slot_timeout=OCR_BATCH_SLOT_TIMEOUT,
+            tiles=options.get('tiles', 1), tile_axis=options.get('tileAxis', 'rows'))
+        return payload, status, False
+    except Exception as e:
+        payload, status = ocr_error(e)
+        transient = isinstance(e, (ServerBusyError, anthropic.APIConnectionError)) or (
+            isinstance(e, anthropic.APIStatusError) and (e.status_code == 429 or e.status_code >= 500))
+        return payload, status, transient
+
+job_workers = JobWorkers(
+    job_queue, run_job,
+    workers=OCR_JOB_WORKERS,
+    rate_per_minute=float(os.environ.get('OCR_JOB_RATE_PER_MIN', 0)),
+    lease_seconds=float(os.environ.get('OCR_JOB_LEASE', 900)),
+    max_attempts=int(os.environ.get('OCR_JOB_MAX_ATTEMPTS', 3)),
+    retry_delay=float(os.environ.get('OCR_JOB_RETRY_DELAY', 30)),
+    retention_days=float(os.environ.get('OCR_JOB_RETENTION_DAYS', 7)),
+    stop=draining
+)
+if client and OCR_JOB_WORKERS > 0:
+    job_workers.start()
+
+@app.route('/ocr/jobs', methods=['POST'])
+def ocr_job_submit():
+    """
+    Queue an image for extraction and answer at once
+    
+    Accepts the same bodies as /ocr/table, plus:
+    - callbackUrl (JSON field, form field or query parameter): http(s) URL the
+      finished job is POSTed to, in the GET /ocr/jobs/<id> format; its host
+      must be listed in OCR_CALLBACK_HOSTS
+    - tiles / tileAxis / noCache as for /ocr/table
+    
+    Returns:
+    - 202 {"jobId", "status": "queued", "statusUrl"} with a Location header
+    """
+    try:
+        if not client:
+            return ocr_unavailable()
         
-        if image is None or base64_data is None:
+        image_bytes, data = image_from_request()
+        if not image_bytes:
             return jsonify({"error": "No image provided"}), 400
         
-        print(f"Processing image with Claude: {image.size}, format: {image.format}")
-        
-        # Call Claude API with vision
-        message = client.messages.create(
-            model="claude-sonnet-4-5-20250929",
-            max_tokens=4096,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": media_type,
-                                "data": base64_data,
-                            },
-                        },
-                        {
-                            "type": "text",
-                            "text": EXTRACTION_PROMPT
-                        }
-                    ],
-                }
-            ],
-        )
+        options = data if data is not None else request.form
+        tiles, tile_axis = tiling_options(options)
+        callback_url = request.args.get('callbackUrl') or options.get('callbackUrl') or None
+        if callback_url and not callback_allowed(callback_url, OCR_CALLBACK_HOSTS):
+            return jsonify({"error": "callbackUrl must be an http(s) URL on a host listed in OCR_CALLBACK_HOSTS"}), 400
         
-        # Extract the response text
-        response_text = message.content[0].text
+        job_id = job_queue.submit(
+            image_bytes,
+            {"tiles": tiles, "tileAxis": tile_axis, "noCache": cache_bypassed(data)},
+            callback_url
+        )
+        job_workers.notify()
+        logger.info("Queued OCR job %s (%d bytes)", job_id, len(image_bytes))
         
-        print(f"Claude response length: {len(response_text)} chars")
-        print(f"Response preview: {response_text[:200]}...")
+        response = jsonify({
+            "success": True,
+            "jobId": job_id,
+            "status": "queued",
+            "statusUrl": f"/ocr/jobs/{job_id}"
+        })
+        response.headers['Location'] = f"/ocr/jobs/{job_id}"
+        return response, 202
         
-        # Parse the JSON response from Claude
+    except Exception as e:
+        return ocr_error_response(e)
+
+@app.route('/ocr/jobs/<job_id>', methods=['GET'])
+def ocr_job_status(job_id):
+    """
+    Status of a queued job
+    
+    Returns:
+    - {"jobId", "status": "queued|running|succeeded|failed", "attempts", timestamps,
+      "callbackUrl", "callbackStatus"}; finished jobs add "httpStatus" and the
+      /ocr/table-shaped "result", queued retries the "lastError"
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job '{job_id}'"}), 404
+    return jsonify(job), 200
+
+def batch_images_from_request():
+    """
+    Collect the images of a /ocr/batch request
+    
+    Returns:
+    - (items, options): items holds decoded image bytes, or the ImagePrepError
+      for an image that could not be decoded
+    """
+    items = []
+    if request.is_json:
+        data = request.get_json() or {}
+        for entry in data.get('images', []):
+            base64_image = entry.get('base64Image', '') if isinstance(entry, dict) else entry
+            try:
+                items.append(decode_base64_image(base64_image or ''))
+            except ImagePrepError as e:
+                items.append(e)
+        options = data
+    else:
+        for file in request.files.getlist('images') + request.files.getlist('image'):
+            image_bytes = file.stream.read()
+            items.append(image_bytes if image_bytes else ImagePrepError("Empty image data"))
+        options = request.form
+    return items, options
+
+def batch_summary(mode, results, **extra):
+    """Response body for a finished batch; results are per-image payloads with index/status"""
+    results = sorted(results, key=lambda r: r['index'])
+    succeeded = sum(1 for r in results if r['status'] == 200 and r.get('success'))
+    return {
+        "success": True,
+        "mode": mode,
+        **extra,
+        "totalImages": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results
+    }
+
+def run_sync_batch(items, bypass_cache):
+    """Extract every image concurrently under the shared Claude in-flight cap"""
+    def run_one(index):
+        item = items[index]
         try:
-            # Claude might wrap the JSON in markdown code blocks
-            if '```json' in response_text:
-                json_start = response_text.find('```json') + 7
-                json_end = response_text.find('```', json_start)
-                response_text = response_text[json_start:json_end].strip()
-            elif '```' in response_text:
-                json_start = response_text.find('```') + 3
-                json_end = response_text.find('```', json_start)
-                response_text = response_text[json_start:json_end].strip()
-            
-            extracted_data = json.loads(response_text)
-        except json.JSONDecodeError as e:
-            print(f"JSON parse error: {e}")
-            print(f"Response text: {response_text}")
-            # Return the raw response if we can't parse it
+            if isinstance(item, Exception):
+                raise item
+            payload, status = extract_table(item, bypass_cache, slot_timeout=OCR_BATCH_SLOT_TIMEOUT)
+        except Exception as e:
+            payload, status = ocr_error(e)
+        return {"index": index, "status": status, **payload}
+    
+    with ThreadPoolExecutor(max_workers=min(len(items), claude_slots.limit)) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, run_one, i) for i in range(len(items))]
+        return [future.result() for future in futures]
+
+def submit_message_batch(items, bypass_cache):
+    """
+    Submit the images that are not cached to the Message Batches API
+    
+    Returns:
+    - (payload, status): 202 with the batch id, or 200 with results if
+      every image was answered from the cache or failed to decode
+    """
+    entries = []
+    batch_requests = []
+    for index, item in enumerate(items):
+        try:
+            if isinstance(item, Exception):
+                raise item
+            cache_key = ocr_cache_key(item, single=True)
+            cached = None
+            if bypass_cache:
+                ocr_cache.record_bypass()
+            else:
+                cached = ocr_cache.get(cache_key)
+            if cached is not None:
+                entries.append({"index": index, "result": {**cached, "cached": True}, "status": 200})
+                continue
+            image_data, media_type, prep_info = preprocess_image(item)
+        except Exception as e:
+            payload, status = ocr_error(e)
+            entries.append({"index": index, "result": payload, "status": status})
+            continue
+        
+        custom_id = f"image-{index}"
+        batch_requests.append({"custom_id": custom_id, "params": claude_request_params(image_data, media_type)})
+        entries.append({"index": index, "customId": custom_id, "cacheKey": cache_key, "preprocessing": prep_info})
+    
+    if not batch_requests:
+        results = [{"index": e['index'], "status": e['status'], **e['result']} for e in entries]
+        return batch_summary("batches", results, batchId=None), 200
+    
+    batch = message_batches.create(requests=batch_requests)
+    batch_registry.save(batch.id, {"entries": entries})
+    logger.info("Submitted message batch %s with %d of %d images", batch.id, len(batch_requests), len(items))
+    
+    return {
+        "success": True,
+        "mode": "batches",
+        "batchId": batch.id,
+        "status": batch.processing_status,
+        "totalImages": len(items),
+        "submitted": len(batch_requests),
+        "cachedImages": sum(1 for e in entries if e.get('result', {}).get('cached')),
+        "resultsUrl": f"/ocr/batch/{batch.id}"
+    }, 202
+
+@app.route('/ocr/batch', methods=['POST'])
+def ocr_batch():
+    """
+    Extract table structure from many route sheet images in one request
+    
+    Accepts:
+    - JSON {"images": ["<base64 or data URL>", {"base64Image": ...}, ...]}
+    - multipart/form-data with several 'images' (or 'image') file parts
+    
+    Options (JSON field, form field or query parameter):
+    - mode: "sync" (default) extracts concurrently and answers with all results;
+      "batches" submits to the Message Batches API and answers 202 with a batch id
+    - noCache / ?nocache=1: skip the result cache
+    
+    Returns:
+    - {"results": [...]} with one /ocr/table-shaped payload per image, plus
+      "index" and "status" so failures are reported per image
+    """
+    try:
+        unavailable = ocr_unavailable()
+        if unavailable:
+            return unavailable
+        
+        items, options = batch_images_from_request()
+        if not items:
+            return jsonify({"error": "No images provided", "results": []}), 400
+        if len(items) > OCR_BATCH_MAX_IMAGES:
             return jsonify({
-                "error": "Failed to parse Claude response as JSON",
-                "raw_response": response_text,
-                "groups": []
-            }), 200
+                "error": f"Too many images: {len(items)} (max {OCR_BATCH_MAX_IMAGES})",
+                "results": []
+            }), 413
         
-        # Transform to match n8n workflow expected format
-        groups = extracted_data.get('groups', [])
+        bypass_cache = cache_bypassed() or str(options.get('noCache', '')).lower() in ('1', 'true', 'yes')
+        mode = request.args.get('mode') or options.get('mode') or 'sync'
         
-        # Build full text representation
-        full_text_lines = []
-        for group in groups:
-            full_text_lines.append(f"\nGroup {group['groupNumber']}:")
-            for street in group.get('streets', []):
-                street_line = f"  {street['streetName']}"
-                if street.get('fromHouse') or street.get('toHouse'):
-                    street_line += f" ({street.get('fromHouse', '')} - {street.get('toHouse', '')})"
-                full_text_lines.append(street_line)
+        if mode == 'batches':
+            payload, status = submit_message_batch(items, bypass_cache)
+            return jsonify(payload), status
+        if mode != 'sync':
+            return jsonify({"error": f"Unknown mode '{mode}'", "results": []}), 400
         
-        full_text = '\n'.join(full_text_lines)
+        return jsonify(batch_summary("sync", run_sync_batch(items, bypass_cache))), 200
         
-        # Format response in a structure compatible with existing workflow
-        result = {
-            "success": True,
-            "source": "claude-vision",
-            "model": "claude-3-5-sonnet-20241022",
-            "groups": groups,
-            "fullText": full_text,
-            "totalGroups": len(groups),
-            "totalStreets": sum(len(g.get('streets', [])) for g in groups),
-            "rawResponse": response_text
-        }
+    except Exception as e:
+        return ocr_error_response(e)
+
+@app.route('/ocr/batch/<batch_id>', methods=['GET'])
+def ocr_batch_results(batch_id):
+    """
+    Status and results of a batch submitted with mode=batches
+    
+    Returns:
+    - 202 with request counts while the batch is processing
+    - 200 with the same body as a sync /ocr/batch once it has ended
+    """
+    try:
+        meta = batch_registry.load(batch_id)
+        if meta is None or message_batches is None:
+            return jsonify({"error": f"Unknown batch '{batch_id}'"}), 404
         
-        print(f"Extracted {result['totalGroups']} groups, {result['totalStreets']} streets")
+        batch = message_batches.retrieve(batch_id)
+        if batch.processing_status != 'ended':
+            counts = batch.request_counts
+            return jsonify({
+                "success": True,
+                "mode": "batches",
+                "batchId": batch_id,
+                "status": batch.processing_status,
+                "requestCounts": {
+                    "processing": counts.processing,
+                    "succeeded": counts.succeeded,
+                    "errored": counts.errored,
+                    "canceled": counts.canceled,
+                    "expired": counts.expired
+                }
+            }), 202
         
-        return jsonify(result), 200
+        batch_results = {r.custom_id: r.result for r in message_batches.results(batch_id)}
+        results = []
+        for entry in meta['entries']:
+            if 'result' in entry:
+                results.append({"index": entry['index'], "status": entry['status'], **entry['result']})
+                continue
+            
+            outcome = batch_results.get(entry['customId'])
+            if outcome is not None and outcome.type == 'succeeded':
+                model = getattr(outcome.message, 'model', None) or CLAUDE_MODEL
+                if not meta.get('usageRecorded'):
+                    record_sheet_usage(*record_claude_usage(
+                        model, getattr(outcome.message, 'usage', None), BATCH_PRICE_FACTOR))
+                payload, status = build_ocr_result(outcome.message.content[0].text, entry['preprocessing'], model)
+                if payload.get('success'):
+                    ocr_cache.put(entry['cacheKey'], payload)
+                payload = {**payload, "cached": False}
+            else:
+                reason = outcome.type if outcome is not None else 'missing'
+                if outcome is not None and outcome.type == 'errored':
+                    reason = f"errored: {outcome.error.error.message}"
+                payload, status = {"error": f"Batch request {reason}", "groups": []}, 500
+            results.append({"index": entry['index'], "status": status, **payload})
+        
+        if not meta.get('usageRecorded'):
+            # Count the batch's tokens once, not on every poll of the finished batch
+            batch_registry.save(batch_id, {**meta, "usageRecorded": True})
+        
+        return jsonify(batch_summary("batches", results, batchId=batch_id, status="ended")), 200
         
-    except anthropic.APIError as e:
-        print(f"Claude API error: {e}")
-        return jsonify({
-            "error": f"Claude API error: {str(e)}",
-            "groups": []
-        }), 500
     except Exception as e:
-        print(f"Unexpected error: {e}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({
-            "error": f"Server error: {str(e)}",
-            "groups": []
-        }), 500
+        return ocr_error_response(e)
 
 if __name__ == '__main__':
+    # Development server only; production runs under gunicorn (see gunicorn.conf.py)
     port = int(os.environ.get('PORT', 8869))
-    print(f"Starting Claude OCR server on port {port}...")
-    app.run(host='0.0.0.0', port=port, debug=True)
+    debug = os.environ.get('FLASK_DEBUG', '').lower() in ('1', 'true', 'yes')
+    logger.info("Starting Claude OCR server on port %d (development server, debug=%s)...", port, debug)
+    app.run(host='0.0.0.0', port=port, debug=debug, threaded=True)
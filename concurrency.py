@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Concurrency helpers shared by the OCR server
+"""
+
+import threading
+from contextlib import contextmanager
+
+
+class ServerBusyError(Exception):
+    """Raised when no Claude slot frees up in time; the caller should answer 503."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many Claude requests in flight, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class InflightLimiter:
+    """
+    Caps the number of concurrent upstream (Claude) calls in this process.
+
+    Requests that cannot get a slot within `timeout` seconds raise
+    ServerBusyError instead of queueing behind the calls already running.
+    """
+
+    def __init__(self, limit, retry_after=15):
+        self.limit = limit
+        self.retry_after = retry_after
+        self._sem = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._peak = 0
+        self._rejected = 0
+
+    def acquire(self, timeout=0):
+        """Take one slot or raise ServerBusyError; pair with release()."""
+        acquired = self._sem.acquire(timeout=timeout) if timeout else self._sem.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                self._rejected += 1
+            raise ServerBusyError(self.retry_after)
+
+        with self._lock:
+            self._active += 1
+            self._peak = max(self._peak, self._active)
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+        self._sem.release()
+
+    @contextmanager
+    def slot(self, timeout=0):
+        """Hold one slot for the duration of the with-block."""
+        self.acquire(timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'active': self._active,
+                'peak': self._peak,
+                'rejected': self._rejected
+            }
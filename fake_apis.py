@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the Anthropic Messages API and the Google Geocoding API,
+for benchmarks and offline testing. Point the real code at them with
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8870
+    GEOCODE_URL=http://127.0.0.1:8870/maps/api/geocode/json
+
+Latency, jitter and error rates are configurable per API. Claude replies come
+from a fixture file (the reply text, or a {"groups": [...]} object) or are
+generated; geocode answers come from a `geocode_store.py export` JSONL file or
+are derived deterministically from a hash of the address.
+
+Usage:
+    python fake_apis.py --port 8870 --claude-latency 3 --geocode-latency 0.05
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def synthetic_groups(groups=6, streets=4):
+    """A plausible extraction result: groups of streets with small house ranges"""
+    rng = random.Random(groups * 1000 + streets)
+    result = []
+    for number in range(1, groups + 1):
+        result.append({
+            'groupNumber': number,
+            'streets': [
+                {
+                    'streetName': rng.choice(['Hillcrest Pt NW', '156 St NW', '72 Ave NW', 'Jasper Ave NW']),
+                    'fromHouse': str(start),
+                    'toHouse': str(start + rng.choice([8, 10, 20]))
+                }
+                for start in (rng.randrange(500, 9000, 2) for _ in range(streets))
+            ]
+        })
+    return {'groups': result}
+
+
+class FakeAPIConfig:
+    """Knobs shared by every request the fake server handles"""
+
+    def __init__(self, claude_latency=2.0, claude_jitter=0.5, claude_error_rate=0.0,
+                 claude_fixture=None, geocode_latency=0.05, geocode_jitter=0.02,
+                 geocode_error_rate=0.0, geocode_fixture=None, rooftop_rate=0.7,
+                 not_found_rate=0.2, seed=None):
+        self.claude_latency = claude_latency
+        self.claude_jitter = claude_jitter
+        self.claude_error_rate = claude_error_rate
+        self.geocode_latency = geocode_latency
+        self.geocode_jitter = geocode_jitter
+        self.geocode_error_rate = geocode_error_rate
+        self.rooftop_rate = rooftop_rate
+        self.not_found_rate = not_found_rate
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.counters = {'claude_requests': 0, 'claude_errors': 0, 'geocode_requests': 0, 'geocode_errors': 0}
+        self.counter_lock = threading.Lock()
+
+        self.claude_text = '```json\n' + json.dumps(synthetic_groups(), indent=2) + '\n```'
+        if claude_fixture:
+            with open(claude_fixture, 'r', encoding='utf-8') as f:
+                text = f.read()
+            try:
+                data = json.loads(text)
+                # An /ocr/table response or a bare {"groups": [...]} object
+                text = json.dumps({'groups': data.get('groups', [])}, indent=2) if isinstance(data, dict) else text
+            except json.JSONDecodeError:
+                pass
+            self.claude_text = text
+
+        self.geocode_fixture = {}
+        if geocode_fixture:
+            from geocode_store import normalize_address
+            with open(geocode_fixture, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        row = json.loads(line)
+                        self.geocode_fixture[normalize_address(row['fullAddress'])] = row
+
+    def delay(self, mean, jitter):
+        with self.rng_lock:
+            value = self.rng.uniform(mean - jitter, mean + jitter)
+        return max(0.0, value)
+
+    def roll(self, rate):
+        with self.rng_lock:
+            return self.rng.random() < rate
+
+    def count(self, key):
+        with self.counter_lock:
+            self.counters[key] += 1
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = None  # set by make_server()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/maps/api/geocode/json':
+            return self._geocode(parse_qs(url.query).get('address', [''])[0])
+        if url.path == '/stats':
+            return self._send_json(200, self.config.counters)
+        self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if urlparse(self.path).path == '/v1/messages':
+            return self._messages(json.loads(body or b'{}'))
+        self._send_json(404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': self.path}})
+
+    # -- Anthropic Messages API --------------------------------------------
+
+    def _messages(self, request):
+        config = self.config
+        config.count('claude_requests')
+        latency = config.delay(config.claude_latency, config.claude_jitter)
+
+        if config.roll(config.claude_error_rate):
+            config.count('claude_errors')
+            time.sleep(latency / 4)
+            return self._send_json(529, {
+                'type': 'error',
+                'error': {'type': 'overloaded_error', 'message': 'Overloaded (fake)'}
+            })
+
+        text = config.claude_text
+        input_tokens = sum(
+            len(block.get('source', {}).get('data', '')) // 1000 + len(block.get('text', '')) // 4
+            for message in request.get('messages', [])
+            for block in (message.get('content') if isinstance(message.get('content'), list) else [])
+        )
+        usage = {'input_tokens': input_tokens, 'output_tokens': max(1, len(text) // 4),
+                 'cache_creation_input_tokens': 0, 'cache_read_input_tokens': 0}
+        message = {
+            'id': f"msg_fake_{uuid.uuid4().hex[:20]}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': request.get('model', 'fake-model'),
+            'content': [{'type': 'text', 'text': text}],
+            'stop_reason': 'end_turn',
+            'stop_sequence': None,
+            'usage': usage
+        }
+
+        if not request.get('stream'):
+            time.sleep(latency)
+            return self._send_json(200, message)
+
+        # Server-sent events, with the reply spread over the latency budget
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        def event(name, data):
+            self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        event('message_start', {'type': 'message_start', 'message': {
+            **message, 'content': [], 'stop_reason': None, 'usage': {**usage, 'output_tokens': 1}}})
+        event('content_block_start', {'type': 'content_block_start', 'index': 0,
+                                      'content_block': {'type': 'text', 'text': ''}})
+        chunks = [text[i:i + 40] for i in range(0, len(text), 40)] or ['']
+        for chunk in chunks:
+            time.sleep(latency / len(chunks))
+            event('content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                          'delta': {'type': 'text_delta', 'text': chunk}})
+        event('content_block_stop', {'type': 'content_block_stop', 'index': 0})
+        event('message_delta', {'type': 'message_delta',
+                                'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+                                'usage': {'output_tokens': usage['output_tokens']}})
+        event('message_stop', {'type': 'message_stop'})
+
+    # -- Google Geocoding API -----------------------------------------------
+
+    def _geocode(self, address):
+        config = self.config
+        config.count('geocode_requests')
+        time.sleep(config.delay(config.geocode_latency, config.geocode_jitter))
+
+        if config.roll(config.geocode_error_rate):
+            config.count('geocode_errors')
+            return self._send_json(200, {'status': 'OVER_QUERY_LIMIT', 'results': []})
+
+        from geocode_store import normalize_address
+        row = config.geocode_fixture.get(normalize_address(address))
+        if row is None and config.geocode_fixture:
+            return self._send_json(200, {'status': 'ZERO_RESULTS', 'results': []})
+        if row is None:
+            row = self._synthetic_row(address)
+
+        if row['status'] == 'not_found':
+            return self._send_json(200, {'status': 'ZERO_RESULTS', 'results': []})
+        coordinates = row.get('coordinates') or {'lat': 53.5461, 'lng': -113.4938}
+        self._send_json(200, {'status': 'OK', 'results': [{
+            'formatted_address': address,
+            'geometry': {'location': coordinates, 'location_type': row.get('location_type') or 'APPROXIMATE'}
+        }]})
+
+    def _synthetic_row(self, address):
+        # Deterministic per address, so repeated runs see the same answers
+        digest = hashlib.sha256(address.encode('utf-8')).digest()
+        roll = digest[0] / 255
+        config = self.config
+        if roll < config.not_found_rate:
+            return {'status': 'not_found'}
+        location_type = 'ROOFTOP' if roll < config.not_found_rate + config.rooftop_rate else 'RANGE_INTERPOLATED'
+        return {
+            'status': 'success',
+            'location_type': location_type,
+            'coordinates': {
+                'lat': 53.45 + digest[1] / 255 * 0.2,
+                'lng': -113.65 + digest[2] / 255 * 0.3
+            }
+        }
+
+
+def make_server(config, host='127.0.0.1', port=0):
+    """ThreadingHTTPServer serving both fake APIs (port 0 picks a free port)"""
+    handler = type('ConfiguredFakeAPIHandler', (FakeAPIHandler,), {'config': config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(config, host='127.0.0.1', port=0):
+    """Start the fake server on a background thread; returns (server, base_url)"""
+    server = make_server(config, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def add_arguments(parser):
+    """Fake API options, shared with bench_e2e.py"""
+    parser.add_argument('--claude-latency', type=float, default=2.0, help='Mean Claude reply time (s)')
+    parser.add_argument('--claude-jitter', type=float, default=0.5)
+    parser.add_argument('--claude-error-rate', type=float, default=0.0, help='Share of 529 overloaded replies')
+    parser.add_argument('--claude-fixture', help='Reply text or {"groups": [...]} JSON to return')
+    parser.add_argument('--geocode-latency', type=float, default=0.05, help='Mean geocode reply time (s)')
+    parser.add_argument('--geocode-jitter', type=float, default=0.02)
+    parser.add_argument('--geocode-error-rate', type=float, default=0.0, help='Share of OVER_QUERY_LIMIT replies')
+    parser.add_argument('--geocode-fixture', help='JSONL from `geocode_store.py export` to answer from')
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def config_from_args(args):
+    return FakeAPIConfig(
+        claude_latency=args.claude_latency, claude_jitter=args.claude_jitter,
+        claude_error_rate=args.claude_error_rate, claude_fixture=args.claude_fixture,
+        geocode_latency=args.geocode_latency, geocode_jitter=args.geocode_jitter,
+        geocode_error_rate=args.geocode_error_rate, geocode_fixture=args.geocode_fixture,
+        seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8870)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = make_server(config_from_args(args), args.host, args.port)
+    print(f"Fake Anthropic + Geocoding APIs on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Append-only JSONL checkpoint for geocoding runs
+Every geocoded candidate is written as one line the moment its result arrives:
+    {"index": 17, "address": {...candidate fields, coordinates, geocodeStatus, exists...}}
+so a crash, quota stop or Ctrl-C loses at most the requests in flight. A resumed
+run skips candidates already in the file, and records() streams them back in
+candidate order for aggregation without holding the run in memory.
+"""
+
+import json
+import logging
+import os
+import threading
+
+from range_probe import ERROR, classify
+
+logger = logging.getLogger(__name__)
+
+
+def make_record(candidate, result):
+    """Candidate fields plus the geocode outcome, as stored in geocoded_results.json"""
+    record = {
+        **candidate,
+        'coordinates': result['coordinates'],
+        'location_type': result.get('location_type'),
+        'geocodeStatus': result['status'],
+        'exists': result['exists']
+    }
+    if result.get('inferred'):
+        record['inferred'] = True
+    if 'error' in result:
+        record['error'] = result['error']
+    return record
+
+
+def record_result(record):
+    """geocode_address()-shaped result back from a stored record"""
+    result = {
+        'coordinates': record.get('coordinates'),
+        'location_type': record.get('location_type'),
+        'status': record.get('geocodeStatus'),
+        'exists': record.get('exists', False)
+    }
+    if 'error' in record:
+        result['error'] = record['error']
+    return result
+
+
+class GeocodeCheckpoint:
+    """
+    Checkpoint file for one candidates list. Only byte offsets are kept in
+    memory; records are read back from disk when needed.
+
+    With resume=True an existing file is compacted first: torn last lines,
+    duplicates, transient failures (quota, errors) and inferred results are
+    dropped, so those candidates are geocoded (or inferred) again.
+    """
+
+    def __init__(self, path, candidates, resume=False):
+        self.path = path
+        self.candidates = candidates
+        self._offsets = {}  # candidate index -> offset of its line
+        self._address_offsets = {}  # fullAddress -> offset of a line with that address
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if resume and os.path.exists(path):
+            self._compact()
+        else:
+            if os.path.exists(path) and os.path.getsize(path):
+                logger.warning("Overwriting checkpoint %s (use --resume to continue it)", path)
+            open(path, 'wb').close()
+
+        self._file = open(path, 'ab')
+        self._reader = open(path, 'rb')
+
+    def _compact(self):
+        tmp_path = self.path + '.tmp'
+        kept = dropped = 0
+        with open(self.path, 'rb') as source, open(tmp_path, 'wb') as target:
+            for line in source:
+                try:
+                    entry = json.loads(line)
+                    index, record = entry['index'], entry['address']
+                except (ValueError, KeyError, TypeError):
+                    dropped += 1  # torn write from a crash
+                    continue
+                if index < len(self.candidates) and \
+                        self.candidates[index].get('fullAddress') != record.get('fullAddress'):
+                    raise ValueError(f"{self.path} was written for a different candidates file "
+                                     f"(entry {index}: {record.get('fullAddress')!r})")
+                if index in self._offsets or record.get('inferred') or \
+                        classify(record_result(record)) == ERROR:
+                    dropped += 1
+                    continue
+                self._remember(index, record, target.tell())
+                target.write(line if line.endswith(b'\n') else line + b'\n')
+                kept += 1
+        os.replace(tmp_path, self.path)
+        logger.info("Resuming %s: %d results kept, %d to redo", self.path, kept, dropped)
+
+    def _remember(self, index, record, offset):
+        self._offsets[index] = offset
+        self._address_offsets.setdefault(record.get('fullAddress'), offset)
+
+    def _read(self, offset):
+        with self._lock:
+            self._reader.seek(offset)
+            line = self._reader.readline()
+        return json.loads(line)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def done(self, index):
+        return index in self._offsets
+
+    def result_for(self, full_address):
+        """Stored result for an address, or None if it has not been geocoded yet"""
+        offset = self._address_offsets.get(full_address)
+        if offset is None:
+            return None
+        return record_result(self._read(offset)['address'])
+
+    def append(self, index, result):
+        """Write candidate index's result; thread-safe, ignored if already present"""
+        record = make_record(self.candidates[index], result)
+        line = json.dumps({'index': index, 'address': record}).encode('utf-8') + b'\n'
+        with self._lock:
+            if index in self._offsets:
+                return
+            offset = self._file.tell()
+            self._file.write(line)
+            self._file.flush()
+            self._remember(index, record, offset)
+
+    def records(self, count=None):
+        """Yield stored records in candidate order (only indices below count, if given)"""
+        with self._lock:
+            indices = sorted(i for i in self._offsets if count is None or i < count)
+        with open(self.path, 'rb') as f:
+            for index in indices:
+                f.seek(self._offsets[index])
+                yield json.loads(f.readline())['address']
+
+    def close(self):
+        self._file.close()
+        self._reader.close()
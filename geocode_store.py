@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Persistent geocode result store backed by SQLite.
+Keeps Google answers keyed by normalized fullAddress so repeat runs skip the
+network, including negative answers (ZERO_RESULTS / approximate) with their own TTL.
+
+Usage:
+    python geocode_store.py warm sample_data/generate_candidates.json
+    python geocode_store.py export sample_data/geocode_store.jsonl
+    python geocode_store.py stats
+    python geocode_store.py purge
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+DEFAULT_DB_PATH = os.environ.get('GEOCODE_STORE_PATH', 'sample_data/geocode_store.sqlite')
+DEFAULT_POSITIVE_TTL_DAYS = float(os.environ.get('GEOCODE_STORE_POSITIVE_TTL_DAYS', 180))
+DEFAULT_NEGATIVE_TTL_DAYS = float(os.environ.get('GEOCODE_STORE_NEGATIVE_TTL_DAYS', 30))
+
+# Statuses worth remembering. Anything else (error, OVER_QUERY_LIMIT,
+# REQUEST_DENIED, quota_exceeded...) says nothing about the address itself.
+POSITIVE_STATUSES = ('success',)
+NEGATIVE_STATUSES = ('not_found', 'approximate')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocodes (
+    address_key   TEXT PRIMARY KEY,
+    full_address  TEXT NOT NULL,
+    lat           REAL,
+    lng           REAL,
+    location_type TEXT,
+    status        TEXT NOT NULL,
+    found         INTEGER NOT NULL,
+    updated_at    REAL NOT NULL
+)
+"""
+
+
+def normalize_address(address_str):
+    """Normalize a fullAddress for use as a store key (case, spacing and comma placement)."""
+    key = address_str.upper().strip()
+    key = re.sub(r'\s*,\s*', ', ', key)
+    key = re.sub(r'\s+', ' ', key)
+    return key.rstrip('., ')
+
+
+class GeocodeStore:
+    """
+    SQLite-backed map of normalized address -> geocode_address() result.
+
+    Positive results (coordinates found) and negative results (not found or too
+    approximate) expire after separate TTLs.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH,
+                 positive_ttl_days=DEFAULT_POSITIVE_TTL_DAYS,
+                 negative_ttl_days=DEFAULT_NEGATIVE_TTL_DAYS):
+        self.db_path = db_path
+        self.positive_ttl = positive_ttl_days * 86400
+        self.negative_ttl = negative_ttl_days * 86400
+        self.counters = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'expired': 0, 'stores': 0}
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _is_fresh(self, found, updated_at, now):
+        ttl = self.positive_ttl if found else self.negative_ttl
+        return now - updated_at <= ttl
+
+    @staticmethod
+    def _row_to_result(row):
+        lat, lng, location_type, status, found = row
+        return {
+            'coordinates': {'lat': lat, 'lng': lng} if found else None,
+            'location_type': location_type,
+            'status': status,
+            'exists': bool(found)
+        }
+
+    def get(self, address_str):
+        """Return a stored geocode_address()-shaped result, or None if missing/expired."""
+        key = normalize_address(address_str)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT lat, lng, location_type, status, found, updated_at FROM geocodes WHERE address_key = ?',
+                (key,)
+            ).fetchone()
+
+            if row is None:
+                self.counters['misses'] += 1
+                return None
+
+            if not self._is_fresh(row[4], row[5], time.time()):
+                self.counters['expired'] += 1
+                self.counters['misses'] += 1
+                return None
+
+            self.counters['hits'] += 1
+            if not row[4]:
+                self.counters['negative_hits'] += 1
+            return self._row_to_result(row[:5])
+
+    def put(self, address_str, result):
+        """Store a geocode_address() result. Transient failures are ignored."""
+        return self.put_many([(address_str, result)]) > 0
+
+    def put_many(self, items):
+        """Store many (address_str, result) pairs in one transaction."""
+        now = time.time()
+        rows = []
+        for address_str, result in items:
+            if result['status'] not in POSITIVE_STATUSES + NEGATIVE_STATUSES:
+                continue
+            coords = result.get('coordinates') or {}
+            rows.append((
+                normalize_address(address_str),
+                address_str,
+                coords.get('lat'),
+                coords.get('lng'),
+                result.get('location_type'),
+                result['status'],
+                1 if result.get('exists') else 0,
+                now
+            ))
+
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO geocodes '
+                '(address_key, full_address, lat, lng, location_type, status, found, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            self._conn.commit()
+            self.counters['stores'] += len(rows)
+        return len(rows)
+
+    def purge_expired(self):
+        """Delete expired rows. Returns the number removed."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'DELETE FROM geocodes WHERE (found = 1 AND updated_at < ?) OR (found = 0 AND updated_at < ?)',
+                (now - self.positive_ttl, now - self.negative_ttl)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def iter_rows(self):
+        """Yield every stored row as a dict (fresh or not)."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT full_address, lat, lng, location_type, status, found, updated_at '
+                'FROM geocodes ORDER BY address_key'
+            ).fetchall()
+        for full_address, lat, lng, location_type, status, found, updated_at in rows:
+            yield {
+                'fullAddress': full_address,
+                'coordinates': {'lat': lat, 'lng': lng} if found else None,
+                'location_type': location_type,
+                'status': status,
+                'exists': bool(found),
+                'updatedAt': updated_at
+            }
+
+    def stats(self):
+        """Row counts and lookup counters."""
+        with self._lock:
+            positive, negative = self._conn.execute(
+                'SELECT COALESCE(SUM(found), 0), COALESCE(SUM(1 - found), 0) FROM geocodes'
+            ).fetchone()
+            return {
+                **self.counters,
+                'positive_rows': positive,
+                'negative_rows': negative,
+                'db_path': self.db_path
+            }
+
+
+def load_addresses(filepath):
+    """Load address strings from a candidates JSON file or a plain text file (one per line)."""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        if not filepath.endswith('.json'):
+            return [line.strip() for line in f if line.strip()]
+        data = json.load(f)
+
+    addresses = []
+    for item in data:
+        if isinstance(item, str):
+            addresses.append(item)
+            continue
+        candidate = item.get('address') or item.get('json', {}).get('address') or item
+        if isinstance(candidate, dict) and candidate.get('fullAddress'):
+            addresses.append(candidate['fullAddress'])
+    return addresses
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the persistent geocode store')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='SQLite database path')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    warm = sub.add_parser('warm', help='Geocode and store every address not already stored')
+    warm.add_argument('input', help='Candidates JSON or text file with one address per line')
+
+    export = sub.add_parser('export', help='Write every stored row to a JSONL file')
+    export.add_argument('output')
+
+    sub.add_parser('stats', help='Show row counts')
+    sub.add_parser('purge', help='Delete expired rows')
+
+    args = parser.parse_args()
+    store = GeocodeStore(args.db)
+
+    if args.command == 'warm':
+        from address_index import open_default_index
+        from geocoder import GeocodingEngine
+
+        api_key = os.environ.get('GOOGLE_MAPS_API_KEY')
+        if not api_key:
+            print("ERROR: GOOGLE_MAPS_API_KEY environment variable not set")
+            return
+
+        addresses = list(dict.fromkeys(load_addresses(args.input)))
+        engine = GeocodingEngine(
+            api_key,
+            qps=float(os.environ.get('GEOCODE_QPS', 20)),
+            daily_quota=int(os.environ.get('GEOCODE_DAILY_QUOTA', 40000)),
+            workers=int(os.environ.get('GEOCODE_WORKERS', 8)),
+            store=store,
+            local_index=open_default_index()
+        )
+        print(f"Warming {len(addresses)} addresses into {args.db}...")
+        engine.geocode_many(addresses)
+        print(f"✓ {engine.stats['store_hits']} already stored, {engine.stats['local_hits']} resolved offline, "
+              f"{engine.stats['requests']} API requests made")
+
+    elif args.command == 'export':
+        count = 0
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for row in store.iter_rows():
+                f.write(json.dumps(row) + '\n')
+                count += 1
+        print(f"✓ Exported {count} rows to {args.output}")
+
+    elif args.command == 'stats':
+        print(json.dumps(store.stats(), indent=2))
+
+    elif args.command == 'purge':
+        print(f"✓ Removed {store.purge_expired()} expired rows")
+
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
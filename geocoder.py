@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Concurrent, rate-limited geocoding engine for delivery route addresses.
+Wraps the Google Maps Geocoding API with a pooled keep-alive session,
+a token-bucket limiter (QPS + daily quota) and OVER_QUERY_LIMIT backoff.
+"""
+
+import datetime
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from geocode_store import normalize_address
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Overridable so benchmarks can point at a local stand-in (see fake_apis.py)
+GEOCODE_URL = os.environ.get('GEOCODE_URL', "https://maps.googleapis.com/maps/api/geocode/json")
+
+# Google statuses that mean "try again later" rather than "this address is bad"
+RETRYABLE_STATUSES = ('OVER_QUERY_LIMIT', 'UNKNOWN_ERROR')
+
+
+class QuotaExceededError(Exception):
+    """Raised when the configured daily request quota has been used up."""
+
+
+def make_session(pool_size=10):
+    """Create a requests session that keeps up to pool_size connections alive."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def geocode_address(address_str, api_key, session=None, store=None, local_index=None):
+    """
+    Geocode a single address using Google Maps Geocoding API.
+    If an AddressIndex is given, addresses it contains resolve offline as ROOFTOP.
+    If a GeocodeStore is given it is consulted first and updated afterwards.
+    Returns: dict with coordinates, status, and exists flag.
+    """
+    if local_index is not None:
+        local = local_index.get(address_str)
+        if local is not None:
+            return local
+
+    if store is not None:
+        stored = store.get(address_str)
+        if stored is not None:
+            return stored
+        result = geocode_address(address_str, api_key, session=session)
+        store.put(address_str, result)
+        return result
+
+    params = {
+        'address': address_str,
+        'key': api_key
+    }
+
+    try:
+        response = (session or requests).get(GEOCODE_URL, params=params, timeout=10)
+        response.raise_for_status()
+        result = response.json()
+
+        if result['status'] == 'OK' and result.get('results'):
+            location = result['results'][0]['geometry']['location']
+            location_type = result['results'][0]['geometry']['location_type']
+
+            # Only accept ROOFTOP or RANGE_INTERPOLATED
+            if location_type in ['ROOFTOP', 'RANGE_INTERPOLATED']:
+                return {
+                    'coordinates': {
+                        'lat': location['lat'],
+                        'lng': location['lng']
+                    },
+                    'location_type': location_type,
+                    'status': 'success',
+                    'exists': True
+                }
+            else:
+                return {
+                    'coordinates': None,
+                    'location_type': location_type,
+                    'status': 'approximate',
+                    'exists': False
+                }
+        elif result['status'] == 'ZERO_RESULTS':
+            return {
+                'coordinates': None,
+                'location_type': None,
+                'status': 'not_found',
+                'exists': False
+            }
+        else:
+            return {
+                'coordinates': None,
+                'location_type': None,
+                'status': result['status'],
+                'exists': False
+            }
+
+    except Exception as e:
+        logger.warning("Error geocoding %s: %s", address_str, e)
+        return {
+            'coordinates': None,
+            'location_type': None,
+            'status': 'error',
+            'exists': False,
+            'error': str(e)
+        }
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiter.
+
+    - rate_qps: sustained requests per second
+    - burst: bucket capacity (defaults to rate_qps)
+    - daily_quota: max requests per calendar day, None for unlimited
+    """
+
+    def __init__(self, rate_qps, burst=None, daily_quota=None):
+        self.rate = float(rate_qps)
+        self.capacity = float(burst or max(1.0, rate_qps))
+        self.daily_quota = daily_quota
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._day = datetime.date.today()
+        self._used_today = 0
+        self._lock = threading.Lock()
+
+    @property
+    def used_today(self):
+        with self._lock:
+            return self._used_today
+
+    def acquire(self):
+        """Block until a request may be sent. Raises QuotaExceededError when the daily quota is spent."""
+        while True:
+            with self._lock:
+                today = datetime.date.today()
+                if today != self._day:
+                    self._day = today
+                    self._used_today = 0
+
+                if self.daily_quota is not None and self._used_today >= self.daily_quota:
+                    raise QuotaExceededError(
+                        f"Daily geocoding quota of {self.daily_quota} requests reached"
+                    )
+
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    self._used_today += 1
+                    return
+
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for `seconds` (shared by every worker)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+
+class GeocodingEngine:
+    """
+    Geocodes many addresses concurrently on a bounded worker pool.
+
+    Every request passes through one shared TokenBucket. When Google answers
+    OVER_QUERY_LIMIT the whole pool backs off exponentially (with jitter)
+    before the address is retried, instead of sleeping a fixed amount per call.
+    With a GeocodeStore, stored answers are returned without using a token;
+    with an AddressIndex, addresses it contains never reach the network either.
+    The same address (after normalization) is never looked up twice at once:
+    duplicates wait for the lookup in flight and share its result.
+    """
+
+    def __init__(self, api_key, qps=20, daily_quota=40000, workers=8,
+                 max_retries=5, backoff_base=1.0, backoff_max=60.0, session=None,
+                 store=None, local_index=None):
+        self.api_key = api_key
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limiter = TokenBucket(qps, daily_quota=daily_quota)
+        self.session = session or make_session(pool_size=workers)
+        self.store = store
+        self.local_index = local_index
+        self.stats = {'requests': 0, 'retries': 0, 'over_query_limit': 0, 'store_hits': 0, 'local_hits': 0,
+                      'coalesced': 0}
+        self._flights = SingleFlight()
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def geocode(self, address_str):
+        """Geocode one address, retrying with backoff on OVER_QUERY_LIMIT."""
+        result, shared = self._flights.do(normalize_address(address_str), lambda: self._geocode(address_str))
+        if shared:
+            self._count('coalesced')
+        return result
+
+    def _geocode(self, address_str):
+        if self.local_index is not None:
+            local = self.local_index.get(address_str)
+            if local is not None:
+                self._count('local_hits')
+                return local
+
+        if self.store is not None:
+            stored = self.store.get(address_str)
+            if stored is not None:
+                self._count('store_hits')
+                return stored
+
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            self._count('requests')
+            result = geocode_address(address_str, self.api_key, session=self.session)
+
+            if result['status'] not in RETRYABLE_STATUSES or attempt == self.max_retries:
+                if self.store is not None:
+                    self.store.put(address_str, result)
+                return result
+
+            if result['status'] == 'OVER_QUERY_LIMIT':
+                self._count('over_query_limit')
+            self._count('retries')
+            delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+            delay *= random.uniform(0.5, 1.0)
+            logger.warning("%s for %s, backing off %.1fs", result['status'], address_str, delay)
+            self.limiter.pause(delay)
+
+    def geocode_many(self, addresses, on_result=None):
+        """
+        Geocode a list of address strings concurrently.
+
+        on_result(index, address, result) is called from worker threads as
+        each address finishes. Returns results in the same order as addresses.
+        Addresses left over after the daily quota runs out get status 'quota_exceeded'.
+        Repeats of an address in the list are looked up once and share the result.
+        """
+        results = [None] * len(addresses)
+        # normalized address -> indices of its repeats, answered with the first one
+        repeats = {}
+        unique = []
+        for index, address in enumerate(addresses):
+            key = normalize_address(address)
+            if key in repeats:
+                repeats[key].append(index)
+            else:
+                repeats[key] = []
+                unique.append(index)
+        duplicates = len(addresses) - len(unique)
+        if duplicates:
+            self._count('coalesced', duplicates)
+
+        def work(index):
+            address = addresses[index]
+            try:
+                result = self.geocode(address)
+            except QuotaExceededError as e:
+                result = {
+                    'coordinates': None,
+                    'location_type': None,
+                    'status': 'quota_exceeded',
+                    'exists': False,
+                    'error': str(e)
+                }
+            for i in [index] + repeats[normalize_address(address)]:
+                results[i] = result
+                if on_result:
+                    on_result(i, addresses[i], result)
+
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            list(pool.map(work, unique))
+        finally:
+            # On Ctrl-C, drop the queued addresses instead of geocoding them all first
+            pool.shutdown(cancel_futures=True)
+
+        return results
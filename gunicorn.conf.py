@@ -0,0 +1,41 @@
+"""
+Gunicorn settings for the Claude OCR server
+
+Run with:
+    gunicorn -c gunicorn.conf.py claude_ocr_server:app
+
+Each worker process runs OCR_THREADS request threads and allows at most
+CLAUDE_MAX_INFLIGHT concurrent Claude calls, so the service-wide cap is
+OCR_WORKERS * CLAUDE_MAX_INFLIGHT.
+"""
+
+import os
+import signal
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8869)}"
+workers = int(os.environ.get('OCR_WORKERS', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('OCR_THREADS', 8))
+
+# A single Claude call can take 30s+; don't let gunicorn kill a busy worker
+timeout = int(os.environ.get('OCR_WORKER_TIMEOUT', 180))
+# Time in-flight requests get to finish after SIGTERM before workers are killed
+graceful_timeout = int(os.environ.get('OCR_GRACEFUL_TIMEOUT', 120))
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+
+def post_worker_init(worker):
+    """On SIGTERM, mark the app as draining before gunicorn stops the worker."""
+    from claude_ocr_server import begin_draining
+
+    handle_exit = worker.handle_exit
+
+    def handle_exit_and_drain(sig, frame):
+        begin_draining()
+        handle_exit(sig, frame)
+
+    signal.signal(signal.SIGTERM, handle_exit_and_drain)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Image normalization before the Claude call
+Decodes an uploaded route sheet once, fixes orientation, crops to the table,
+converts to grayscale and downscales to a long-edge budget, then encodes once.
+Images that need none of that are passed through untouched.
+"""
+
+import base64
+import binascii
+import io
+import os
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Claude downsamples anything with a long edge above ~1568px, so pixels past
+# this budget cost upload bytes without improving digit accuracy.
+MAX_LONG_EDGE = int(os.environ.get('IMAGE_MAX_LONG_EDGE', 1568))
+JPEG_QUALITY = int(os.environ.get('IMAGE_JPEG_QUALITY', 85))
+GRAYSCALE = os.environ.get('IMAGE_GRAYSCALE', '1').lower() in ('1', 'true', 'yes')
+AUTOCROP = os.environ.get('IMAGE_AUTOCROP', '1').lower() in ('1', 'true', 'yes')
+
+# Formats the Claude API accepts as-is
+SUPPORTED_MEDIA_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+    'WEBP': 'image/webp'
+}
+
+EXIF_ORIENTATION = 0x0112
+
+# Pixels darker than this (0-255) count as ink when looking for the table edges
+CROP_INK_THRESHOLD = 200
+# Only crop when it removes at least this fraction of the image area
+CROP_MIN_SAVING = 0.10
+CROP_PADDING = 0.02
+
+
+class ImagePrepError(ValueError):
+    """The upload could not be decoded as an image."""
+
+
+def decode_base64_image(base64_image):
+    """
+    Decode a base64 string or data URL into image bytes.
+
+    The media type in a data URL header is ignored; the real format is read
+    from the bytes. Whitespace and line breaks are skipped by the decoder
+    itself, so the payload is not copied through a chain of replace() calls.
+    """
+    start = 0
+    if base64_image.startswith('data:'):
+        start = base64_image.find(',') + 1
+        if start == 0:
+            raise ImagePrepError("Malformed data URL: missing ','")
+
+    try:
+        data = base64.b64decode(base64_image[start:] if start else base64_image)
+    except (binascii.Error, ValueError) as e:
+        raise ImagePrepError(f"Invalid base64 image data: {e}")
+
+    if not data:
+        raise ImagePrepError("Empty image data")
+    return data
+
+
+def _content_bbox(gray):
+    """Bounding box of the dark (ink) pixels in a grayscale image, or None."""
+    mask = gray.point(lambda p: 255 if p < CROP_INK_THRESHOLD else 0)
+    return mask.getbbox()
+
+
+def _padded(bbox, size):
+    left, top, right, bottom = bbox
+    pad_x = int(size[0] * CROP_PADDING)
+    pad_y = int(size[1] * CROP_PADDING)
+    return (
+        max(0, left - pad_x),
+        max(0, top - pad_y),
+        min(size[0], right + pad_x),
+        min(size[1], bottom + pad_y)
+    )
+
+
+def preprocess_image(image_bytes, max_long_edge=MAX_LONG_EDGE, grayscale=GRAYSCALE,
+                     autocrop=AUTOCROP, jpeg_quality=JPEG_QUALITY):
+    """
+    Normalize an uploaded image for OCR.
+
+    Returns (data, media_type, info) where data is either the original bytes
+    (nothing to do) or a single JPEG re-encode of the normalized image.
+    """
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+    except (UnidentifiedImageError, OSError) as e:
+        raise ImagePrepError(f"Could not open image: {e}")
+
+    source_format = image.format
+    original_size = image.size
+    info = {
+        'originalBytes': len(image_bytes),
+        'originalSize': list(original_size),
+        'originalFormat': source_format,
+        'steps': []
+    }
+
+    orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+    long_edge = max(original_size)
+    scale = min(1.0, max_long_edge / long_edge) if max_long_edge else 1.0
+
+    # Let libjpeg decode at a reduced scale (1/2, 1/4, 1/8) when we are going to
+    # shrink anyway; this skips most of the decode work for big phone photos.
+    if source_format == 'JPEG' and scale < 0.5:
+        target = (max(1, int(original_size[0] * scale)), max(1, int(original_size[1] * scale)))
+        image.draft('L' if grayscale else 'RGB', target)
+
+    try:
+        image.load()
+    except OSError as e:
+        raise ImagePrepError(f"Could not decode image: {e}")
+
+    if image.size != original_size:
+        info['steps'].append('downscale')
+
+    if orientation != 1:
+        image = ImageOps.exif_transpose(image)
+        info['steps'].append('rotate')
+
+    if grayscale and image.mode not in ('L', '1'):
+        image = image.convert('L')
+        info['steps'].append('grayscale')
+
+    if autocrop:
+        gray = image if image.mode == 'L' else image.convert('L')
+        bbox = _content_bbox(gray)
+        if bbox:
+            bbox = _padded(bbox, image.size)
+            area = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
+            if area <= image.size[0] * image.size[1] * (1 - CROP_MIN_SAVING):
+                image = image.crop(bbox)
+                info['steps'].append('crop')
+
+    if max_long_edge and max(image.size) > max_long_edge:
+        image.thumbnail((max_long_edge, max_long_edge), Image.LANCZOS)
+        if 'downscale' not in info['steps']:
+            info['steps'].append('downscale')
+
+    # Nothing changed and Claude accepts the format: send the original bytes
+    if not info['steps'] and source_format in SUPPORTED_MEDIA_TYPES and image.size == original_size:
+        info.update({'bytes': len(image_bytes), 'size': list(image.size), 'reencoded': False})
+        return image_bytes, SUPPORTED_MEDIA_TYPES[source_format], info
+
+    if image.mode not in ('L', 'RGB'):
+        image = image.convert('RGB')
+
+    buffered = io.BytesIO()
+    image.save(buffered, format='JPEG', quality=jpeg_quality, optimize=True)
+    data = buffered.getvalue()
+    info.update({'bytes': len(data), 'size': list(image.size), 'reencoded': True})
+    return data, 'image/jpeg', info
+
+
+def split_into_bands(image_data, count, axis='rows', overlap=0.1,
+                     max_long_edge=MAX_LONG_EDGE, jpeg_quality=JPEG_QUALITY):
+    """
+    Cut a (preprocessed) image into `count` overlapping bands.
+
+    axis='rows' makes horizontal bands, axis='columns' vertical ones; each band
+    extends `overlap` (fraction of a band) into its neighbours so rows on the
+    cut line are fully visible in at least one band.
+    Returns a list of (jpeg_bytes, 'image/jpeg') tuples in reading order.
+    """
+    try:
+        image = Image.open(io.BytesIO(image_data))
+        image.load()
+    except (UnidentifiedImageError, OSError) as e:
+        raise ImagePrepError(f"Could not open image: {e}")
+
+    if image.mode not in ('L', 'RGB'):
+        image = image.convert('RGB')
+
+    width, height = image.size
+    length = height if axis == 'rows' else width
+    band = length / count
+    pad = band * overlap
+
+    bands = []
+    for index in range(count):
+        start = max(0, int(index * band - pad))
+        end = min(length, int((index + 1) * band + pad))
+        box = (0, start, width, end) if axis == 'rows' else (start, 0, end, height)
+        tile = image.crop(box)
+        if max_long_edge and max(tile.size) > max_long_edge:
+            tile.thumbnail((max_long_edge, max_long_edge), Image.LANCZOS)
+
+        buffered = io.BytesIO()
+        tile.save(buffered, format='JPEG', quality=jpeg_quality)
+        bands.append((buffered.getvalue(), 'image/jpeg'))
+
+    return bands
+
+
+def preprocess_signature():
+    """String identifying the active preprocessing settings (part of cache keys)."""
+    return f"prep:{MAX_LONG_EDGE}:{JPEG_QUALITY}:{int(GRAYSCALE)}:{int(AUTOCROP)}"
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Helpers for the /ocr/batch endpoint's Message Batches mode
+- BatchRegistry: remembers which image each batch request belongs to
+- LocalMessageBatches: in-process stand-in for client.messages.batches, for testing
+"""
+
+import json
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import anthropic
+
+
+class BatchRegistry:
+    """
+    Stores per-batch metadata (image index, cache key, preprocessing info,
+    cached results) as one JSON file per batch, so any server worker can
+    answer GET /ocr/batch/<id>.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, batch_id):
+        # Batch ids come from the URL; keep them from escaping the directory
+        safe_id = ''.join(c for c in batch_id if c.isalnum() or c in '-_')
+        return os.path.join(self.directory, f"{safe_id}.json")
+
+    def save(self, batch_id, meta):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path(batch_id))
+
+    def load(self, batch_id):
+        try:
+            with open(self._path(batch_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+
+class LocalMessageBatches:
+    """
+    Mimics the parts of client.messages.batches used by the server
+    (create / retrieve / results) by running each request through
+    client.messages.create on a local thread pool.
+
+    State lives in this process only, so run a single server worker when using it.
+    """
+
+    def __init__(self, client, workers=4):
+        self._client = client
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._batches = {}
+        self._lock = threading.Lock()
+
+    def create(self, requests):
+        batch_id = f"localbatch_{uuid.uuid4().hex}"
+        state = {'pending': len(requests), 'results': {}}
+        with self._lock:
+            self._batches[batch_id] = state
+
+        def errored(error_type, message):
+            return SimpleNamespace(type='errored', error=SimpleNamespace(
+                error=SimpleNamespace(type=error_type, message=message)))
+
+        def run(entry):
+            # Any failure (not only API errors) must end the request, or the
+            # batch would stay in_progress forever
+            result = errored('internal_error', 'Request did not finish')
+            try:
+                message = self._client.messages.create(**entry['params'])
+                result = SimpleNamespace(type='succeeded', message=message)
+            except Exception as e:
+                result = errored('api_error' if isinstance(e, anthropic.APIError) else 'internal_error', str(e))
+            finally:
+                with self._lock:
+                    state['results'][entry['custom_id']] = result
+                    state['pending'] -= 1
+
+        for entry in requests:
+            self._pool.submit(run, entry)
+        return self.retrieve(batch_id)
+
+    def retrieve(self, batch_id):
+        with self._lock:
+            state = self._batches.get(batch_id)
+            if state is None:
+                raise KeyError(batch_id)
+            results = list(state['results'].values())
+            pending = state['pending']
+        return SimpleNamespace(
+            id=batch_id,
+            processing_status='ended' if pending == 0 else 'in_progress',
+            request_counts=SimpleNamespace(
+                processing=pending,
+                succeeded=sum(1 for r in results if r.type == 'succeeded') if pending == 0 else 0,
+                errored=sum(1 for r in results if r.type == 'errored') if pending == 0 else 0,
+                canceled=0,
+                expired=0
+            )
+        )
+
+    def results(self, batch_id):
+        with self._lock:
+            items = list(self._batches[batch_id]['results'].items())
+        for custom_id, result in items:
+            yield SimpleNamespace(custom_id=custom_id, result=result)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache for Claude OCR results
+Keys are a hash of the decoded image bytes plus the prompt and model, so the
+same route sheet uploaded twice is only sent to Claude once.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(image_bytes, prompt, model, variant=''):
+    """
+    Build a cache key from the decoded image bytes, prompt and model name.
+    `variant` covers anything else that changes the result (e.g. preprocessing settings).
+    """
+    digest = hashlib.sha256()
+    digest.update(model.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(variant.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(hashlib.sha256(prompt.encode('utf-8')).digest())
+    digest.update(b'\0')
+    digest.update(image_bytes)
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """
+    Two-tier result cache.
+
+    - Memory tier: LRU bounded by entry count and total serialized size
+    - Disk tier (optional): one JSON file per key, survives restarts
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, disk_dir=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._size = 0
+        self._lock = threading.Lock()
+        self._counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'bypassed': 0
+        }
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def get(self, key):
+        """Return the cached result for key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._counters['memory_hits'] += 1
+                return entry[0]
+
+        value = self._read_disk(key)
+
+        with self._lock:
+            if value is None:
+                self._counters['misses'] += 1
+                return None
+            self._counters['disk_hits'] += 1
+            self._insert(key, value)
+            return value
+
+    def put(self, key, value):
+        """Store a result in memory and, if configured, on disk."""
+        with self._lock:
+            self._counters['stores'] += 1
+            self._insert(key, value)
+        self._write_disk(key, value)
+
+    def record_bypass(self):
+        """Count a request that skipped the cache on purpose."""
+        with self._lock:
+            self._counters['bypassed'] += 1
+
+    def stats(self):
+        """Counters and sizes for the /health endpoint."""
+        with self._lock:
+            lookups = self._counters['memory_hits'] + self._counters['disk_hits'] + self._counters['misses']
+            hits = self._counters['memory_hits'] + self._counters['disk_hits']
+            return {
+                **self._counters,
+                'hits': hits,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'disk_enabled': bool(self.disk_dir)
+            }
+
+    def _insert(self, key, value):
+        # Caller must hold self._lock
+        size = len(json.dumps(value))
+        if size > self.max_bytes:
+            return
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._size -= old[1]
+
+        self._entries[key] = (value, size)
+        self._size += size
+
+        while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._size -= evicted_size
+            self._counters['evictions'] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable cache entry %s: %s", key, e)
+            return None
+
+    def _write_disk(self, key, value):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file first so a crash never leaves a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Failed to write cache entry %s: %s", key, e)
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Durable queue behind the asynchronous /ocr/jobs API
+- JobQueue: SQLite table of jobs (image, options, result), shared by every server
+  worker process and kept across restarts
+- JobWorkers: threads that claim queued jobs, run them and POST the result to the
+  job's callback URL
+
+A claimed job holds a lease. If its process dies, the lease runs out and another
+worker picks the job up again, until it has been tried max_attempts times.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+
+import requests
+
+from geocoder import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id              TEXT PRIMARY KEY,
+    status          TEXT NOT NULL,
+    image           BLOB,
+    options         TEXT NOT NULL,
+    callback_url    TEXT,
+    callback_status TEXT,
+    result          TEXT,
+    http_status     INTEGER,
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    run_after       REAL NOT NULL,
+    lease_until     REAL,
+    created_at      REAL NOT NULL,
+    started_at      REAL,
+    finished_at     REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, run_after);
+"""
+
+# queued -> running -> succeeded | failed (or back to queued for a retry)
+FINISHED_STATUSES = ('succeeded', 'failed')
+
+
+def callback_allowed(url, hosts):
+    """
+    Whether a callback URL is http(s) and its host is on the allow-list
+
+    hosts: host names; an entry starting with "." also matches its subdomains
+    """
+    parsed = urlparse(url)
+    host = (parsed.hostname or '').lower()
+    if parsed.scheme not in ('http', 'https') or not host:
+        return False
+    return any(host == entry or (entry.startswith('.') and host.endswith(entry)) for entry in hosts)
+
+
+def _timestamp(seconds):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(seconds)) if seconds else None
+
+
+class JobQueue:
+    """
+    SQLite-backed job table. Safe to share between threads and processes:
+    claims run in an IMMEDIATE transaction, so two workers never get the same job.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # Autocommit; claim() manages its own transaction
+        self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def submit(self, image_bytes, options=None, callback_url=None):
+        """Queue an image; returns the new job's id"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO jobs (id, status, image, options, callback_url, run_after, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, 'queued', image_bytes, json.dumps(options or {}), callback_url, now, now)
+            )
+        return job_id
+
+    def claim(self, lease_seconds):
+        """
+        Take the oldest runnable job: a queued one that is due, or a running one
+        whose lease has expired (its worker died)
+
+        Returns:
+        - {"id", "image", "options", "callback_url", "attempts"} or None
+          (attempts already counts this claim)
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE (status = 'queued' AND run_after <= ?) "
+                    "OR (status = 'running' AND lease_until < ?) ORDER BY created_at LIMIT 1",
+                    (now, now)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute('COMMIT')
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, "
+                    "started_at = ? WHERE id = ?",
+                    (now + lease_seconds, now, row[0])
+                )
+                job = self._conn.execute(
+                    'SELECT id, image, options, callback_url, attempts FROM jobs WHERE id = ?', (row[0],)
+                ).fetchone()
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return {'id': job[0], 'image': job[1], 'options': json.loads(job[2]),
+                'callback_url': job[3], 'attempts': job[4]}
+
+    def finish(self, job_id, payload, http_status):
+        """Store a job's final result and drop its image; returns the final status"""
+        status = 'succeeded' if http_status == 200 and payload.get('success') else 'failed'
+        with self._lock:
+            self._conn.execute(
+                'UPDATE jobs SET status = ?, result = ?, http_status = ?, image = NULL, '
+                'lease_until = NULL, finished_at = ? WHERE id = ?',
+                (status, json.dumps(payload), http_status, time.time(), job_id)
+            )
+        return status
+
+    def retry(self, job_id, delay, payload=None, http_status=None):
+        """Put a job back in the queue after a transient failure, keeping the last error"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', run_after = ?, lease_until = NULL, "
+                'result = ?, http_status = ? WHERE id = ?',
+                (time.time() + delay, json.dumps(payload) if payload else None, http_status, job_id)
+            )
+
+    def set_callback_status(self, job_id, callback_status):
+        with self._lock:
+            self._conn.execute('UPDATE jobs SET callback_status = ? WHERE id = ?', (callback_status, job_id))
+
+    def get(self, job_id):
+        """Public view of a job (everything but the image), or None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT id, status, attempts, created_at, started_at, finished_at, callback_url, '
+                'callback_status, http_status, result FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = {
+            'jobId': row[0],
+            'status': row[1],
+            'attempts': row[2],
+            'createdAt': _timestamp(row[3]),
+            'startedAt': _timestamp(row[4]),
+            'finishedAt': _timestamp(row[5]),
+            'callbackUrl': row[6],
+            'callbackStatus': row[7]
+        }
+        if row[9] is not None:
+            # For a queued job this is the error of the attempt that will be retried
+            job['httpStatus'] = row[8]
+            job['result' if row[1] in FINISHED_STATUSES else 'lastError'] = json.loads(row[9])
+        return job
+
+    def purge(self, older_than_seconds):
+        """Delete finished jobs older than the given age; returns how many were removed"""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"DELETE FROM jobs WHERE status IN {FINISHED_STATUSES} AND finished_at < ?",
+                (time.time() - older_than_seconds,)
+            )
+        return cursor.rowcount
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+            oldest = self._conn.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        counts = {status: 0 for status in ('queued', 'running') + FINISHED_STATUSES}
+        counts.update(dict(rows))
+        counts['oldest_queued_seconds'] = round(time.time() - oldest, 1) if oldest else 0
+        return counts
+
+
+class JobWorkers:
+    """
+    Pool of threads working through a JobQueue.
+
+    handler(job) -> (payload, http_status, retry) does the work; retry=True marks a
+    transient failure, retried after retry_delay * 2**(attempt - 1) seconds.
+    rate_per_minute (0 = unlimited) caps how fast this process starts jobs.
+    Workers stop claiming once `stop` is set; the job in hand is finished first.
+    """
+
+    def __init__(self, queue, handler, workers=2, rate_per_minute=0, lease_seconds=900,
+                 max_attempts=3, retry_delay=30, poll_interval=2.0, retention_days=7,
+                 callback_timeout=10, stop=None):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.bucket = TokenBucket(rate_per_minute / 60, burst=1) if rate_per_minute else None
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.retention = retention_days * 86400
+        self.callback_timeout = callback_timeout
+        self.stop = stop or threading.Event()
+        self.counters = {'succeeded': 0, 'failed': 0, 'retried': 0,
+                         'callbacks_delivered': 0, 'callbacks_failed': 0}
+        self._wake = threading.Event()
+        self._threads = []
+        self._last_purge = 0.0
+        self._counter_lock = threading.Lock()
+        self._session = requests.Session()
+
+    def start(self):
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._loop, name=f"ocr-job-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def notify(self):
+        """Wake an idle worker (a job was just submitted in this process)"""
+        self._wake.set()
+
+    def _count(self, key, amount=1):
+        with self._counter_lock:
+            self.counters[key] += amount
+
+    def _loop(self):
+        while not self.stop.is_set():
+            try:
+                self._maybe_purge()
+                job = self.queue.claim(self.lease_seconds)
+                if job is None:
+                    # Jobs queued by other processes are picked up on the next poll
+                    self._wake.wait(self.poll_interval)
+                    self._wake.clear()
+                    continue
+                if self.bucket:
+                    self.bucket.acquire()
+                self._run(job)
+            except Exception:
+                # e.g. "database is locked" past the busy timeout: keep the thread alive;
+                # a job left running is picked up again when its lease runs out
+                logger.exception("OCR job worker error")
+                self.stop.wait(self.poll_interval)
+
+    def _run(self, job):
+        if job['attempts'] > self.max_attempts:
+            payload, status = {"error": "Job abandoned: its worker stopped before finishing", "groups": []}, 500
+        else:
+            try:
+                payload, status, retry = self.handler(job)
+            except Exception as e:
+                logger.exception("OCR job %s failed", job['id'])
+                payload, status, retry = {"error": f"Server error: {e}", "groups": []}, 500, False
+            if retry and job['attempts'] < self.max_attempts:
+                delay = self.retry_delay * 2 ** (job['attempts'] - 1)
+                logger.warning("OCR job %s: transient failure (%s), retrying in %ds",
+                               job['id'], payload.get('error'), delay)
+                self.queue.retry(job['id'], delay, payload, status)
+                self._count('retried')
+                return
+
+        final = self.queue.finish(job['id'], payload, status)
+        self._count(final)
+        logger.info("OCR job %s %s after %d attempt(s)", job['id'], final, job['attempts'])
+        if job['callback_url']:
+            self.deliver(job['id'], job['callback_url'])
+
+    def deliver(self, job_id, url, attempts=3):
+        """POST the finished job (as GET /ocr/jobs/<id> shows it) to its callback URL"""
+        body = self.queue.get(job_id)
+        error = None
+        for attempt in range(attempts):
+            try:
+                # No redirects, so the allow-listed host is the only one that is called
+                response = self._session.post(url, json=body, timeout=self.callback_timeout,
+                                              allow_redirects=False)
+                if response.status_code < 400:
+                    self.queue.set_callback_status(job_id, f"delivered ({response.status_code})")
+                    self._count('callbacks_delivered')
+                    return True
+                error = f"HTTP {response.status_code}"
+                if response.status_code < 500 and response.status_code != 429:
+                    break
+            except requests.RequestException as e:
+                error = str(e)
+            time.sleep(2 ** attempt)
+        logger.warning("Callback for OCR job %s to %s failed: %s", job_id, url, error)
+        self.queue.set_callback_status(job_id, f"failed: {error}")
+        self._count('callbacks_failed')
+        return False
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge < 3600:
+            return
+        self._last_purge = now
+        removed = self.queue.purge(self.retention)
+        if removed:
+            logger.info("Purged %d finished OCR jobs", removed)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Incremental parsing of Claude's streamed extraction reply
+Emits each object of the "groups" array as soon as its closing brace arrives,
+so downstream work can start before the whole table has been read.
+"""
+
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+GROUPS_ARRAY = re.compile(r'"groups"\s*:\s*\[')
+
+
+class GroupStreamParser:
+    """
+    Feed text deltas in order; feed() returns the groups completed by that delta.
+
+    Only the top-level objects of the "groups" array are tracked, with string
+    and escape handling so braces inside street names don't confuse the depth.
+    """
+
+    def __init__(self):
+        self._prefix = ''        # text seen before the groups array was found
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._current = []       # characters of the group object being read
+
+    @property
+    def finished(self):
+        """True once the closing bracket of the groups array has been seen"""
+        return self._done
+
+    def feed(self, text):
+        if self._done or not text:
+            return []
+
+        if not self._in_array:
+            self._prefix += text
+            match = GROUPS_ARRAY.search(self._prefix)
+            if not match:
+                # Keep only enough tail to match a key split across deltas
+                self._prefix = self._prefix[-64:]
+                return []
+            text = self._prefix[match.end():]
+            self._prefix = ''
+            self._in_array = True
+
+        groups = []
+        for char in text:
+            if self._depth == 0:
+                if char == '{':
+                    self._depth = 1
+                    self._current = [char]
+                elif char == ']':
+                    self._done = True
+                    break
+                continue
+
+            self._current.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        groups.append(json.loads(''.join(self._current)))
+                    except json.JSONDecodeError as e:
+                        logger.warning("Skipping unparseable streamed group: %s", e)
+                    self._current = []
+
+        return groups
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tiled extraction helpers
+A large route table is cut into overlapping bands that Claude reads
+concurrently; the partial `groups` are then merged back by groupNumber.
+"""
+
+import re
+
+TILE_AXES = ('rows', 'columns')
+
+
+def band_note(index, count, axis):
+    """Instructions added to the extraction prompt for one band of a tiled table"""
+    band = 'horizontal band (a range of rows)' if axis == 'rows' else 'vertical band (a range of columns)'
+    return (
+        f"NOTE: This image is part {index + 1} of {count} of a larger table, cut into overlapping "
+        f"{band}. Extract only the route data visible in this part. Rows or columns cut off at "
+        f"the edge of the image may be skipped - they are fully visible in the neighbouring part. "
+        f"Keep the group numbers exactly as printed in the table."
+    )
+
+
+def _group_number(group):
+    try:
+        return int(str(group.get('groupNumber')).strip())
+    except (TypeError, ValueError):
+        return group.get('groupNumber')
+
+
+def _digits(value):
+    return re.sub(r'\D', '', str(value or ''))
+
+
+def _street_key(street):
+    name = re.sub(r'\s+', ' ', str(street.get('streetName', '')).upper()).strip()
+    return name, _digits(street.get('fromHouse')), _digits(street.get('toHouse'))
+
+
+def _completeness(street):
+    return sum(1 for field in ('streetName', 'fromHouse', 'toHouse') if street.get(field))
+
+
+def _same_street(a, b):
+    """Same street name, and each house number either equal or missing in one reading"""
+    if a[0] != b[0]:
+        return False
+    return all(x == y or not x or not y for x, y in zip(a[1:], b[1:]))
+
+
+def merge_tile_groups(tile_groups):
+    """
+    Merge the `groups` lists returned for each tile (in tile order).
+
+    Groups with the same groupNumber are combined; streets read twice in the
+    overlap between two tiles are kept once. When an overlap row was cut off
+    in one tile (e.g. empty toHouse) the more complete reading wins.
+    """
+    merged = {}
+
+    for groups in tile_groups:
+        for group in groups:
+            number = _group_number(group)
+            streets, keys = merged.setdefault(number, ([], []))
+
+            for street in group.get('streets', []):
+                key = _street_key(street)
+                match = next((i for i, existing in enumerate(keys) if _same_street(existing, key)), None)
+
+                if match is None:
+                    keys.append(key)
+                    streets.append(street)
+                elif _completeness(street) > _completeness(streets[match]):
+                    keys[match] = key
+                    streets[match] = street
+
+    def sort_key(number):
+        return (0, number) if isinstance(number, int) else (1, str(number))
+
+    return [
+        {'groupNumber': number, 'streets': merged[number][0]}
+        for number in sorted(merged, key=sort_key)
+    ]
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Sanity checks for extracted route groups, using the extraction prompt's own rules:
+house numbers are 3-5 digits, a street's range spans at most ~50 numbers, and
+both ends are on the same side of the street (same parity) - generate-candidates
+steps by 2 from fromHouse, so a mixed-parity range never reaches toHouse.
+A street with no numbers at all is allowed (the prompt asks for empty values when
+the digits are unclear), but a range with only one end is flagged.
+"""
+
+import json
+import os
+import re
+
+MAX_RANGE_SPAN = int(os.environ.get('OCR_MAX_RANGE_SPAN', 50))
+HOUSE_NUMBER = re.compile(r'\d{3,5}')
+
+
+def street_problems(street, max_span=MAX_RANGE_SPAN):
+    """
+    Rule violations of one street row
+
+    Returns:
+    - list of human-readable problems (empty if the row looks right)
+    """
+    problems = []
+    values = {}
+    present = [field for field in ('fromHouse', 'toHouse') if str(street.get(field) or '').strip()]
+    for field in ('fromHouse', 'toHouse'):
+        value = str(street.get(field) or '').strip()
+        if not value:
+            if present:
+                problems.append(f"{field} is empty")
+            continue
+        if HOUSE_NUMBER.fullmatch(value):
+            values[field] = int(value)
+        else:
+            problems.append(f"{field} {value!r} is not a 3-5 digit house number")
+
+    if len(values) == 2:
+        from_house, to_house = values['fromHouse'], values['toHouse']
+        if abs(to_house - from_house) > max_span:
+            problems.append(f"range {from_house}-{to_house} spans more than {max_span} numbers")
+        if from_house % 2 != to_house % 2:
+            problems.append(f"range {from_house}-{to_house} mixes odd and even numbers")
+    return problems
+
+
+def validate_groups(groups, max_span=MAX_RANGE_SPAN):
+    """
+    Check every street of every group
+
+    Returns:
+    - list of {"groupIndex", "groupNumber", "streetIndex", "streetName", "problems"}
+      for the rows that break a rule
+    """
+    invalid = []
+    for group_index, group in enumerate(groups):
+        for street_index, street in enumerate(group.get('streets') or []):
+            problems = street_problems(street, max_span)
+            if problems:
+                invalid.append({
+                    'groupIndex': group_index,
+                    'groupNumber': group.get('groupNumber'),
+                    'streetIndex': street_index,
+                    'streetName': street.get('streetName'),
+                    'problems': problems
+                })
+    return invalid
+
+
+def group_key(group_number):
+    """Comparable form of a groupNumber ("3", 3 and " 3" are the same group)"""
+    return str(group_number).strip()
+
+
+def repair_instructions(groups, invalid):
+    """Follow-up prompt asking for a second look at just the invalid rows, numbered from 1"""
+    lines = ["Some rows of this table were read in a way that breaks the rules above. "
+             "Look again at ONLY these rows:"]
+    for number, row in enumerate(invalid, 1):
+        street = groups[row['groupIndex']]['streets'][row['streetIndex']]
+        lines.append(f"{number}. Group {row['groupNumber']}, street {row['streetName']!r}, read as "
+                     f"{street.get('fromHouse') or '?'} - {street.get('toHouse') or '?'} "
+                     f"({'; '.join(row['problems'])})")
+    lines.append("Return ONLY this JSON, one entry per row above, no other text: "
+                 + json.dumps({"rows": [{"id": 1, "fromHouse": "", "toHouse": ""}]})
+                 + ". Leave a house number empty if you still cannot read it.")
+    return '\n'.join(lines)
+
+
+def patch_rows(groups, invalid, rows, max_span=MAX_RANGE_SPAN):
+    """
+    Apply re-read rows (the "rows" of a repair_instructions reply) to a copy of groups.
+    A row is only replaced when the new reading has fewer problems than the old one,
+    and never by an empty one: "still can't read it" keeps the original reading.
+
+    Returns:
+    - (groups, patched): the patched copy and how many rows were replaced
+    """
+    replies = {}
+    for row in rows:
+        try:
+            replies[int(row.get('id'))] = row
+        except (AttributeError, TypeError, ValueError):
+            continue
+
+    groups = [{**group, 'streets': list(group.get('streets') or [])} for group in groups]
+    patched = 0
+    for number, row in enumerate(invalid, 1):
+        reply = replies.get(number)
+        if reply is None:
+            continue
+        streets = groups[row['groupIndex']]['streets']
+        street = streets[row['streetIndex']]
+        candidate = {**street, **{field: str(reply.get(field) or '').strip() for field in ('fromHouse', 'toHouse')}}
+        if not (candidate['fromHouse'] or candidate['toHouse']):
+            continue
+        if len(street_problems(candidate, max_span)) < len(row['problems']):
+            streets[row['streetIndex']] = candidate
+            patched += 1
+    return groups, patched
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Walking-distance filter for geocoded route addresses
+Same accept/discard rule as isWithinWalkingDistance() in
+nodes/aggregate-results.js: within each group, addresses are taken in order and
+kept only if they lie within the walking radius of an address already kept
+(the first address with coordinates is always kept).
+
+Instead of comparing every address against every kept one, kept addresses go
+into a lat/lng grid whose cells are at least one radius wide, so each check
+only looks at the 3x3 block of cells around the address. Distances use the
+node's haversine formula; cells with many points are checked in one numpy
+call when numpy is installed.
+"""
+
+import math
+import os
+
+try:
+    import numpy as np
+except ImportError:  # optional; pure-Python distance checks are used instead
+    np = None
+
+EARTH_RADIUS_M = 6371e3
+WALKING_DISTANCE_M = float(os.environ.get('WALKING_DISTANCE_M', 500))
+
+# Cells with at least this many points are checked with numpy in one call
+VECTORIZE_MIN_POINTS = 32
+
+# Metres per degree of latitude (and of longitude at the equator)
+_METRES_PER_DEGREE = EARTH_RADIUS_M * math.pi / 180
+# Widen cells slightly so float rounding never puts a neighbour two cells away
+_CELL_MARGIN = 1 + 1e-9
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Distance in metres; same operation order as calculateDistance() in the node"""
+    phi1 = lat1 * math.pi / 180
+    phi2 = lat2 * math.pi / 180
+    d_phi = (lat2 - lat1) * math.pi / 180
+    d_lambda = (lng2 - lng1) * math.pi / 180
+
+    a = (math.sin(d_phi / 2) * math.sin(d_phi / 2)
+         + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) * math.sin(d_lambda / 2))
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return EARTH_RADIUS_M * c
+
+
+def haversine_many_m(lat, lng, lats, lngs):
+    """Distances in metres from one point to numpy arrays of points"""
+    phi1 = lat * math.pi / 180
+    phi2 = lats * math.pi / 180
+    d_phi = (lats - lat) * math.pi / 180
+    d_lambda = (lngs - lng) * math.pi / 180
+
+    sin_phi = np.sin(d_phi / 2)
+    sin_lambda = np.sin(d_lambda / 2)
+    a = sin_phi * sin_phi + math.cos(phi1) * np.cos(phi2) * sin_lambda * sin_lambda
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_M * c
+
+
+def address_coordinates(address):
+    """
+    (lat, lng) of a geocoded address, or None
+
+    Mirrors the node's `!coordinates || !coordinates.lat || !coordinates.lng`
+    check, so a zero or missing latitude/longitude counts as no coordinates.
+    """
+    coordinates = address.get('coordinates')
+    if not coordinates:
+        return None
+    try:
+        lat = float(coordinates.get('lat') or 0)
+        lng = float(coordinates.get('lng') or 0)
+    except (AttributeError, TypeError, ValueError):
+        return None
+    if not lat or not lng or math.isnan(lat) or math.isnan(lng):
+        return None
+    return lat, lng
+
+
+class _CellPoints:
+    """Coordinates of the kept addresses in one grid cell"""
+
+    __slots__ = ('lats', 'lngs', 'size')
+
+    def __init__(self):
+        self.lats = []
+        self.lngs = []
+        self.size = 0
+
+    def append(self, lat, lng):
+        if np is not None and self.size >= VECTORIZE_MIN_POINTS:
+            if isinstance(self.lats, list):
+                self.lats = np.array(self.lats + [0.0] * self.size)
+                self.lngs = np.array(self.lngs + [0.0] * self.size)
+            elif self.size == len(self.lats):
+                self.lats = np.concatenate([self.lats, np.empty(self.size)])
+                self.lngs = np.concatenate([self.lngs, np.empty(self.size)])
+            self.lats[self.size] = lat
+            self.lngs[self.size] = lng
+        else:
+            self.lats.append(lat)
+            self.lngs.append(lng)
+        self.size += 1
+
+    def any_within(self, lat, lng, max_distance):
+        if isinstance(self.lats, list):
+            return any(haversine_m(lat, lng, other_lat, other_lng) <= max_distance
+                       for other_lat, other_lng in zip(self.lats, self.lngs))
+        distances = haversine_many_m(lat, lng, self.lats[:self.size], self.lngs[:self.size])
+        return bool((distances <= max_distance).any())
+
+
+class ProximityGrid:
+    """
+    Grid of kept points answering "is anything within max_distance of here?"
+
+    max_abs_lat is the largest |latitude| that will be added or queried; it
+    sets how wide (in degrees of longitude) the cells must be.
+    """
+
+    def __init__(self, max_distance, max_abs_lat):
+        if max_distance <= 0:
+            raise ValueError("max_distance must be positive")
+        self.max_distance = max_distance
+        self.cell_lat = max_distance / _METRES_PER_DEGREE * _CELL_MARGIN
+
+        # Two points within max_distance differ in longitude by at most
+        # 2*asin(sin(d / 2R) / cos(lat)); beyond that, fall back to one column.
+        cos_lat = math.cos(math.radians(min(abs(max_abs_lat), 90.0)))
+        spread = math.sin(max_distance / (2 * EARTH_RADIUS_M)) / cos_lat if cos_lat > 0 else 1.0
+        if spread >= 1.0:
+            self.lng_columns = 1
+        else:
+            cell_lng = math.degrees(2 * math.asin(spread)) * _CELL_MARGIN
+            self.lng_columns = max(1, int(360.0 / cell_lng))
+        self.cell_lng = 360.0 / self.lng_columns
+        self._cells = {}
+        self.size = 0
+
+    def _cell(self, lat, lng):
+        row = math.floor((lat + 90.0) / self.cell_lat)
+        column = math.floor((lng + 180.0) / self.cell_lng) % self.lng_columns
+        return row, column
+
+    def _neighbours(self, row, column):
+        # Columns wrap at the antimeridian; with fewer than 3 columns avoid duplicates
+        columns = {(column + offset) % self.lng_columns for offset in (-1, 0, 1)}
+        # Own cell first - it is the most likely to hold a match
+        yield row, column
+        for r in (row - 1, row, row + 1):
+            for c in columns:
+                if (r, c) != (row, column):
+                    yield r, c
+
+    def add(self, lat, lng):
+        cell = self._cell(lat, lng)
+        points = self._cells.get(cell)
+        if points is None:
+            points = self._cells[cell] = _CellPoints()
+        points.append(lat, lng)
+        self.size += 1
+
+    def any_within(self, lat, lng):
+        for cell in self._neighbours(*self._cell(lat, lng)):
+            points = self._cells.get(cell)
+            if points is not None and points.any_within(lat, lng, self.max_distance):
+                return True
+        return False
+
+
+def proximity_mask(addresses, max_distance=WALKING_DISTANCE_M):
+    """
+    Accept/discard decision for each address of one group, in order
+
+    Returns:
+    - list of bools, True where the node would keep the address
+    """
+    coordinates = [address_coordinates(address) for address in addresses]
+    present = [c for c in coordinates if c is not None]
+    if not present:
+        return [False] * len(addresses)
+
+    grid = ProximityGrid(max_distance, max(abs(lat) for lat, _ in present))
+    mask = []
+    for point in coordinates:
+        if point is None:
+            mask.append(False)
+        elif grid.size == 0 or grid.any_within(*point):
+            grid.add(*point)
+            mask.append(True)
+        else:
+            mask.append(False)
+    return mask
+
+
+def grouped_proximity_mask(addresses, max_distance=WALKING_DISTANCE_M, group_key='groupNumber'):
+    """
+    Apply the walking-distance rule within each group (addresses may be interleaved)
+
+    Returns:
+    - list of bools aligned with addresses, True where the address is kept
+    """
+    # Keyed by the string value, like the node's object keys, so 1 and "1" are one group
+    groups = {}
+    for index, address in enumerate(addresses):
+        groups.setdefault(str(address.get(group_key)), []).append(index)
+
+    keep = [False] * len(addresses)
+    for indices in groups.values():
+        mask = proximity_mask([addresses[i] for i in indices], max_distance)
+        for index, kept in zip(indices, mask):
+            keep[index] = kept
+    return keep
+
+
+def filter_by_proximity(addresses, max_distance=WALKING_DISTANCE_M, group_key='groupNumber'):
+    """
+    Split addresses into those the walking-distance rule keeps and discards
+
+    Returns:
+    - (kept, discarded): lists of addresses, each in input order
+    """
+    keep = grouped_proximity_mask(addresses, max_distance, group_key)
+    kept = [a for a, k in zip(addresses, keep) if k]
+    discarded = [a for a, k in zip(addresses, keep) if not k]
+    return kept, discarded
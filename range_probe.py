@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Adaptive range probing for candidate addresses
+Instead of geocoding every house number of a street's range, geocode the range
+endpoints and every Nth house first, then bisect only the stretches whose
+bounding probes disagree (or are ROOFTOP, which Google only returns for houses
+it knows individually). Stretches bounded by two misses are bisected too,
+unless they lie in a long run of misses (the dead end of an over-wide range),
+which is taken as misses. Stretches bounded by two RANGE_INTERPOLATED results
+are interpolated linearly, which is how Google places them in the first place.
+
+Each probing round is sent to the geocoder as one batch, so a concurrent
+GeocodingEngine still works on many streets at once.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_EVERY = 8
+
+ROOFTOP = 'rooftop'
+INTERPOLATED = 'interpolated'
+MISS = 'miss'
+ERROR = 'error'
+
+
+def classify(result):
+    """Bucket a geocode_address() result: rooftop, interpolated, miss or error"""
+    status = result.get('status')
+    if status == 'success':
+        return ROOFTOP if result.get('location_type') == 'ROOFTOP' else INTERPOLATED
+    if status in ('not_found', 'approximate', 'ZERO_RESULTS'):
+        return MISS
+    # Transient failures (error, quota_exceeded, OVER_QUERY_LIMIT, ...) say
+    # nothing about the neighbouring houses
+    return ERROR
+
+
+def _inferred(left, right, fraction):
+    """Result for an unprobed house between two probes of the same class"""
+    if classify(left) == MISS:
+        return {**left, 'inferred': True}
+    lat = left['coordinates']['lat'] + (right['coordinates']['lat'] - left['coordinates']['lat']) * fraction
+    lng = left['coordinates']['lng'] + (right['coordinates']['lng'] - left['coordinates']['lng']) * fraction
+    return {
+        'coordinates': {'lat': lat, 'lng': lng},
+        'location_type': 'RANGE_INTERPOLATED',
+        'status': 'success',
+        'exists': True,
+        'inferred': True
+    }
+
+
+def street_runs(candidates):
+    """
+    Split candidates into streets: consecutive candidates with the same
+    groupNumber and streetName (the order generate-candidates produces)
+
+    Returns:
+    - list of lists of candidate indices
+    """
+    runs = []
+    previous = object()
+    for index, candidate in enumerate(candidates):
+        key = (candidate.get('groupNumber'), candidate.get('streetName'))
+        if key != previous:
+            runs.append([])
+            previous = key
+        runs[-1].append(index)
+    return runs
+
+
+class RangeProber:
+    """
+    Geocode candidates adaptively.
+
+    geocode_many: callable taking a list of full addresses and returning
+    geocode_address()-shaped results in the same order (for example
+    GeocodingEngine.geocode_many).
+    sample_every: spacing (in candidates) of the first-round probes.
+    long_miss_run: consecutive misses spanning at least this many candidates
+    (default 2 * sample_every) are taken as misses throughout; shorter miss
+    stretches are bisected like any other.
+    """
+
+    def __init__(self, geocode_many, sample_every=DEFAULT_SAMPLE_EVERY, long_miss_run=None):
+        self.geocode_many = geocode_many
+        self.sample_every = max(1, int(sample_every))
+        self.long_miss_run = long_miss_run or 2 * self.sample_every
+
+    def _initial_probes(self, run):
+        last = len(run) - 1
+        positions = set(range(0, last + 1, self.sample_every))
+        positions.add(last)
+        return positions
+
+    @staticmethod
+    def _miss_spans(positions, kinds):
+        """For each probed position that is a miss, the span of the run of consecutive missed probes it is in"""
+        spans = {}
+        run = []
+        for position, kind in zip(positions + [None], kinds + [None]):
+            if kind == MISS:
+                run.append(position)
+                continue
+            for member in run:
+                spans[member] = run[-1] - run[0]
+            run = []
+        return spans
+
+    def geocode_candidates(self, candidates, on_result=None):
+        """
+        on_result(candidate_index, result) is called for every candidate as its
+        result is known: probes as they come back from geocode_many (which is
+        then called with an on_result(batch_index, address, result) keyword),
+        inferred houses as each stretch is settled.
+
+        Returns:
+        - (results, report): results aligned with candidates, inferred ones
+          marked "inferred": True; report counts probes, inferences and rounds
+        """
+        results = [None] * len(candidates)
+        runs = street_runs(candidates)
+        # Positions (within each street's run) to geocode in the next round
+        probes = {street: self._initial_probes(run) for street, run in enumerate(runs)}
+        rounds = 0
+
+        while any(probes.values()):
+            rounds += 1
+            batch = [runs[street][position] for street in sorted(probes) for position in sorted(probes[street])]
+            logger.info("Probe round %d: %d addresses", rounds, len(batch))
+            addresses = [candidates[i]['fullAddress'] for i in batch]
+            if on_result:
+                probed_results = self.geocode_many(
+                    addresses, on_result=lambda position, address, result: on_result(batch[position], result))
+            else:
+                probed_results = self.geocode_many(addresses)
+            for index, result in zip(batch, probed_results):
+                results[index] = result
+
+            next_probes = {}
+            for street, positions in probes.items():
+                if not positions:
+                    continue
+                run = runs[street]
+                probed = sorted(p for p in range(len(run)) if results[run[p]] is not None)
+                stretches = [(a, b) for a, b in zip(probed, probed[1:]) if b - a > 1]
+                miss_spans = self._miss_spans(probed, [classify(results[run[p]]) for p in probed])
+                next_probes[street] = set()
+                for left, right in stretches:
+                    left_result, right_result = results[run[left]], results[run[right]]
+                    kind = classify(left_result)
+                    settled = kind == INTERPOLATED or (kind == MISS and miss_spans[left] >= self.long_miss_run)
+                    if kind == classify(right_result) and settled:
+                        for position in range(left + 1, right):
+                            fraction = (position - left) / (right - left)
+                            results[run[position]] = _inferred(left_result, right_result, fraction)
+                            if on_result:
+                                on_result(run[position], results[run[position]])
+                    else:
+                        next_probes[street].add((left + right) // 2)
+            probes = next_probes
+
+        probed = sum(1 for r in results if not r.get('inferred'))
+        report = {
+            'candidates': len(candidates),
+            'streets': len(runs),
+            'probed': probed,
+            'inferred': len(candidates) - probed,
+            'rounds': rounds,
+            'callsSaved': len(candidates) - probed
+        }
+        return results, report
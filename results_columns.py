@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Compact columnar alternative to geocoded_results.json
+geocoded_results.json stores every address twice (in "groups" and in
+"all_addresses"), each time repeating groupNumber, streetName and fullAddress.
+This format stores each address once, as one row of typed little-endian columns:
+
+    street       int32    index into the street table (groupNumber, streetName,
+                          expandedStreetName), as in the /candidates columnar output
+    houseNumber  int32
+    lat, lng     float64  NaN when there are no coordinates
+    status       uint8    index into the geocodeStatus table
+    locationType uint8    index into the location_type table
+    flags        uint8    1 = exists, 2 = kept in a group, 4 = inferred
+    stop         int32    walking-order stop within the group (0 if not kept)
+
+fullAddress is rebuilt as "<houseNumber> <expandedStreetName><addressSuffix>".
+Anything that doesn't fit the columns (an error message, a fullAddress that
+doesn't follow the pattern) is kept per row in the header, so loading gives
+back exactly the records that were written.
+
+File layout: MAGIC, uint32 header length, JSON header (summary, tables, group
+totals, column offsets), then the columns, each 8-byte aligned. load_results()
+reads the header only; columns are read on first use, and the aggregated
+"groups" view is rebuilt only when it is asked for.
+
+Usage:
+    python results_columns.py sample_data/geocoded_results.cols   # print the summary
+"""
+
+import argparse
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import deque
+
+from candidates import ADDRESS_SUFFIX
+
+MAGIC = b'GEOCOLS\n'
+FORMAT_VERSION = 1
+
+COLUMNS = (
+    ('street', 'i'),
+    ('houseNumber', 'i'),
+    ('lat', 'd'),
+    ('lng', 'd'),
+    ('status', 'B'),
+    ('locationType', 'B'),
+    ('flags', 'B'),
+    ('stop', 'i'),
+)
+
+EXISTS, KEPT, INFERRED = 1, 2, 4
+
+# Record fields the columns (and the street table) account for
+COLUMN_FIELDS = {'groupNumber', 'streetName', 'houseNumber', 'fullAddress', 'coordinates',
+                 'location_type', 'geocodeStatus', 'exists', 'inferred', 'stop'}
+
+
+def _street_parts(record, suffix):
+    """expandedStreetName, if fullAddress follows "<houseNumber> <name><suffix>", else None"""
+    full_address = record.get('fullAddress')
+    prefix = f"{record.get('houseNumber')} "
+    if (isinstance(full_address, str) and full_address.startswith(prefix)
+            and full_address.endswith(suffix) and len(full_address) > len(prefix) + len(suffix)):
+        return full_address[len(prefix):len(full_address) - len(suffix)]
+    return None
+
+
+def _code(table, index, value):
+    code = index.get(value)
+    if code is None:
+        code = index[value] = len(table)
+        table.append(value)
+    return code
+
+
+def write_results_columns(filepath, aggregated, addresses, suffix=ADDRESS_SUFFIX):
+    """
+    Write aggregate_results() output plus the full record list in the columnar format
+
+    addresses: every geocoded record, in candidate order (any iterable, e.g.
+    GeocodeCheckpoint.records()); the rows of aggregated["groups"] are matched
+    to them by (groupNumber, fullAddress), repeats in order
+    """
+    stops = {}
+    for group in aggregated['groups']:
+        for street in group['streets']:
+            for addr in street['addresses']:
+                stops.setdefault((addr.get('groupNumber'), addr.get('fullAddress')), deque()).append(addr.get('stop', 0))
+
+    columns = {name: array(typecode) for name, typecode in COLUMNS}
+    streets, street_index = [], {}
+    statuses, status_index = [], {}
+    location_types, location_type_index = [], {}
+    extras = {}
+
+    for row, record in enumerate(addresses):
+        expanded = _street_parts(record, suffix)
+        street = (record.get('groupNumber'), record.get('streetName'), expanded or '')
+        columns['street'].append(_code(streets, street_index, street))
+
+        extra = {key: value for key, value in record.items() if key not in COLUMN_FIELDS}
+        if expanded is None:
+            extra['fullAddress'] = record.get('fullAddress')
+        house = record.get('houseNumber')
+        if type(house) is int and -2**31 <= house < 2**31:
+            columns['houseNumber'].append(house)
+        else:
+            columns['houseNumber'].append(0)
+            extra['houseNumber'] = house
+
+        coordinates = record.get('coordinates')
+        if coordinates is None:
+            columns['lat'].append(math.nan)
+            columns['lng'].append(math.nan)
+        elif set(coordinates) == {'lat', 'lng'} and all(type(coordinates[k]) is float for k in ('lat', 'lng')):
+            columns['lat'].append(coordinates['lat'])
+            columns['lng'].append(coordinates['lng'])
+        else:
+            columns['lat'].append(math.nan)
+            columns['lng'].append(math.nan)
+            extra['coordinates'] = coordinates
+
+        columns['status'].append(_code(statuses, status_index, record.get('geocodeStatus')))
+        columns['locationType'].append(_code(location_types, location_type_index, record.get('location_type')))
+        if 'exists' not in record:
+            extra['exists'] = None
+        kept = stops.get((record.get('groupNumber'), record.get('fullAddress')))
+        columns['flags'].append((EXISTS if record.get('exists') else 0) | (KEPT if kept else 0)
+                                | (INFERRED if record.get('inferred') else 0))
+        columns['stop'].append(kept.popleft() if kept else 0)
+        if extra:
+            extras[row] = extra
+
+    if len(statuses) > 255 or len(location_types) > 255:
+        raise ValueError("Too many distinct statuses for a uint8 column")
+
+    rows = len(columns['street'])
+    header = {
+        'version': FORMAT_VERSION,
+        'rows': rows,
+        'summary': aggregated['summary'],
+        'addressSuffix': suffix,
+        'streets': [list(street) for street in streets],
+        'statuses': statuses,
+        'locationTypes': location_types,
+        'groups': [
+            {key: value for key, value in group.items() if key not in ('streets', 'walkingOrder')}
+            for group in aggregated['groups']
+        ],
+        'extras': {str(row): extra for row, extra in extras.items()},
+        'columns': []
+    }
+
+    # Offsets are relative to the start of the column data, which follows the padded header
+    offset = 0
+    for name, typecode in COLUMNS:
+        header['columns'].append({'name': name, 'type': typecode, 'offset': offset})
+        offset += -(-rows * columns[name].itemsize // 8) * 8
+
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    header_bytes += b' ' * (-(len(MAGIC) + 4 + len(header_bytes)) % 8)
+    tmp_path = filepath + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header_bytes)))
+        f.write(header_bytes)
+        for name, _ in COLUMNS:
+            column = columns[name]
+            if sys.byteorder != 'little':
+                column.byteswap()
+            data = column.tobytes()
+            f.write(data)
+            f.write(b'\0' * (-len(data) % 8))
+    os.replace(tmp_path, filepath)
+
+
+class ResultsColumns:
+    """
+    A columnar results file opened by load_results()
+
+    summary and the group totals come from the header. column(name) maps a
+    column on first use; groups and all_addresses() rebuild the records from them.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        with open(filepath, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{filepath} is not a columnar results file")
+            (header_length,) = struct.unpack('<I', f.read(4))
+            self.header = json.loads(f.read(header_length))
+            if self.header.get('version') != FORMAT_VERSION:
+                raise ValueError(f"Unsupported columnar results version {self.header.get('version')}")
+            self._data_start = len(MAGIC) + 4 + header_length
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.header['rows'] else None
+        self.summary = self.header['summary']
+        self._columns = {}
+        self._groups = None
+        self._extras = {int(row): extra for row, extra in self.header['extras'].items()}
+
+    def __len__(self):
+        return self.header['rows']
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def column(self, name):
+        """One column as an array (loaded on first use)"""
+        if name not in self._columns:
+            spec = next(c for c in self.header['columns'] if c['name'] == name)
+            values = array(spec['type'])
+            if self._map is not None:
+                start = self._data_start + spec['offset']
+                values.frombytes(self._map[start:start + len(self) * values.itemsize])
+                if sys.byteorder != 'little':
+                    values.byteswap()
+            self._columns[name] = values
+        return self._columns[name]
+
+    def record(self, row):
+        """The geocoded record stored in a row (plus its "stop" when it is kept in a group)"""
+        return self._records([row])[0]
+
+    def _records(self, rows):
+        streets = self.header['streets']
+        statuses = self.header['statuses']
+        location_types = self.header['locationTypes']
+        suffix = self.header['addressSuffix']
+        street_col, house_col = self.column('street'), self.column('houseNumber')
+        lat_col, lng_col = self.column('lat'), self.column('lng')
+        status_col, type_col = self.column('status'), self.column('locationType')
+        flags_col, stop_col = self.column('flags'), self.column('stop')
+
+        records = []
+        for row in rows:
+            group_number, street_name, expanded = streets[street_col[row]]
+            house = house_col[row]
+            lat = lat_col[row]
+            flags = flags_col[row]
+            record = {
+                'groupNumber': group_number,
+                'streetName': street_name,
+                'houseNumber': house,
+                'fullAddress': f"{house} {expanded}{suffix}",
+                'coordinates': None if lat != lat else {'lat': lat, 'lng': lng_col[row]},
+                'location_type': location_types[type_col[row]],
+                'geocodeStatus': statuses[status_col[row]],
+                'exists': bool(flags & EXISTS)
+            }
+            if flags & INFERRED:
+                record['inferred'] = True
+            extra = self._extras.get(row)
+            if extra:
+                record.update(extra)
+                if 'exists' in extra and extra['exists'] is None:
+                    del record['exists']
+            if flags & KEPT:
+                record['stop'] = stop_col[row]
+            records.append(record)
+        return records
+
+    def all_addresses(self):
+        """Every record in candidate order, as geocoded_results.json's all_addresses (without "stop")"""
+        for start in range(0, len(self), 4096):
+            for record in self._records(range(start, min(start + 4096, len(self)))):
+                record.pop('stop', None)
+                yield record
+
+    @property
+    def groups(self):
+        """aggregate_results()-shaped groups, rebuilt from the kept rows on first access"""
+        if self._groups is None:
+            flags = self.column('flags')
+            kept = [row for row in range(len(self)) if flags[row] & KEPT]
+            by_group = {}
+            for record in self._records(kept):
+                by_group.setdefault(record['groupNumber'], {}).setdefault(record['streetName'], []).append(record)
+            groups = []
+            for meta in self.header['groups']:
+                streets = by_group.get(meta['groupNumber'], {})
+                walk = sorted((addr for addrs in streets.values() for addr in addrs), key=lambda a: a['stop'])
+                group = {
+                    'groupNumber': meta['groupNumber'],
+                    'streets': [
+                        {'streetName': name, 'addresses': sorted(addrs, key=lambda a: a['houseNumber'])}
+                        for name, addrs in sorted(streets.items())
+                    ],
+                    **{key: value for key, value in meta.items() if key != 'groupNumber'}
+                }
+                if 'walkingDistanceM' in meta:
+                    group['walkingOrder'] = [addr['fullAddress'] for addr in walk]
+                groups.append(group)
+            self._groups = groups
+        return self._groups
+
+
+def load_results(filepath):
+    """Open a columnar results file (header only; see ResultsColumns)"""
+    return ResultsColumns(filepath)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the summary of a columnar results file")
+    parser.add_argument('path')
+    parser.add_argument('--groups', action='store_true', help="Also list each group's streets")
+    args = parser.parse_args()
+
+    results = load_results(args.path)
+    print(json.dumps(results.summary, indent=2))
+    if args.groups:
+        for group in results.groups:
+            print(f"Group {group['groupNumber']}: {group['totalHouses']} houses")
+            for street in group['streets']:
+                print(f"  {street['streetName']}: {len(street['addresses'])} houses")
+
+
+if __name__ == '__main__':
+    main()
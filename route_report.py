@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+HTML reports of aggregated geocoding results (the output of aggregate_results)
+Everything is written to the file as it is rendered, never built up as one string.
+
+Two layouts:
+- cards: every address as a card, as the report has always looked. Fine for a
+  few hundred houses, heavy for thousands.
+- lazy: summary and one collapsed row per group. The addresses travel as
+  compact column-per-street JSON (also written as a sidecar file). A group's
+  cards are rendered in the browser when it is opened, PAGE_SIZE at a time.
+"""
+
+import json
+import os
+from html import escape
+
+# Above this many houses, layout='auto' picks the lazy layout
+LAZY_THRESHOLD = int(os.environ.get('REPORT_LAZY_THRESHOLD', 2000))
+PAGE_SIZE = 200
+DATA_VERSION = 1
+
+STYLE = """
+    body { font-family: Arial; margin: 20px; background: #f5f5f5; }
+    .container { max-width: 1200px; margin: 0 auto; background: white; padding: 20px; border-radius: 10px; }
+    h1 { color: #2c3e50; text-align: center; }
+    .summary { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 30px; display: grid; grid-template-columns: repeat(4, 1fr); gap: 15px; }
+    .summary-item { text-align: center; }
+    .summary-number { font-size: 32px; font-weight: bold; display: block; }
+    .summary-label { font-size: 14px; opacity: 0.9; }
+    .group { margin-bottom: 25px; border: 2px solid #3498db; border-radius: 8px; overflow: hidden; }
+    .group-header { background: #3498db; color: white; padding: 15px; font-size: 20px; font-weight: bold; }
+    .street-section { padding: 15px; border-bottom: 1px solid #eee; }
+    .street-name { font-weight: bold; color: #2c3e50; margin-bottom: 10px; }
+    .address-list { display: grid; grid-template-columns: repeat(auto-fill, minmax(300px, 1fr)); gap: 8px; }
+    .address-item { padding: 8px; background: #f8f9fa; border-radius: 5px; font-size: 13px; border-left: 3px solid #27ae60; }
+    .address-number { font-weight: bold; }
+    .coordinates { color: #666; font-size: 11px; margin-top: 3px; }
+"""
+
+LAZY_STYLE = """
+    details.group > summary { cursor: pointer; list-style: none; }
+    details.group > summary::-webkit-details-marker { display: none; }
+    details.group > summary::before { content: '▸ '; }
+    details.group[open] > summary::before { content: '▾ '; }
+    .street-summary { color: #666; font-size: 12px; font-weight: normal; margin-left: 6px; }
+    .group-header .street-summary { color: white; opacity: 0.8; }
+    .more { display: block; margin: 15px auto; padding: 8px 20px; border: none; border-radius: 5px; background: #3498db; color: white; cursor: pointer; }
+"""
+
+# Renders one group's streets from the compact data, PAGE_SIZE addresses per click
+LAZY_SCRIPT = """
+(function () {
+  var PAGE_SIZE = %(page_size)d;
+  function start(data) {
+    document.querySelectorAll('details.group').forEach(function (details) {
+      details.addEventListener('toggle', function () {
+        if (details.open && !details.dataset.rendered) {
+          details.dataset.rendered = '1';
+          renderGroup(details, data.groups[Number(details.dataset.index)]);
+        }
+      });
+    });
+  }
+  function renderGroup(details, group) {
+    var body = document.createElement('div');
+    details.appendChild(body);
+    var street = 0, house = 0;
+    function page() {
+      var left = PAGE_SIZE, section = null, list = null;
+      while (left > 0 && street < group.streets.length) {
+        var s = group.streets[street];
+        if (!section) {
+          section = el('div', 'street-section');
+          var name = el('div', 'street-name', '📍 ' + s.streetName + ' ');
+          name.appendChild(el('span', 'street-summary', '(' + s.houses.length + ' houses)'));
+          section.appendChild(name);
+          list = el('div', 'address-list');
+          section.appendChild(list);
+          body.appendChild(section);
+        }
+        for (; house < s.houses.length && left > 0; house++, left--) {
+          var card = el('div', 'address-item');
+          card.appendChild(el('div', 'address-number', s.houses[house] + ' ' + s.streetName));
+          var lat = s.lat[house], lng = s.lng[house];
+          card.appendChild(el('div', 'coordinates', lat === null ? 'No coords' : lat.toFixed(6) + ', ' + lng.toFixed(6)));
+          list.appendChild(card);
+        }
+        if (house >= s.houses.length) { street++; house = 0; section = null; }
+      }
+      if (street < group.streets.length) {
+        var more = el('button', 'more', 'Show more');
+        more.onclick = function () { more.remove(); page(); };
+        body.appendChild(more);
+      }
+    }
+    page();
+  }
+  function el(tag, cls, text) {
+    var node = document.createElement(tag);
+    node.className = cls;
+    if (text !== undefined) node.textContent = text;
+    return node;
+  }
+  var inline = document.getElementById('route-data');
+  if (inline) {
+    start(JSON.parse(inline.textContent));
+  } else {
+    fetch(%(data_url)s).then(function (r) { return r.json(); }).then(start);
+  }
+})();
+"""
+
+
+def _head(f, title, extra_style=''):
+    f.write('<!DOCTYPE html>\n<html>\n<head>\n  <meta charset="UTF-8">\n')
+    f.write(f'  <title>{escape(title)}</title>\n  <style>{STYLE}{extra_style}  </style>\n</head>\n')
+
+
+def _summary(f, summary):
+    f.write('<body>\n  <div class="container">\n')
+    f.write('    <h1>📍 Delivery Route with Geocoded Addresses</h1>\n    <div class="summary">\n')
+    for key, label in (('totalGroups', 'Groups'), ('totalHouses', 'Actual Houses'),
+                       ('totalCandidates', 'Tested'), ('notFound', 'Not Found')):
+        f.write(f'      <div class="summary-item"><span class="summary-number">{summary[key]}</span>'
+                f'<span class="summary-label">{label}</span></div>\n')
+    f.write('    </div>\n')
+
+
+def _coord_text(address):
+    coordinates = address.get('coordinates')
+    if not coordinates:
+        return 'No coords'
+    return f"{coordinates['lat']:.6f}, {coordinates['lng']:.6f}"
+
+
+def write_cards_report(data, filepath, title='Delivery Route - Geocoded'):
+    """Full report with one card per address"""
+    with open(filepath, 'w', encoding='utf-8') as f:
+        _head(f, title)
+        _summary(f, data['summary'])
+        for group in data['groups']:
+            f.write(f'<div class="group"><div class="group-header">Group {group["groupNumber"]} - '
+                    f'{group["totalHouses"]} Houses</div>')
+            for street in group['streets']:
+                street_name = escape(str(street['streetName']))
+                f.write(f'<div class="street-section"><div class="street-name">📍 {street_name} '
+                        f'({len(street["addresses"])} houses)</div><div class="address-list">')
+                f.writelines(
+                    f'<div class="address-item"><div class="address-number">{escape(str(addr["houseNumber"]))} '
+                    f'{street_name}</div><div class="coordinates">{_coord_text(addr)}</div></div>'
+                    for addr in street['addresses']
+                )
+                f.write('</div></div>')
+            f.write('</div>')
+        f.write('</div></body></html>')
+
+
+def _json_value(value):
+    return str(value) if type(value) is int else json.dumps(value, ensure_ascii=False)
+
+
+def _json_coordinates(addresses, axis):
+    # Fixed six decimals (~10 cm) keeps the data small; None -> null
+    return ','.join(
+        f"{addr['coordinates'][axis]:.6f}" if addr.get('coordinates') else 'null'
+        for addr in addresses
+    )
+
+
+def _street_json(street):
+    addresses = street['addresses']
+    return (f'{{"streetName":{_json_value(street["streetName"])},'
+            f'"houses":[{",".join(_json_value(addr["houseNumber"]) for addr in addresses)}],'
+            f'"lat":[{_json_coordinates(addresses, "lat")}],'
+            f'"lng":[{_json_coordinates(addresses, "lng")}]}}')
+
+
+def report_data_chunks(data):
+    """
+    Compact report data as JSON text, one group per chunk:
+    {"version", "summary", "groups": [{"groupNumber", "totalHouses",
+     "streets": [{"streetName", "houses": [...], "lat": [...], "lng": [...]}]}]}
+    """
+    yield f'{{"version":{DATA_VERSION},"summary":{json.dumps(data["summary"], separators=(",", ":"))},"groups":['
+    for index, group in enumerate(data['groups']):
+        chunk = (f'{"," if index else ""}\n{{"groupNumber":{_json_value(group["groupNumber"])},'
+                 f'"totalHouses":{group["totalHouses"]},'
+                 f'"streets":[{",".join(_street_json(street) for street in group["streets"])}]}}')
+        # Safe inside <script>: no "</" can end the element early
+        yield chunk.replace('</', '<\\/')
+    yield ']}\n'
+
+
+def write_lazy_report(data, filepath, data_path=None, embed=True, title='Delivery Route - Geocoded'):
+    """
+    Summary plus collapsed groups; cards are rendered in the browser on demand.
+
+    data_path: where to write the JSON sidecar (default: <filepath without .html>.data.json)
+    embed: also inline the data in the page, so it works when opened from disk;
+           with embed=False the page fetches the sidecar (needs an HTTP server)
+
+    Returns:
+    - path of the sidecar
+    """
+    data_path = data_path or os.path.splitext(filepath)[0] + '.data.json'
+    with open(filepath, 'w', encoding='utf-8') as page, open(data_path, 'w', encoding='utf-8') as sidecar:
+        _head(page, title, LAZY_STYLE)
+        _summary(page, data['summary'])
+        # Rendered once, written to the sidecar and (when embedding) the page
+        if embed:
+            page.write('<script type="application/json" id="route-data">')
+        for chunk in report_data_chunks(data):
+            sidecar.write(chunk)
+            if embed:
+                page.write(chunk)
+        if embed:
+            page.write('</script>\n')
+
+        for index, group in enumerate(data['groups']):
+            page.write(f'<details class="group" data-index="{index}"><summary class="group-header">'
+                       f'Group {group["groupNumber"]} - {group["totalHouses"]} Houses'
+                       f'<span class="street-summary">{len(group["streets"])} streets</span>'
+                       f'</summary></details>\n')
+        page.write('</div>\n')
+        data_url = json.dumps(os.path.basename(data_path))
+        page.write(f'<script>{LAZY_SCRIPT % {"page_size": PAGE_SIZE, "data_url": data_url}}</script>\n')
+        page.write('</body></html>')
+    return data_path
+
+
+def write_report(data, filepath, layout='auto'):
+    """
+    Write the report in the given layout ('cards', 'lazy' or 'auto')
+
+    Returns:
+    - the layout used
+    """
+    if layout == 'auto':
+        layout = 'lazy' if data['summary'].get('totalHouses', 0) > LAZY_THRESHOLD else 'cards'
+    if layout == 'lazy':
+        write_lazy_report(data, filepath)
+    else:
+        write_cards_report(data, filepath)
+    return layout
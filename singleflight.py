@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Single-flight deduplication of identical in-flight work
+While a call for a key is running, further calls for the same key wait for it
+and share its result (or its exception) instead of starting their own. Once the
+call finishes the key is forgotten; caching finished results is someone else's job.
+"""
+
+import threading
+
+
+class FlightAbandoned(Exception):
+    """The leader gave up without a result (e.g. a streaming client went away)."""
+
+
+class Flight:
+    """One in-flight computation; waiters block until the leader finishes it."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.value = None
+        self.error = None
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Leader's result; re-raises the leader's exception"""
+        if not self._done.wait(timeout):
+            raise TimeoutError("Timed out waiting for an identical request in flight")
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class SingleFlight:
+    """
+    Table of in-flight calls by key.
+
+    do(key, fn) covers the simple case. begin()/finish() let a leader whose work
+    outlives one function call (e.g. a streamed response) publish its result later.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._counters = {'leaders': 0, 'coalesced': 0, 'abandoned': 0}
+
+    def begin(self, key):
+        """
+        Join the flight for key, or start one
+
+        Returns:
+        - (flight, leader): the leader must call finish() exactly once
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._counters['coalesced'] += 1
+                return flight, False
+            flight = self._flights[key] = Flight()
+            self._counters['leaders'] += 1
+            return flight, True
+
+    def finish(self, key, flight, value=None, error=None):
+        """Publish the leader's result and wake the waiters; later calls are ignored"""
+        with self._lock:
+            if flight.done:
+                return
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if isinstance(error, FlightAbandoned):
+                self._counters['abandoned'] += 1
+            flight.value, flight.error = value, error
+            flight._done.set()
+
+    def do(self, key, fn, timeout=None):
+        """
+        Run fn() once for all concurrent callers with the same key.
+        If the leader abandons its flight, a waiter takes over and runs fn() itself.
+
+        Returns:
+        - (value, shared): shared is True when the value came from another caller's call
+        """
+        while True:
+            flight, leader = self.begin(key)
+            if not leader:
+                try:
+                    return flight.wait(timeout), True
+                except FlightAbandoned:
+                    continue
+            try:
+                value = fn()
+            except BaseException as e:
+                self.finish(key, flight, error=e)
+                raise
+            self.finish(key, flight, value=value)
+            return value, False
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, 'inflight': len(self._flights)}
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Logging setup, per-request timing spans and Prometheus-style metrics
+for the OCR server. No external dependencies; /metrics output follows the
+Prometheus text exposition format.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+# ---------------------------------------------------------------------------
+# Logging
+# ---------------------------------------------------------------------------
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; fields passed as extra={'fields': {...}} are merged in."""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain text with extra fields appended as key=value pairs."""
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+def setup_logging(level=None, fmt=None):
+    """Configure the root logger from LOG_LEVEL (default INFO) and LOG_FORMAT (text|json)."""
+    level = (level or os.environ.get('LOG_LEVEL', 'INFO')).upper()
+    fmt = (fmt or os.environ.get('LOG_FORMAT', 'text')).lower()
+
+    handler = logging.StreamHandler()
+    if fmt == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+
+
+# ---------------------------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------------------------
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _label_text(self.labels + ('le',), key + (repr(float(bound)),))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _label_text(self.labels + ('le',), key + ('+Inf',))
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose samples are read from a callback at scrape time."""
+
+    def __init__(self, name, help_text, callback, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.callback = callback
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        samples = self.callback()
+        if not isinstance(samples, dict):
+            samples = {(): samples}
+        for key, value in sorted(samples.items()):
+            key = key if isinstance(key, tuple) else (key,)
+            lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help_text, callback, labels=()):
+        metric = Gauge(name, help_text, callback, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def expose(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+
+# ---------------------------------------------------------------------------
+# Timing spans
+# ---------------------------------------------------------------------------
+
+_request_spans = contextvars.ContextVar('request_spans', default=None)
+
+
+def start_request():
+    """Begin collecting spans for the current request (context-local)."""
+    _request_spans.set([])
+
+
+def request_spans():
+    """[(name, seconds), ...] recorded so far in the current request."""
+    return list(_request_spans.get() or [])
+
+
+class SpanRecorder:
+    """Times named stages into a histogram and the current request's span list."""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        self.histogram.observe(seconds, stage=name)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((name, seconds))
+
+
+def server_timing_header(spans, total=None):
+    """Server-Timing header value (durations in milliseconds)."""
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in spans]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ', '.join(parts)
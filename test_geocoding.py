@@ -4,11 +4,21 @@ Test script to validate geocoding logic for delivery route addresses.
 Reads candidates from generate_candidates.json and geocodes them using Google Maps API.
 """
 
+import argparse
 import json
 import os
-import time
-import requests
-from urllib.parse import quote
+import sys
+import threading
+
+from address_index import open_default_index
+from geocode_checkpoint import GeocodeCheckpoint
+from geocode_store import DEFAULT_DB_PATH, GeocodeStore
+from geocoder import GeocodingEngine
+from proximity import WALKING_DISTANCE_M, filter_by_proximity
+from range_probe import DEFAULT_SAMPLE_EVERY, RangeProber
+from results_columns import write_results_columns
+from route_report import write_report
+from walking_order import sequence_groups
 
 def load_candidates(filepath):
     """Load candidate addresses from JSON file."""
@@ -27,91 +37,52 @@ def load_candidates(filepath):
     print(f"Loaded {len(candidates)} candidate addresses")
     return candidates
 
-def geocode_address(address_str, api_key):
-    """
-    Geocode a single address using Google Maps Geocoding API.
-    Returns: dict with coordinates, status, and exists flag.
-    """
-    url = f"https://maps.googleapis.com/maps/api/geocode/json"
-    params = {
-        'address': address_str,
-        'key': api_key
-    }
-    
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        result = response.json()
-        
-        if result['status'] == 'OK' and result.get('results'):
-            location = result['results'][0]['geometry']['location']
-            location_type = result['results'][0]['geometry']['location_type']
-            
-            # Only accept ROOFTOP or RANGE_INTERPOLATED
-            if location_type in ['ROOFTOP', 'RANGE_INTERPOLATED']:
-                return {
-                    'coordinates': {
-                        'lat': location['lat'],
-                        'lng': location['lng']
-                    },
-                    'location_type': location_type,
-                    'status': 'success',
-                    'exists': True
-                }
-            else:
-                return {
-                    'coordinates': None,
-                    'location_type': location_type,
-                    'status': 'approximate',
-                    'exists': False
-                }
-        elif result['status'] == 'ZERO_RESULTS':
-            return {
-                'coordinates': None,
-                'location_type': None,
-                'status': 'not_found',
-                'exists': False
-            }
-        else:
-            return {
-                'coordinates': None,
-                'location_type': None,
-                'status': result['status'],
-                'exists': False
-            }
-    
-    except Exception as e:
-        print(f"  Error geocoding {address_str}: {e}")
-        return {
-            'coordinates': None,
-            'location_type': None,
-            'status': 'error',
-            'exists': False,
-            'error': str(e)
-        }
-
-def aggregate_results(geocoded_addresses):
+def aggregate_results(geocoded_addresses, max_distance=WALKING_DISTANCE_M):
     """
     Aggregate geocoded addresses by group and street.
+    Addresses not within max_distance metres of the rest of their group are
+    discarded, as in the workflow's aggregate-results node.
+    Each group's houses are then put in walking order (walking_order.py): every
+    address gets its 1-based "stop", and the group lists the fullAddresses in
+    that order with the path length.
+    geocoded_addresses may be any iterable (e.g. GeocodeCheckpoint.records());
+    only the existing addresses are held in memory.
     Returns: dict with groups, streets, and summary statistics.
     """
     # Filter only existing addresses
-    existing = [addr for addr in geocoded_addresses if addr.get('exists')]
+    existing = []
+    total = 0
+    for addr in geocoded_addresses:
+        total += 1
+        if addr.get('exists'):
+            existing.append(addr)
+    
+    print(f"\nFound {len(existing)} existing addresses out of {total} candidates")
     
-    print(f"\nFound {len(existing)} existing addresses out of {len(geocoded_addresses)} candidates")
+    # Drop addresses too far from the rest of their group
+    kept, discarded = filter_by_proximity(existing, max_distance)
+    for addr in discarded:
+        print(f"Discarded {addr.get('fullAddress')} from group {addr.get('groupNumber')} - not within walking distance")
+    print(f"Discarded {len(discarded)} addresses due to proximity constraints")
     
     # Group by group number
     groups = {}
-    for addr in existing:
+    for addr in kept:
         group_num = addr['groupNumber']
         if group_num not in groups:
             groups[group_num] = []
         groups[group_num].append(addr)
     
+    # Sequence every group's houses into a walking path, groups in parallel
+    group_numbers = sorted(groups.keys())
+    walks = sequence_groups(groups[group_num] for group_num in group_numbers)
+    
     # Structure by group and street
     grouped_data = []
-    for group_num in sorted(groups.keys()):
+    for group_num, (walk, walk_length) in zip(group_numbers, walks):
         addresses = groups[group_num]
+        for stop, addr in enumerate(walk, 1):
+            addr['stop'] = stop
         
         # Group by street within this group
         streets = {}
@@ -130,14 +101,18 @@ def aggregate_results(geocoded_addresses):
                 }
                 for street_name, street_addrs in sorted(streets.items())
             ],
-            'totalHouses': len(addresses)
+            'totalHouses': len(addresses),
+            'walkingOrder': [addr['fullAddress'] for addr in walk],
+            'walkingDistanceM': round(walk_length, 1)
         })
     
     summary = {
         'totalGroups': len(grouped_data),
-        'totalCandidates': len(geocoded_addresses),
-        'totalHouses': len(existing),
-        'notFound': len(geocoded_addresses) - len(existing)
+        'totalCandidates': total,
+        'totalHouses': len(kept),
+        'notFound': total - len(existing),
+        'discardedDueToProximity': len(discarded),
+        'walkingDistanceM': round(sum(group['walkingDistanceM'] for group in grouped_data), 1)
     }
     
     return {
@@ -145,7 +120,31 @@ def aggregate_results(geocoded_addresses):
         'summary': summary
     }
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Geocode candidate addresses and build the route report.")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="Probe each street's range instead of geocoding every house number")
+    parser.add_argument('--sample-every', type=int, default=DEFAULT_SAMPLE_EVERY,
+                        help=f"Spacing of the first adaptive probes (default {DEFAULT_SAMPLE_EVERY})")
+    parser.add_argument('--candidates', default='sample_data/generate_candidates.json',
+                        help="Candidates JSON exported from the workflow")
+    parser.add_argument('--limit', type=int, default=None,
+                        help="Geocode only the first N candidates (0 = all) without prompting")
+    parser.add_argument('--checkpoint', default='sample_data/geocoded_results.jsonl',
+                        help="JSONL file every result is appended to as it arrives")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue an interrupted run, skipping candidates already in the checkpoint")
+    parser.add_argument('--report', choices=('auto', 'cards', 'lazy'), default='auto',
+                        help="HTML layout: every address as a card, or groups rendered on demand "
+                             "(auto: lazy for large routes)")
+    parser.add_argument('--output', choices=('json', 'columns', 'both'), default='json',
+                        help="geocoded_results.json, the compact columnar geocoded_results.cols "
+                             "(see results_columns.py), or both")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    
     # Check for API key
     api_key = os.environ.get('GOOGLE_MAPS_API_KEY')
     if not api_key:
@@ -154,16 +153,20 @@ def main():
         return
     
     # Load candidates
-    candidates_file = 'sample_data/generate_candidates.json'
-    candidates = load_candidates(candidates_file)
+    candidates = load_candidates(args.candidates)
     
     if not candidates:
         print("No candidates found in file")
         return
     
-    # Ask user how many to process (for testing)
+    # Ask user how many to process (for testing), unless given on the command line
     print(f"\nTotal candidates: {len(candidates)}")
-    user_input = input(f"How many addresses to geocode? (press Enter for all, or enter a number): ").strip()
+    if args.limit is not None:
+        user_input = str(args.limit) if args.limit else ''
+    elif sys.stdin.isatty():
+        user_input = input(f"How many addresses to geocode? (press Enter for all, or enter a number): ").strip()
+    else:
+        user_input = ''
     
     if user_input:
         try:
@@ -175,47 +178,75 @@ def main():
     else:
         print("Processing all addresses...")
     
-    # Geocode each address
-    geocoded = []
-    total = len(candidates)
+    # Geocode concurrently through the shared rate limiter
+    # Free tier: 50 requests per second, 40,000 per day
+    engine = GeocodingEngine(
+        api_key,
+        qps=float(os.environ.get('GEOCODE_QPS', 20)),
+        daily_quota=int(os.environ.get('GEOCODE_DAILY_QUOTA', 40000)),
+        workers=int(os.environ.get('GEOCODE_WORKERS', 8)),
+        store=GeocodeStore(DEFAULT_DB_PATH),
+        local_index=open_default_index()
+    )
+    checkpoint = GeocodeCheckpoint(args.checkpoint, candidates, resume=args.resume)
+    if len(checkpoint):
+        print(f"Resuming: {len(checkpoint)} results already in {args.checkpoint}")
+    total = len(candidates) - sum(1 for i in range(len(candidates)) if checkpoint.done(i))
+    done = [0]
+    print_lock = threading.Lock()
     
     print(f"\nGeocoding {total} addresses...")
     print("=" * 60)
     
-    for i, candidate in enumerate(candidates, 1):
-        full_address = candidate['fullAddress']
-        print(f"[{i}/{total}] {full_address}", end=' ... ')
-        
-        result = geocode_address(full_address, api_key)
-        
-        # Combine candidate info with geocode result
-        geocoded_address = {
-            **candidate,
-            'coordinates': result['coordinates'],
-            'location_type': result.get('location_type'),
-            'geocodeStatus': result['status'],
-            'exists': result['exists']
-        }
-        
-        if 'error' in result:
-            geocoded_address['error'] = result['error']
-        
-        geocoded.append(geocoded_address)
-        
-        # Print status
-        if result['exists']:
-            print(f"✓ {result['location_type']}")
+    def report(index, result):
+        if checkpoint.done(index):
+            return
+        checkpoint.append(index, result)
+        if result.get('inferred'):
+            return
+        with print_lock:
+            done[0] += 1
+            # Print status
+            full_address = candidates[index]['fullAddress']
+            if result['exists']:
+                print(f"[{done[0]}/{total}] {full_address} ... ✓ {result['location_type']}")
+            else:
+                print(f"[{done[0]}/{total}] {full_address} ... ✗ {result['status']}")
+    
+    def geocode_many(addresses, on_result):
+        # Answer addresses already in the checkpoint from it, geocode the rest
+        results = [checkpoint.result_for(address) for address in addresses]
+        pending = [i for i, result in enumerate(results) if result is None]
+        # The same address under another candidate (e.g. a street in two groups)
+        # still has to be checkpointed for this one
+        for i, result in enumerate(results):
+            if result is not None:
+                on_result(i, addresses[i], result)
+        fresh = engine.geocode_many([addresses[i] for i in pending],
+                                    on_result=lambda j, address, result: on_result(pending[j], address, result))
+        for i, result in zip(pending, fresh):
+            results[i] = result
+        return results
+    
+    probe_report = None
+    try:
+        if args.adaptive:
+            prober = RangeProber(geocode_many, sample_every=args.sample_every)
+            _, probe_report = prober.geocode_candidates(candidates, on_result=report)
         else:
-            print(f"✗ {result['status']}")
-        
-        # Rate limiting - Google Maps API has limits
-        # Free tier: 50 requests per second, 40,000 per day
-        time.sleep(0.05)  # 20 requests per second
+            pending = [i for i in range(len(candidates)) if not checkpoint.done(i)]
+            engine.geocode_many([candidates[i]['fullAddress'] for i in pending],
+                                on_result=lambda j, address, result: report(pending[j], result))
+    except KeyboardInterrupt:
+        checkpoint.close()
+        print(f"\nInterrupted: {len(checkpoint)} results saved to {args.checkpoint}, "
+              f"rerun with --resume to continue")
+        return
     
     print("=" * 60)
     
     # Aggregate results
-    aggregated = aggregate_results(geocoded)
+    aggregated = aggregate_results(checkpoint.records(len(candidates)))
     
     # Print summary
     print("\n" + "=" * 60)
@@ -225,83 +256,64 @@ def main():
     print(f"Total Candidates Tested: {aggregated['summary']['totalCandidates']}")
     print(f"Actual Houses Found: {aggregated['summary']['totalHouses']}")
     print(f"Not Found: {aggregated['summary']['notFound']}")
+    print(f"Discarded (too far from group): {aggregated['summary']['discardedDueToProximity']}")
+    print(f"Walking distance (all groups): {aggregated['summary']['walkingDistanceM'] / 1000:.1f} km")
+    print(f"Google API requests: {engine.stats['requests']} "
+          f"({engine.stats['store_hits']} from store, {engine.stats['local_hits']} resolved offline)")
+    if probe_report:
+        saved_pct = 100 * probe_report['callsSaved'] / max(1, probe_report['candidates'])
+        print(f"Adaptive probing: {probe_report['probed']} addresses geocoded, "
+              f"{probe_report['inferred']} inferred in {probe_report['rounds']} rounds "
+              f"({probe_report['callsSaved']} API calls saved, {saved_pct:.0f}%)")
+        aggregated['summary']['adaptiveProbing'] = probe_report
     print()
     
     # Print details by group
     for group in aggregated['groups']:
-        print(f"Group {group['groupNumber']}: {group['totalHouses']} houses")
+        print(f"Group {group['groupNumber']}: {group['totalHouses']} houses, "
+              f"{group['walkingDistanceM'] / 1000:.2f} km walk")
         for street in group['streets']:
             house_numbers = [str(addr['houseNumber']) for addr in street['addresses']]
             print(f"  {street['streetName']}: {len(street['addresses'])} houses - {', '.join(house_numbers[:10])}")
             if len(house_numbers) > 10:
                 print(f"    ... and {len(house_numbers) - 10} more")
     
-    # Save results
-    output_file = 'sample_data/geocoded_results.json'
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump({
-            'groups': aggregated['groups'],
-            'summary': aggregated['summary'],
-            'all_addresses': geocoded
-        }, f, indent=2)
+    # Save results, streaming all_addresses from the checkpoint
+    output_files = []
+    if args.output in ('json', 'both'):
+        output_files.append('sample_data/geocoded_results.json')
+        write_results(output_files[-1], aggregated, checkpoint.records(len(candidates)))
+    if args.output in ('columns', 'both'):
+        output_files.append('sample_data/geocoded_results.cols')
+        write_results_columns(output_files[-1], aggregated, checkpoint.records(len(candidates)))
+    checkpoint.close()
     
-    print(f"\n✓ Results saved to {output_file}")
+    for output_file in output_files:
+        print(f"\n✓ Results saved to {output_file}")
     
     # Save summary HTML
     html_file = 'sample_data/geocoded_results.html'
-    generate_html(aggregated, html_file)
+    generate_html(aggregated, html_file, args.report)
     print(f"✓ HTML report saved to {html_file}")
 
-def generate_html(data, filepath):
-    """Generate HTML report of geocoded results."""
-    html = f"""<!DOCTYPE html>
-<html>
-<head>
-  <meta charset="UTF-8">
-  <title>Delivery Route - Geocoded</title>
-  <style>
-    body {{ font-family: Arial; margin: 20px; background: #f5f5f5; }}
-    .container {{ max-width: 1200px; margin: 0 auto; background: white; padding: 20px; border-radius: 10px; }}
-    h1 {{ color: #2c3e50; text-align: center; }}
-    .summary {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 30px; display: grid; grid-template-columns: repeat(4, 1fr); gap: 15px; }}
-    .summary-item {{ text-align: center; }}
-    .summary-number {{ font-size: 32px; font-weight: bold; display: block; }}
-    .summary-label {{ font-size: 14px; opacity: 0.9; }}
-    .group {{ margin-bottom: 25px; border: 2px solid #3498db; border-radius: 8px; overflow: hidden; }}
-    .group-header {{ background: #3498db; color: white; padding: 15px; font-size: 20px; font-weight: bold; }}
-    .street-section {{ padding: 15px; border-bottom: 1px solid #eee; }}
-    .street-name {{ font-weight: bold; color: #2c3e50; margin-bottom: 10px; }}
-    .address-list {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(300px, 1fr)); gap: 8px; }}
-    .address-item {{ padding: 8px; background: #f8f9fa; border-radius: 5px; font-size: 13px; border-left: 3px solid #27ae60; }}
-    .address-number {{ font-weight: bold; }}
-    .coordinates {{ color: #666; font-size: 11px; margin-top: 3px; }}
-  </style>
-</head>
-<body>
-  <div class="container">
-    <h1>📍 Delivery Route with Geocoded Addresses</h1>
-    <div class="summary">
-      <div class="summary-item"><span class="summary-number">{data['summary']['totalGroups']}</span><span class="summary-label">Groups</span></div>
-      <div class="summary-item"><span class="summary-number">{data['summary']['totalHouses']}</span><span class="summary-label">Actual Houses</span></div>
-      <div class="summary-item"><span class="summary-number">{data['summary']['totalCandidates']}</span><span class="summary-label">Tested</span></div>
-      <div class="summary-item"><span class="summary-number">{data['summary']['notFound']}</span><span class="summary-label">Not Found</span></div>
-    </div>
-"""
-    
-    for group in data['groups']:
-        html += f'<div class="group"><div class="group-header">Group {group["groupNumber"]} - {group["totalHouses"]} Houses</div>'
-        for street in group['streets']:
-            html += f'<div class="street-section"><div class="street-name">📍 {street["streetName"]} ({len(street["addresses"])} houses)</div><div class="address-list">'
-            for addr in street['addresses']:
-                coord_text = f"{addr['coordinates']['lat']:.6f}, {addr['coordinates']['lng']:.6f}" if addr.get('coordinates') else 'No coords'
-                html += f'<div class="address-item"><div class="address-number">{addr["houseNumber"]} {addr["streetName"]}</div><div class="coordinates">{coord_text}</div></div>'
-            html += '</div></div>'
-        html += '</div>'
-    
-    html += '</div></body></html>'
-    
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(html)
+def write_results(filepath, aggregated, addresses):
+    """Write geocoded_results.json without building all_addresses in memory."""
+    tmp_path = filepath + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('{\n  "groups": ')
+        f.write(json.dumps(aggregated['groups'], indent=2).replace('\n', '\n  '))
+        f.write(',\n  "summary": ')
+        f.write(json.dumps(aggregated['summary'], indent=2).replace('\n', '\n  '))
+        f.write(',\n  "all_addresses": [')
+        for index, address in enumerate(addresses):
+            f.write(',\n    ' if index else '\n    ')
+            f.write(json.dumps(address))
+        f.write('\n  ]\n}\n')
+    os.replace(tmp_path, filepath)
+
+def generate_html(data, filepath, layout='auto'):
+    """Generate HTML report of geocoded results (see route_report.py for layouts)."""
+    return write_report(data, filepath, layout)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Walking order for the validated addresses of a route group
+Orders a group's coordinates into a short open path (the carrier does not
+return to the start): nearest-neighbour from the most outlying house, then
+2-opt until no segment reversal shortens the walk. Distances are haversine
+metres, as in proximity.py. With numpy the distance matrix and each 2-opt
+scan are single array operations; without it the same steps run in pure Python.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from proximity import EARTH_RADIUS_M, address_coordinates, haversine_m
+
+try:
+    import numpy as np
+except ImportError:  # optional; pure-Python loops are used instead
+    np = None
+
+# Safety cap on 2-opt sweeps; a few hundred houses converge in well under this
+MAX_SWEEPS = 100
+# Groups are ordered in parallel on this many threads
+SEQUENCE_WORKERS = int(os.environ.get('SEQUENCE_WORKERS', os.cpu_count() or 1))
+
+
+def distance_matrix(points):
+    """Pairwise haversine distances in metres (numpy array, or list of lists without numpy)"""
+    if np is None:
+        return [[haversine_m(lat1, lng1, lat2, lng2) for lat2, lng2 in points] for lat1, lng1 in points]
+    lat = np.radians([p[0] for p in points])
+    lng = np.radians([p[1] for p in points])
+    sin_phi = np.sin((lat[None, :] - lat[:, None]) / 2)
+    sin_lambda = np.sin((lng[None, :] - lng[:, None]) / 2)
+    a = sin_phi * sin_phi + np.cos(lat)[:, None] * np.cos(lat)[None, :] * sin_lambda * sin_lambda
+    return 2 * EARTH_RADIUS_M * np.arctan2(np.sqrt(a), np.sqrt(np.clip(1 - a, 0, None)))
+
+
+def nearest_neighbour(dist, start):
+    """Greedy path from start, always walking to the closest house not yet visited"""
+    n = len(dist)
+    if np is None:
+        order = [start]
+        left = set(range(n)) - {start}
+        while left:
+            row = dist[order[-1]]
+            nearest = min(left, key=row.__getitem__)
+            left.remove(nearest)
+            order.append(nearest)
+        return order
+
+    # Visited houses get an infinite column, so argmin over a row finds the next one
+    remaining = np.array(dist, dtype=float)
+    remaining[:, start] = np.inf
+    order = [start]
+    for _ in range(n - 1):
+        nearest = int(np.argmin(remaining[order[-1]]))
+        remaining[:, nearest] = np.inf
+        order.append(nearest)
+    return order
+
+
+def two_opt(dist, order):
+    """
+    Improve an open path by reversing segments while that shortens it
+
+    A zero-distance sentinel at both ends turns the free ends into ordinary
+    edges, so reversing a prefix or suffix is covered by the same move. For each
+    segment start, every segment end is scored at once and the best one taken.
+    """
+    n = len(order)
+    if n < 3:
+        return list(order)
+
+    if np is None:
+        def d(a, b):
+            return 0.0 if a == n or b == n else dist[a][b]
+        path = [n] + list(order) + [n]
+        for _ in range(MAX_SWEEPS):
+            improved = False
+            for i in range(1, n):
+                a, b = path[i - 1], path[i]
+                best, best_j = 1e-9, None
+                for j in range(i + 1, n + 1):
+                    gain = d(a, b) + d(path[j], path[j + 1]) - d(a, path[j]) - d(b, path[j + 1])
+                    if gain > best:
+                        best, best_j = gain, j
+                if best_j is not None:
+                    path[i:best_j + 1] = path[i:best_j + 1][::-1]
+                    improved = True
+            if not improved:
+                break
+        return path[1:-1]
+
+    padded = np.zeros((n + 1, n + 1))
+    padded[:n, :n] = dist
+    path = np.array([n] + list(order) + [n])
+    for _ in range(MAX_SWEEPS):
+        improved = False
+        for i in range(1, n):
+            a, b = path[i - 1], path[i]
+            ends = path[i + 1:n + 1]
+            after = path[i + 2:n + 2]
+            gain = padded[a, b] + padded[ends, after] - padded[a, ends] - padded[b, after]
+            k = int(np.argmax(gain))
+            if gain[k] > 1e-9:
+                j = i + 1 + k
+                path[i:j + 1] = path[i:j + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return path[1:-1].tolist()
+
+
+def path_length(dist, order):
+    """Length in metres of walking the houses in this order"""
+    return sum(dist[a][b] for a, b in zip(order, order[1:]))
+
+
+def start_index(dist):
+    """The most outlying house (largest total distance to the others), so the walk sweeps the group from one end"""
+    totals = dist.sum(axis=1) if np is not None else [sum(row) for row in dist]
+    return max(range(len(dist)), key=lambda i: totals[i])
+
+
+def walking_order(points):
+    """
+    Short open walking path through (lat, lng) points
+
+    Returns:
+    - (order, length_m): indexes into points, and the path length in metres
+    """
+    if len(points) < 2:
+        return list(range(len(points))), 0.0
+    dist = distance_matrix(points)
+    order = two_opt(dist, nearest_neighbour(dist, start_index(dist)))
+    return order, float(path_length(dist, order))
+
+
+def sequence_addresses(addresses):
+    """
+    Walking order of one group's geocoded addresses
+
+    Addresses without coordinates go last, in their original order.
+
+    Returns:
+    - (ordered addresses, path length in metres)
+    """
+    located = []
+    missing = []
+    for address in addresses:
+        point = address_coordinates(address)
+        (missing if point is None else located).append((address, point))
+    order, length = walking_order([point for _, point in located])
+    return [located[i][0] for i in order] + [address for address, _ in missing], length
+
+
+def sequence_groups(groups, workers=SEQUENCE_WORKERS):
+    """
+    sequence_addresses() for many groups at once, on a thread pool
+
+    Returns:
+    - list of (ordered addresses, path length in metres), one per group
+    """
+    groups = list(groups)
+    if workers <= 1 or len(groups) <= 1:
+        return [sequence_addresses(addresses) for addresses in groups]
+    with ThreadPoolExecutor(max_workers=min(workers, len(groups))) as pool:
+        return list(pool.map(sequence_addresses, groups))